@@ -1,17 +1,18 @@
 import os
-import pymongo
 import hou
 from fnmatch import fnmatch
 from pprint import pprint
 from design import Ui_AssetBrowser
-from PySide2.QtWidgets import QDialog, QWidget, QApplication, QCompleter, QLineEdit, QLabel, QHBoxLayout, QFrame, QTableWidgetItem, QRadioButton, QButtonGroup
+from PySide2.QtWidgets import QDialog, QWidget, QApplication, QCompleter, QLineEdit, QLabel, QHBoxLayout, QFrame, QTableWidgetItem, QCheckBox, QButtonGroup
 from PySide2.QtCore import QStringListModel, QTimer, QEvent, QRectF, Qt
 from PySide2.QtGui import QMouseEvent, QPainter, QBrush, QColor
 from PySide2 import QtCore
 from textwrap import dedent
 
 # TBA Imports
-from ..houdini import importHoudiniAsset
+from ..houdini import importHoudiniAssets
+from .. import connection
+from .. import cache
 from ..config import mongo
 
 class AssetCell(QWidget):
@@ -23,7 +24,7 @@ class AssetCell(QWidget):
 		self.filepath = filepath
 		self.obj_id = obj_id
 		ly_root = QHBoxLayout()
-		self.rad_sel = QRadioButton()
+		self.rad_sel = QCheckBox()
 		lbl_ver = QLabel(ver)
 		lbl_ver.setAttribute(Qt.WA_TranslucentBackground)
 		ly_root.addWidget(self.rad_sel, 1)
@@ -93,8 +94,9 @@ class AssetBrowser(QDialog, Ui_AssetBrowser):
 		super(self.__class__, self).__init__()
 		self.setupUi(self)
 
-		# Create button group
+		# Create button group, several assets can be checked and imported at once
 		self.grp_buttons = QButtonGroup()
+		self.grp_buttons.setExclusive(False)
 		self.btn_import.released.connect(self.import_asset)
 
 		self.initDB()
@@ -130,8 +132,7 @@ class AssetBrowser(QDialog, Ui_AssetBrowser):
 	# Init database object
 	#
 	def initDB(self):
-		client = pymongo.MongoClient(self.mongo_host, self.mongo_port)
-		self.db = client[self.mongo_db]
+		self.db = connection.get_db(self.mongo_db, self.mongo_host, self.mongo_port)
 		self.setWindowTitle('{} [{}:{}]'.format(self.windowTitle(), self.mongo_host, self.mongo_port))
 
 
@@ -213,7 +214,7 @@ class AssetBrowser(QDialog, Ui_AssetBrowser):
 
 		# Pick up job_name
 		if self.job_name is not None:
-			self.job = self.db['jobs'].find_one({ "name": self.job_name })
+			self.job = cache.find_one(self.db, 'jobs', { "name": self.job_name })
 		else:
 			self.job = self.db['jobs'].find_one({})
 			self.job_name = self.job['name']
@@ -337,7 +338,13 @@ class AssetBrowser(QDialog, Ui_AssetBrowser):
 
 
 	def import_asset(self):
-		# Get currently selected AssetCell in QButtonGroup
-		print self.grp_buttons.checkedButton().parent().getFilepath()
-		obj_id = self.grp_buttons.checkedButton().parent().getObjId()
-		importHoudiniAsset(self.db, obj_id)
\ No newline at end of file
+		# Get every checked AssetCell in QButtonGroup
+		cells = [x.parent() for x in self.grp_buttons.buttons() if x.isChecked()]
+
+		if not cells:
+			return
+
+		for cell in cells:
+			print cell.getFilepath()
+
+		importHoudiniAssets(self.db, [x.getObjId() for x in cells])
\ No newline at end of file
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Persistent cache of Alembic object hierarchies. Reading the object paths of a
+# large cache on the share means traversing the whole archive, so the result is
+# kept in a local SQLite store keyed by the file's path, size and mtime, and
+# reused until the file changes. The store is capped at MAX_BYTES, dropping the
+# least recently used entries first. Files can be warmed in the background right
+# after they are published.
+#
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.tbautils', 'abc_cache.sqlite')
+MAX_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hierarchies (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    data TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+)
+'''
+
+
+def _read_hom(path):
+    # Houdini's alembic helpers
+    import _alembic_hom_extensions as abc
+
+    menu = abc.alembicGetObjectPathListForMenu(str(path))
+
+    # the menu list alternates (token, label) and both are the object's full
+    # path, keep one of each pair and drop the root
+    paths = [x for i, x in enumerate(menu) if i % 2 and x != '/']
+    time_range = abc.alembicTimeRange(str(path))
+
+    return paths, list(time_range) if time_range else None
+
+
+def _read_pyalembic(path):
+    # standalone PyAlembic, available in Maya and outside of the DCCs
+    import alembic
+
+    archive = alembic.Abc.IArchive(str(path))
+    paths = []
+
+    def walk(obj):
+        for i in range(obj.getNumChildren()):
+            child = obj.getChild(i)
+            paths.append(child.getFullName())
+            walk(child)
+
+    walk(archive.getTop())
+
+    try:
+        start, end = alembic.Abc.GetArchiveStartAndEndTime(archive)
+        time_range = [start, end]
+    except (AttributeError, RuntimeError):
+        time_range = None
+
+    return paths, time_range
+
+
+READERS = [_read_hom, _read_pyalembic]
+
+
+def read_hierarchy(path):
+    '''
+    Read the hierarchy straight from the file with the first reader available.
+    return: dict with paths (object paths, depth first), object_count and
+        time_range ([start, end] in seconds, or None)
+    '''
+    for reader in READERS:
+        try:
+            paths, time_range = reader(path)
+        except ImportError:
+            continue
+
+        return {'paths': paths, 'object_count': len(paths), 'time_range': time_range}
+
+    raise RuntimeError('No Alembic reader available to read {}'.format(path))
+
+
+class HierarchyCache(object):
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_BYTES):
+        '''
+        param: path [string] - SQLite file for the cache
+        param: max_bytes [int] - approximate cap on the stored hierarchies
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+
+        folder = os.path.dirname(path)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # sqlite connections can't be shared between threads, so open one per use
+        conn = sqlite3.connect(self.path, timeout=30)
+
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, path):
+        '''
+        param: path [string] - Alembic file
+        return: hierarchy dict as returned by read_hierarchy, from the cache if the file hasn't changed
+        '''
+        st = os.stat(path)
+
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM hierarchies WHERE path = ? AND size = ? AND mtime = ?',
+                               (path, st.st_size, st.st_mtime)).fetchone()
+
+            if row is not None:
+                conn.execute('UPDATE hierarchies SET last_used = ? WHERE path = ?', (time.time(), path))
+                return json.loads(row[0])
+
+        hierarchy = read_hierarchy(path)
+        data = json.dumps(hierarchy)
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO hierarchies (path, size, mtime, data, bytes, last_used) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         (path, st.st_size, st.st_mtime, data, len(data), time.time()))
+            self._evict(conn)
+
+        return hierarchy
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM hierarchies').fetchone()[0]
+
+        if total <= self.max_bytes:
+            return
+
+        drop = []
+
+        for path, size in conn.execute('SELECT path, bytes FROM hierarchies ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            drop.append((path,))
+            total -= size
+
+        conn.executemany('DELETE FROM hierarchies WHERE path = ?', drop)
+
+    def warm(self, paths):
+        '''
+        Read and store the hierarchies of paths on a background thread.
+        return: the started thread
+        '''
+        def work():
+            for path in paths:
+                try:
+                    self.get(path)
+                except Exception as e:
+                    print('tba_utils - Could not cache Alembic hierarchy for {}: {}'.format(path, e))
+
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    '''
+    return: the shared HierarchyCache for this session
+    '''
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = HierarchyCache()
+        return _cache
+
+
+def get_hierarchy(path):
+    return get_cache().get(path)
+
+
+def warm(paths):
+    return get_cache().warm(paths)
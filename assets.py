@@ -0,0 +1,409 @@
+import sys
+import hashlib
+
+import bson
+from pymongo import ReturnDocument, InsertOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError, PyMongoError
+
+import cache
+import hda_version
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+# Fields that identify a single asset in assets_curr
+ASSET_KEY = ('name', 'stage', 'entity', 'type')
+
+# Fields that change with every publish. A bulk replace only applies if these
+# still hold what we read, so we never overwrite a version we haven't seen.
+PRECONDITION_FIELDS = ('version', 'dateUpdated', 'dateCreated', 'filepath', 'publish_id')
+
+DUPLICATE_KEY = 11000
+
+# Asset type of HDAs published without a parent asset or asset_type
+HDA_ASSET_TYPE = 'hda'
+
+
+def asset_key(asset):
+    '''
+    param: asset [dict] - asset document
+    return: query dict matching the asset's row in assets_curr
+    '''
+    return {k: asset.get(k) for k in ASSET_KEY}
+
+
+def _key_tuple(asset):
+    return tuple(asset.get(k) for k in ASSET_KEY)
+
+
+def _is_update(document):
+    return any(k.startswith('$') for k in document)
+
+
+def resolve_closure(db, ids):
+    '''
+    Fetch the assets for ids along with everything they depend on through
+    dep_model_id. Each level of dependencies costs at most one $in query on
+    assets_curr and one on assets_prev, and documents are served from the
+    session cache once fetched, so importing a layout takes a fixed number of
+    round trips however many assets it pulls in.
+
+    param: db - pymongo database
+    param: ids [list] - asset ids to resolve
+    return: dict of _id -> asset document, ids that can't be found are left out
+    '''
+    resolved = {}
+    tried = set()
+    todo = set(ids)
+
+    while todo:
+        tried.update(todo)
+        found = cache.find_many(db, 'assets_curr', todo)
+        missing = todo.difference(found)
+
+        if missing:
+            found.update(cache.find_many(db, 'assets_prev', missing))
+
+        resolved.update(found)
+        todo = set(doc['dep_model_id'] for doc in found.values() if doc.get('dep_model_id')) - tried
+
+    return resolved
+
+
+def hda_rotation(db, publish):
+    '''
+    Work out how to record a published HDA, looking up its parent asset or job.
+    Runs when the journal applies the publish, not when it is queued, so the
+    lookups get the journal's retries while the database is unreachable.
+
+    param: db - pymongo database
+    param: publish [dict] - queued by tba_hda.queue_asset_update: parent_id,
+        asset_type, name, job, stage, entity, version, filepath, author, date, metadata
+    return: (query, update, insert) arguments for rotate_asset
+    '''
+    parent_asset = None
+
+    if publish['parent_id']:
+        parent_asset = cache.find_one(db, 'assets_curr', {'_id': bson.ObjectId(publish['parent_id'])})
+
+    # text as in the node type name, records queued before that hold a float
+    version = publish['version']
+
+    if isinstance(version, (int, float)):
+        version = str(version)
+
+    update = {
+        'version': version,
+        'version_key': hda_version.version_key(version),
+        'dateCreated': publish['date'],
+        'filepath': publish['filepath'],
+        'author': publish['author']
+    }
+    update.update(publish['metadata'])
+
+    if parent_asset:
+        # an asset of our type attached to the parent, created from the parent's data if it's new
+        new_asset = dict(parent_asset)
+        del new_asset['_id']
+        new_asset['type'] = publish['asset_type']
+    else:
+        # not attached to anything, the HDA's own name and type make up the asset key
+        job = cache.find_one(db, 'jobs', {'name': publish['job']})
+
+        if job is None:
+            raise ValueError('No job named {!r} for HDA {}'.format(publish['job'], publish['filepath']))
+
+        new_asset = {
+            'name': publish['name'],
+            'type': publish['asset_type'] or HDA_ASSET_TYPE,
+            'job_id': bson.ObjectId(job['_id']),
+            'stage': publish['stage'],
+            'entity': publish['entity']
+        }
+
+    new_asset['version'] = update['version']
+    new_asset['version_key'] = update['version_key']
+    new_asset['author'] = publish['author']
+    new_asset['filepath'] = publish['filepath']
+    new_asset['dateCreated'] = publish['date']
+    new_asset.update(publish['metadata'])
+
+    return asset_key(new_asset), {'$set': update}, new_asset
+
+
+def rotate_asset(db, query, update, insert=None, retries=3, publish_id=None):
+    '''
+    Atomically change the current version of an asset and move the version
+    it replaced into assets_prev.
+
+    The swap on assets_curr is a single find_one_and_update (or replace) that
+    returns the pre-image, so concurrent publishers each get a distinct
+    previous version and every one of them ends up in assets_prev exactly once.
+
+    param: db - pymongo database
+    param: query [dict] - filter matching one asset in assets_curr
+    param: update [dict] - update operators ($set, ...) or a full replacement document
+    param: insert [dict] - document to insert into assets_curr if nothing matches query
+    param: publish_id [ObjectId] - identifies this publish, see swap_current
+    return: the previous assets_curr document, or None if nothing was replaced
+    '''
+    previous = swap_current(db, query, update, insert=insert, retries=retries, publish_id=publish_id)
+
+    if previous is not None:
+        save_history(db, previous)
+
+    return previous
+
+
+def swap_current(db, query, update, insert=None, retries=3, publish_id=None):
+    '''
+    The assets_curr half of rotate_asset, leaves writing the pre-image to
+    assets_prev (save_history) to the caller.
+
+    The new version is stamped with publish_id and the swap skips a current
+    version that already carries it, so running the same publish again after
+    a lost reply or a crash doesn't rotate its own version into history.
+
+    param: publish_id [ObjectId] - identifies this publish, a new one if not given
+    return: the previous assets_curr document, or None if nothing was replaced
+        or this publish had already been applied
+    '''
+    publish_id = publish_id or bson.ObjectId()
+
+    if _is_update(update):
+        update = dict(update)
+        update['$set'] = dict(update.get('$set', {}), publish_id=publish_id)
+    else:
+        update = dict(update, publish_id=publish_id)
+
+    if insert is not None:
+        insert = dict(insert, publish_id=publish_id)
+
+    guarded = dict(query, publish_id={'$ne': publish_id})
+
+    try:
+        for attempt in range(retries):
+            if _is_update(update):
+                previous = db.assets_curr.find_one_and_update(
+                    guarded, update, return_document=ReturnDocument.BEFORE)
+            else:
+                previous = db.assets_curr.find_one_and_replace(
+                    guarded, update, return_document=ReturnDocument.BEFORE)
+
+            if previous is not None:
+                return previous
+
+            if db.assets_curr.find_one(dict(query, publish_id=publish_id), {'_id': 1}) is not None:
+                # applied before, but we never saw the reply
+                print('tba_utils - Publish {} was already applied to {}'.format(publish_id, query))
+                return None
+
+            if insert is None:
+                return None
+
+            try:
+                db.assets_curr.insert_one(insert)
+                return None
+            except DuplicateKeyError:
+                # Somebody else created the asset between our update and insert
+                # (requires the unique asset index). Rotate their version instead.
+                insert.pop('_id', None)
+    finally:
+        # drop cached copies of anything we may have just changed
+        cache.invalidate('assets_curr')
+
+    raise RuntimeError('Could not rotate asset {} after {} attempts'.format(query, retries))
+
+
+def _history(previous):
+    '''
+    return: (_id, document) of the assets_prev row for a replaced version. The
+        _id is derived from the version's own _id, version and publish_id, so
+        the same version always maps to the same row.
+    '''
+    history = dict(previous)
+    asset_id = history.pop('_id')
+    history['asset_id'] = asset_id
+
+    # keep the timestamp part of an ObjectId so history still sorts by time
+    stamp = previous.get('publish_id') or asset_id
+    prefix = stamp.binary[:4] if isinstance(stamp, bson.ObjectId) else b'\x00' * 4
+    key = u'{}:{}:{}'.format(asset_id, previous.get('version'), previous.get('publish_id'))
+    history_id = bson.ObjectId(prefix + hashlib.sha1(key.encode('utf-8')).digest()[:8])
+
+    return history_id, history
+
+
+def save_history(db, previous):
+    '''
+    Write a replaced version to assets_prev. Saving the same version twice
+    leaves a single row, so this is safe to retry.
+    '''
+    history_id, history = _history(previous)
+
+    try:
+        db.assets_prev.replace_one({'_id': history_id}, history, upsert=True)
+    except DuplicateKeyError:
+        # saved by someone else at the same time
+        pass
+
+
+def _chunks(new_assets, batch_size):
+    # Split into batches, starting a new one whenever an asset key repeats so
+    # each version of a repeated asset is rotated into history in turn
+    chunk = []
+    keys = set()
+
+    for i, asset in enumerate(new_assets):
+        key = _key_tuple(asset)
+
+        if len(chunk) >= batch_size or key in keys:
+            yield chunk
+            chunk = []
+            keys = set()
+
+        chunk.append((i, asset))
+        keys.add(key)
+
+    if chunk:
+        yield chunk
+
+
+def _bulk_write(collection, ops, ordered):
+    # return: (number of documents matched, {op index: (error code, message)} for every failed write)
+    if not ops:
+        return 0, {}
+
+    try:
+        result = collection.bulk_write(ops, ordered=ordered)
+    except BulkWriteError as e:
+        errors = {err['index']: (err.get('code'), err.get('errmsg', 'write error'))
+                  for err in e.details.get('writeErrors', [])}
+
+        # ordered writes stop at the first error, so everything after it was skipped
+        if ordered and errors:
+            first = min(errors)
+            for i in range(first + 1, len(ops)):
+                errors[i] = (None, 'skipped after error at index {}'.format(first))
+
+        return e.details.get('nMatched', 0), errors
+
+    return result.matched_count, {}
+
+
+def _precondition(previous):
+    # filter matching previous only as long as nobody has replaced it since we read it
+    query = {'_id': previous['_id']}
+
+    for field in PRECONDITION_FIELDS:
+        query[field] = previous.get(field)
+
+    return query
+
+
+def _applied(db, publish_ids):
+    # return: the publish ids that made it into the database, current or already rotated into history
+    found = set()
+
+    for collection in (db.assets_curr, db.assets_prev):
+        for doc in collection.find({'publish_id': {'$in': list(publish_ids)}}, {'publish_id': 1}):
+            found.add(doc['publish_id'])
+
+    return found
+
+
+def rotate_assets(db, new_assets, ordered=False, batch_size=500):
+    '''
+    Bulk version of rotate_asset. Each batch costs three round trips no matter
+    how many assets it holds: one find for the current versions, one
+    bulk_write to assets_curr and one bulk_write of the replaced versions to
+    assets_prev.
+
+    Replacements only apply to the version that was read, and new assets are
+    inserted rather than upserted. Assets that lose a race with another
+    publisher are sent through rotate_asset one at a time, so their history
+    stays correct.
+
+    param: db - pymongo database
+    param: new_assets [list] - full asset documents to make current
+    param: ordered [boolean] - stop each batch at the first failed write
+    param: batch_size [int] - max number of assets per bulk_write
+    return: list of result dicts, one per asset in the same order
+    '''
+    results = [None] * len(new_assets)
+
+    for chunk in _chunks(new_assets, batch_size):
+        # one query for all current versions in the batch
+        current = {}
+        for doc in db.assets_curr.find({'$or': [asset_key(a) for i, a in chunk]}):
+            current[_key_tuple(doc)] = doc
+
+        # tag each write so we can tell afterwards which ones were applied
+        documents = [dict(asset, publish_id=bson.ObjectId()) for i, asset in chunk]
+        previous = [current.get(_key_tuple(asset)) for i, asset in chunk]
+
+        curr_ops = []
+        for document, prev in zip(documents, previous):
+            if prev is not None:
+                curr_ops.append(ReplaceOne(_precondition(prev), document))
+            else:
+                curr_ops.append(InsertOne(document))
+
+        matched, errors = _bulk_write(db.assets_curr, curr_ops, ordered)
+
+        # inserts that hit an existing asset (requires the unique asset index)
+        conflicts = set(n for n, (code, message) in errors.items() if code == DUPLICATE_KEY)
+
+        # replacements that found a newer version than the one we read
+        replaced = [n for n, prev in enumerate(previous) if prev is not None and n not in errors]
+
+        if matched < len(replaced):
+            applied = _applied(db, [documents[n]['publish_id'] for n in replaced])
+            conflicts.update(n for n in replaced if documents[n]['publish_id'] not in applied)
+
+        # only keep history for rows that were actually replaced
+        prev_ops = []
+        prev_index = []
+        for n, (i, asset) in enumerate(chunk):
+            prev = previous[n]
+
+            results[i] = {
+                'name': asset.get('name'),
+                'stage': asset.get('stage'),
+                'entity': asset.get('entity'),
+                'type': asset.get('type'),
+                'status': 'updated' if prev else 'inserted',
+                'previous_id': prev['_id'] if prev else None,
+                'error': None
+            }
+
+            if n in conflicts:
+                # somebody else published in between, rotate against their version
+                document = dict(documents[n])
+
+                # the failed insert gave the document an _id
+                document.pop('_id', None)
+
+                try:
+                    prev = rotate_asset(db, asset_key(asset), document, insert=dict(document),
+                                        publish_id=document['publish_id'])
+                except PyMongoError as e:
+                    results[i]['status'] = 'error'
+                    results[i]['error'] = str(e)
+                    continue
+
+                results[i]['status'] = 'updated' if prev else 'inserted'
+                results[i]['previous_id'] = prev['_id'] if prev else None
+            elif n in errors:
+                results[i]['status'] = 'error'
+                results[i]['error'] = errors[n][1]
+            elif prev is not None:
+                history_id, history = _history(prev)
+                prev_ops.append(ReplaceOne({'_id': history_id}, history, upsert=True))
+                prev_index.append(i)
+
+        for n, (code, error) in _bulk_write(db.assets_prev, prev_ops, ordered)[1].items():
+            results[prev_index[n]]['error'] = 'history not saved: {}'.format(error)
+
+        cache.invalidate('assets_curr')
+
+    return results
@@ -0,0 +1,191 @@
+import sys
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    '''
+    Small thread-safe LRU with an optional time-to-live per entry.
+    '''
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+
+            if entry is not _MISSING:
+                value, expires = entry
+
+                if expires is None or expires > time.time():
+                    # re-insert to mark as most recently used
+                    self._data[key] = entry
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, match=None):
+        '''
+        param: match [function] - called with each key, drop the entry if it returns True.
+            Drops everything if not given.
+        '''
+        with self._lock:
+            if match is None:
+                self._data.clear()
+                return
+
+            for key in [k for k in self._data if match(k)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+#
+# Read-through cache for documents that rarely change during a session.
+# Entries are keyed by (server address, database, collection, query) and
+# expire after the collection's TTL. Our own publish paths invalidate assets_curr when they write.
+#
+TTLS = {
+    'jobs': 600,
+    'assets_curr': 30,
+    'assets_prev': 3600  # history rows never change once written
+}
+
+_documents = LRUCache(max_size=2048)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _address(db):
+    '''
+    return: the (host, port) pairs db's client was created for. pymongo's
+        MongoClient.address waits for a server, its seed list is known up front.
+    '''
+    client = db.client
+    settings = client.__dict__.get('_topology_settings')
+
+    if settings is not None:
+        return tuple(sorted(settings.seeds))
+
+    return client.address
+
+
+def _count(collection, name):
+    with _stats_lock:
+        counters = _stats.setdefault(collection, {'hits': 0, 'misses': 0})
+        counters[name] += 1
+
+
+def find_one(db, collection, query):
+    '''
+    Cached version of db[collection].find_one(query).
+
+    param: db - pymongo database
+    param: collection [string] - collection name, must have an entry in TTLS
+    param: query [dict] - find_one filter
+    return: a copy of the document (safe to modify) or None
+    '''
+    key = (_address(db), db.name, collection, _freeze(query))
+    doc = _documents.get(key, _MISSING)
+
+    if doc is _MISSING:
+        _count(collection, 'misses')
+        doc = db[collection].find_one(query)
+
+        # don't remember misses, the document may be created any moment
+        if doc is not None:
+            _documents.set(key, doc, ttl=TTLS[collection])
+    else:
+        _count(collection, 'hits')
+
+    return copy.deepcopy(doc)
+
+
+def find_many(db, collection, ids):
+    '''
+    Cached lookup of many documents by _id. Ids that aren't cached are fetched
+    with a single $in query, and share cache entries with find_one(db, collection, {'_id': id}).
+
+    param: db - pymongo database
+    param: collection [string] - collection name, must have an entry in TTLS
+    param: ids [iterable] - document ids
+    return: dict of _id -> copy of the document, ids that don't exist are left out
+    '''
+    address = _address(db)
+    found = {}
+    missing = []
+
+    for _id in set(ids):
+        doc = _documents.get((address, db.name, collection, _freeze({'_id': _id})), _MISSING)
+
+        if doc is _MISSING:
+            missing.append(_id)
+        else:
+            found[_id] = doc
+
+    with _stats_lock:
+        counters = _stats.setdefault(collection, {'hits': 0, 'misses': 0})
+        counters['hits'] += len(found)
+        counters['misses'] += len(missing)
+
+    if missing:
+        for doc in db[collection].find({'_id': {'$in': missing}}):
+            _documents.set((address, db.name, collection, _freeze({'_id': doc['_id']})), doc, ttl=TTLS[collection])
+            found[doc['_id']] = doc
+
+    return copy.deepcopy(found)
+
+
+def invalidate(collection=None):
+    '''
+    param: collection [string] - only drop entries for this collection. Drops everything if None.
+    '''
+    if collection is None:
+        _documents.invalidate()
+    else:
+        _documents.invalidate(lambda key: key[2] == collection)
+
+
+def stats():
+    '''
+    return: dict of hit/miss counters per collection
+    '''
+    with _stats_lock:
+        counters = {k: dict(v) for k, v in _stats.items()}
+
+    counters['size'] = len(_documents)
+    return counters
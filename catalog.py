@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import sqlite3
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+import common
+import versions
+import fileutils
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Catalog of every scene and published file in a job. The share is walked with
+# a pool of threads starting at <job>/vfx and every file is classified with
+# common.parse_many. Results go to a local SQLite index together with each
+# folder's mtime, so a rebuild only lists folders that changed since the last
+# crawl. Tools can then query the index instead of listing the share.
+#
+#   python -m tbautils.catalog build //prospero/jobs/J123
+#   python -m tbautils.catalog query //prospero/jobs/J123 --kind publish --stage build
+#
+SCENE_EXTS = frozenset(['.hip', '.hipnc', '.hiplc', '.ma', '.mb'])
+PUBLISH_DIR = '_published3d'
+IGNORED_EXTS = frozenset(['.lock', '.tmp'])
+
+INDEX_DIR = os.path.join(os.path.expanduser('~'), '.tbautils', 'catalog')
+
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS dirs (
+        path TEXT PRIMARY KEY,
+        mtime REAL NOT NULL,
+        subdirs TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        dir TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        ext TEXT NOT NULL,
+        job TEXT,
+        stage TEXT,
+        entity TEXT,
+        task TEXT,
+        size INTEGER,
+        mtime REAL
+    )''',
+    'CREATE INDEX IF NOT EXISTS files_dir ON files (dir)',
+    'CREATE INDEX IF NOT EXISTS files_lookup ON files (kind, stage, entity)'
+]
+
+
+def _classify(path):
+    # return: 'scene', 'publish' or None for files we don't track
+    parts = path.replace('\\', '/').split('/')
+    ext = os.path.splitext(parts[-1])[1].lower()
+
+    # manifests (.versions.json), staged temp files and lock files aren't publishes
+    if parts[-1].startswith('.') or ext in IGNORED_EXTS:
+        return None, ext
+
+    if PUBLISH_DIR in parts:
+        return 'publish', ext
+
+    if ext in SCENE_EXTS:
+        return 'scene', ext
+
+    return None, ext
+
+
+def _publish_task(path):
+    # published files sit in <task>/vNNN, the folder holding the versions is the task
+    parts = path.replace('\\', '/').split('/')
+
+    if len(parts) > 2 and versions.VERSION_RE.match(parts[-2]):
+        return parts[-3]
+
+    return None
+
+
+def _scan(job):
+    '''
+    List a single folder if it changed since the last crawl.
+    param: job [tuple] - (path, previously indexed mtime or None)
+    return: (path, mtime, changed, subdirs, files) where files is a list of (path, size, mtime)
+    '''
+    path, known_mtime = job
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return path, None, True, [], []
+
+    if known_mtime is not None and mtime == known_mtime:
+        return path, mtime, False, None, None
+
+    subdirs = []
+    files = []
+
+    try:
+        entries = fileutils.scan_dir(path)
+    except OSError:
+        return path, None, True, [], []
+
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.is_file():
+                st = entry.stat()
+                files.append((entry.path, st.st_size, st.st_mtime))
+        except OSError:
+            continue
+
+    return path, mtime, True, subdirs, files
+
+
+class Catalog(object):
+
+    def __init__(self, job_path, index_path=None):
+        '''
+        param: job_path [string] - root folder of the job (the one holding vfx)
+        param: index_path [string] - SQLite index, defaults to ~/.tbautils/catalog/<job>.sqlite
+        '''
+        self.job_path = os.path.normpath(job_path)
+        self.index_path = index_path or os.path.join(INDEX_DIR, os.path.basename(self.job_path) + '.sqlite')
+
+        folder = os.path.dirname(self.index_path)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def build(self, workers=8):
+        '''
+        Crawl the job, re-listing only folders whose mtime changed. Note a file
+        rewritten in place doesn't change its folder's mtime, so its size and
+        mtime are only refreshed once something else in the folder changes.
+
+        param: workers [int] - number of folders listed in parallel
+        return: dict with counts of folders scanned, folders reused and files indexed
+        '''
+        root = os.path.join(self.job_path, 'vfx')
+        stats = {'scanned': 0, 'reused': 0, 'files': 0}
+
+        with self._connect() as conn:
+            known = dict((p, (m, json.loads(s))) for p, m, s in conn.execute('SELECT path, mtime, subdirs FROM dirs'))
+
+        visited = set()
+        level = [root]
+        pool = ThreadPool(workers)
+
+        try:
+            while level:
+                jobs = [(p, known[p][0] if p in known else None) for p in level]
+                level = []
+
+                with self._connect() as conn:
+                    for path, mtime, changed, subdirs, files in pool.imap_unordered(_scan, jobs):
+                        if mtime is None:
+                            continue
+
+                        visited.add(path)
+
+                        if not changed:
+                            stats['reused'] += 1
+                            level.extend(known[path][1])
+                            continue
+
+                        stats['scanned'] += 1
+                        level.extend(subdirs)
+                        self._update_dir(conn, path, mtime, subdirs, files)
+        finally:
+            pool.close()
+            pool.join()
+
+        # forget folders that have been removed
+        with self._connect() as conn:
+            gone = [(p,) for p in known if p not in visited]
+            conn.executemany('DELETE FROM dirs WHERE path = ?', gone)
+            conn.executemany('DELETE FROM files WHERE dir = ?', gone)
+            stats['files'] = conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+        return stats
+
+    def _update_dir(self, conn, path, mtime, subdirs, files):
+        conn.execute('DELETE FROM files WHERE dir = ?', (path,))
+        conn.execute('INSERT OR REPLACE INTO dirs (path, mtime, subdirs) VALUES (?, ?, ?)',
+                     (path, mtime, json.dumps(subdirs)))
+
+        tracked = []
+
+        for filepath, size, file_mtime in files:
+            kind, ext = _classify(filepath)
+
+            if kind:
+                tracked.append((filepath, size, file_mtime, kind, ext))
+
+        contexts = common.parse_many([f[0] for f in tracked])
+        rows = []
+
+        for (filepath, size, file_mtime, kind, ext), c in zip(tracked, contexts):
+            # parse_job_path takes the parent folder, which is the version for a publish
+            task = (kind == 'publish' and _publish_task(filepath)) or c.task
+            rows.append((filepath, path, kind, ext, c.job, c.stage, c.entity, task, size, file_mtime))
+
+        conn.executemany(
+            'INSERT OR REPLACE INTO files (path, dir, kind, ext, job, stage, entity, task, size, mtime) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def files(self, kind=None, stage=None, entity=None, ext=None):
+        '''
+        return: list of file dicts matching all given filters
+        '''
+        query = 'SELECT path, kind, ext, job, stage, entity, task, size, mtime FROM files'
+        where = []
+        args = []
+
+        for column, value in (('kind', kind), ('stage', stage), ('entity', entity), ('ext', ext)):
+            if value is not None:
+                where.append('{} = ?'.format(column))
+                args.append(value)
+
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+
+        with self._connect() as conn:
+            rows = conn.execute(query + ' ORDER BY path', args).fetchall()
+
+        columns = ['path', 'kind', 'ext', 'job', 'stage', 'entity', 'task', 'size', 'mtime']
+        return [dict(zip(columns, row)) for row in rows]
+
+    def entities(self, stage):
+        '''
+        return: sorted entity names that have at least one indexed file in stage
+        '''
+        with self._connect() as conn:
+            rows = conn.execute("SELECT DISTINCT entity FROM files WHERE stage = ? AND entity != ''", (stage,)).fetchall()
+
+        return sorted(r[0] for r in rows if not r[0].startswith('_'))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index the scenes and publishes in a job')
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('job_path')
+    parser.add_argument('--index')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--kind', choices=['scene', 'publish'])
+    parser.add_argument('--stage')
+    parser.add_argument('--entity')
+    parser.add_argument('--ext')
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(args.job_path, args.index)
+
+    if args.command == 'build':
+        stats = catalog.build(workers=args.workers)
+        print('Scanned {scanned} folders, reused {reused}, {files} files indexed in {0}'.format(catalog.index_path, **stats))
+    else:
+        for f in catalog.files(kind=args.kind, stage=args.stage, entity=args.entity, ext=args.ext):
+            print(f['path'])
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
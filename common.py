@@ -1,63 +1,130 @@
 import os
+import re
 import sys
+from collections import namedtuple
+
+import cache
 
 sys.dont_write_bytecode = True  # Avoid writing .pyc files
 
-def parse_job_path(path):
-    # initialize all to empty string
-    job = stage = entity = task = job_path = ''
-
-    sceneDirNames = [
-        'hip',
-        'scene',
-        'scenes'
-    ]
-
-    # os.sep doesn't appear to work with hou.hipFile
-    #parts = path.split(os.sep)
-    parts = path.split('/')
-
-    if 'vfx' in parts:
-        vfx_index = parts.index('vfx')
-
-        job = parts[vfx_index - 1]
-        stage = parts[vfx_index + 1]
-        entity = parts[vfx_index + 2]
-    else:
-        print("VFX directory not found. Some data is missing")
-
-    # work backwards..
-    scene = parts[-1]
-    # 'task' should be parent directory of the scene
-    task = parts[-2]
-    # ignore it if that folder is a scenes directory
+# parent folders that aren't a task
+sceneDirNames = frozenset([
+    'hip',
+    'scene',
+    'scenes'
+])
+
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
+
+_SEP_RE = re.compile(r'[\\/]')
+
+# <job_path ending in job>/vfx[/<stage>[/<entity>]] - the first 'vfx' folder wins
+_JOB_RE = re.compile(r'^(?P<job_path>(?:.*?[\\/])?(?P<job>[^\\/]*))[\\/]vfx(?:[\\/](?P<stage>[^\\/]*)(?:[\\/](?P<entity>[^\\/]*))?)?(?=[\\/]|$)')
+
+_JobContext = namedtuple('JobContext', ['job', 'stage', 'entity', 'task', 'job_path'])
+
+class JobContext(_JobContext):
+    '''
+    Immutable result of parse_job_path. Fields can also be read like a dict,
+    e.g. context['job'], so existing callers keep working.
+    '''
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        # Houdini and Maya hand back unicode keys on Python 2
+        if isinstance(key, _string_types):
+            return getattr(self, key)
+        return _JobContext.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return list(self._fields)
+
+_EMPTY = JobContext('', '', '', '', '')
+
+_parsed = cache.LRUCache(max_size=4096)
+
+def _parse(path):
+    # return: (JobContext, True if only the parent folder was needed)
+    parts = _SEP_RE.split(path)
+
+    # 'task' should be parent directory of the scene, ignore it if that
+    # folder is a scenes directory
+    task = parts[-2] if len(parts) > 1 else ''
     if task.lower() in sceneDirNames:
         task = ''
 
-    return {
-        'job': job,
-        'stage': stage,
-        'entity': entity,
-        'task': task,
-        'job_path': os.sep.join(parts[:vfx_index])
-    }
+    match = _JOB_RE.match(path)
+
+    if not match:
+        return _EMPTY._replace(task=task), len(parts) > 1
+
+    context = JobContext(
+        match.group('job'),
+        match.group('stage') or '',
+        match.group('entity') or '',
+        task,
+        os.sep.join(_SEP_RE.split(match.group('job_path')))
+    )
+
+    return context, match.end() < len(path) - len(parts[-1])
+
+def parse_job_path(path):
+    '''
+    Split a scene or publish path inside a job into its parts. Accepts both
+    / and \\ separators. Fields are empty strings when they can't be found.
+    param: path [string] - e.g. <root>/<job>/vfx/<stage>/<entity>/<task>/<scene>
+    return: JobContext with job, stage, entity, task and job_path
+    '''
+    context = _parsed.get(path)
+
+    if context is None:
+        context = _parse(path)[0]
+        _parsed.set(path, context)
+
+    return context
+
+def parse_many(paths):
+    '''
+    Classify a lot of paths at once, e.g. the output of a filesystem walk.
+    Paths in the same folder are only parsed once.
+    param: paths [iterable] - paths to parse
+    return: list of JobContext in the same order
+    '''
+    folders = {}
+    results = []
+
+    for path in paths:
+        sep = max(path.rfind('/'), path.rfind('\\'))
+        folder = path[:sep] if sep > 0 else None
+        context = folders.get(folder) if folder is not None else None
+
+        if context is None:
+            context, folder_only = _parse(path)
+
+            if folder_only and folder is not None:
+                folders[folder] = context
+
+        results.append(context)
+
+    return results
 
 
 def getDB():
-    import pymongo
-    import config
-    client = pymongo.MongoClient(config.mongo['hostname'], config.mongo['port'])
-    db = client['tag_model']
-    return db
+    import connection
+    return connection.get_db('tag_model')
 
 #
-# Get job by id. Needs to be fixed as it should really be using getDB().
+# Get job by id
 #
 def getJob(id):
     import bson
-    import pymongo
-    import config
-    client = pymongo.MongoClient(config.mongo['hostname'], config.mongo['port'])
-    db = client['tag_model']
-    query = db.jobs.find_one({"_id": bson.ObjectId(id)})
+    import cache
+    db = getDB()
+    query = cache.find_one(db, 'jobs', {"_id": bson.ObjectId(id)})
     return query
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import sys
+import threading
+
+from pymongo import MongoClient, monitoring
+
+import querylog
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Process-wide MongoClient cache. One pooled client is built per (host, port)
+# the first time it is asked for and reused by every caller afterwards.
+# MongoClient is not fork-safe, so a client created in a parent process is
+# dropped and rebuilt when we notice the pid has changed.
+#
+_lock = threading.Lock()
+_clients = {}
+_pid = os.getpid()
+
+# Default timeouts so a slow or unreachable host fails fast instead of
+# hanging the DCC. Can be overridden in config.mongo or per call.
+CONNECT_TIMEOUT_MS = 5000
+SERVER_SELECTION_TIMEOUT_MS = 5000
+
+# Used when config.mongo doesn't name a host
+DEFAULT_HOST = 'tbavm1'
+DEFAULT_PORT = 27017
+
+
+class PoolStats(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    '''
+    Collects connection pool and command timing counters for a client.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checkouts = 0
+            self.checked_out = 0
+            self.commands = 0
+            self.failures = 0
+            self.total_ms = 0.0
+
+    # ConnectionPoolListener
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    # CommandListener
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            self.commands += 1
+            self.total_ms += event.duration_micros / 1000.0
+
+    def failed(self, event):
+        with self._lock:
+            self.commands += 1
+            self.failures += 1
+            self.total_ms += event.duration_micros / 1000.0
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'connections_open': self.connections_created - self.connections_closed,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'commands': self.commands,
+                'failures': self.failures,
+                'total_ms': self.total_ms,
+                'avg_ms': self.total_ms / self.commands if self.commands else 0.0
+            }
+
+
+def _config():
+    try:
+        import config
+    except ImportError:
+        return {}
+    return config.mongo
+
+
+def _check_fork():
+    global _pid
+
+    # Sockets inherited from the parent must not be shared with the child,
+    # so forget (without closing) any client that was built before a fork
+    if os.getpid() != _pid:
+        _clients.clear()
+        _pid = os.getpid()
+
+
+def get_client(host=None, port=None, connect_timeout_ms=None, server_selection_timeout_ms=None):
+    '''
+    param: host [string] - mongo host, defaults to config.mongo['hostname']
+    param: port [int] - mongo port, defaults to config.mongo['port']
+    param: connect_timeout_ms [int] - socket connect timeout, defaults to config.mongo['connect_timeout_ms']
+    param: server_selection_timeout_ms [int] - how long to wait for a usable server,
+        defaults to config.mongo['server_selection_timeout_ms']
+    return: shared pymongo.MongoClient for host and port
+
+    The client is created with connect=False so nothing touches the network
+    until the first real query. Timeouts and the slow query settings in
+    config.mongo only apply when the client is first created for a host.
+    '''
+    mongo = _config()
+    host = host or mongo.get('hostname', DEFAULT_HOST)
+    port = port or mongo.get('port', DEFAULT_PORT)
+
+    key = (host, port)
+
+    with _lock:
+        _check_fork()
+
+        entry = _clients.get(key)
+
+        if entry is None:
+            querylog.configure(mongo.get('slow_query_ms'), mongo.get('slow_query_log'))
+
+            stats = PoolStats()
+            client = MongoClient(
+                host,
+                port,
+                connect=False,
+                connectTimeoutMS=connect_timeout_ms or mongo.get('connect_timeout_ms') or CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=(server_selection_timeout_ms or mongo.get('server_selection_timeout_ms')
+                                          or SERVER_SELECTION_TIMEOUT_MS),
+                event_listeners=[stats, querylog.listener]
+            )
+            entry = _clients[key] = (client, stats)
+
+    return entry[0]
+
+
+def get_db(db_name='tag_model', host=None, port=None):
+    return get_client(host, port)[db_name]
+
+
+def pool_stats(host=None, port=None):
+    '''
+    return: dict of counters for every client, keyed by "host:port"
+    '''
+    with _lock:
+        _check_fork()
+        entries = dict(_clients)
+
+    stats = {}
+
+    for (h, p), (client, listener) in entries.items():
+        if host is not None and h != host:
+            continue
+        if port is not None and p != port:
+            continue
+        stats['{}:{}'.format(h, p)] = listener.as_dict()
+
+    return stats
+
+
+def close_all():
+    with _lock:
+        for client, stats in _clients.values():
+            client.close()
+        _clients.clear()
@@ -6,47 +6,76 @@ path = '//prospero/apps/utilities/Python27/Lib/site-packages'
 if path not in sys.path:
     sys.path.append(path)
 
-from pymongo import MongoClient
-
 sys.dont_write_bytecode = True  # Avoid writing .pyc files
 
-class db():
-    client = None
-    db = None
+class db(object):
+    '''
+    Lazy handle on the tag_model database. Nothing is imported or connected
+    until the first query, so importing this module never touches the network.
+    '''
+
+    def __init__(self, host=None, port=None, db_name='tag_model',
+                 connect_timeout_ms=None, server_selection_timeout_ms=None):
+        '''
+        Host, port and timeouts that aren't given are read from config.mongo
+        (see connection.get_client).
+        '''
+        self.host = host
+        self.port = port
+        self.db_name = db_name
+        self.connect_timeout_ms = connect_timeout_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+
+    @property
+    def client(self):
+        # not kept on the instance, connection shares one client per host and
+        # rebuilds it after a fork
+        from tbautils import connection
+        return connection.get_client(
+            self.host,
+            self.port,
+            connect_timeout_ms=self.connect_timeout_ms,
+            server_selection_timeout_ms=self.server_selection_timeout_ms
+        )
 
-    def __init__(self, host='tbavm1', port=27017, db_name='tag_model'):
-        self.client = MongoClient(host, port)
-        self.db = self.client[db_name]
+    @property
+    def db(self):
+        return self.client[self.db_name]
 
     def get_job_by_name(self, job_name):
-        return self.db.jobs.find_one({'name':job_name})
+        from tbautils import cache
+        return cache.find_one(self.db, 'jobs', {'name':job_name})
 
     def export_asset(self, new_asset):
         print('tba_utils - export asset')
+        from tbautils import assets
 
         # get job tags
         #job_tags =
 
-        # copy current asset to assets_prev
-        asset_curr = self.db.assets_curr.find_one({
-            'name':new_asset['name'],
-            'stage':new_asset['stage'],
-            'entity':new_asset['entity']
-        })
+        # swap asset_curr for the new asset and copy the old one to assets_prev
+        asset_curr = assets.rotate_asset(self.db, assets.asset_key(new_asset), new_asset, insert=new_asset)
 
         if asset_curr:
-            asset_curr_id = asset_curr['_id']
-            del asset_curr['_id']
+            print('tba_utils - Moving {} asset_curr to asset_prev'.format(new_asset['name']))
+            print('tba_utils - asset_curr id {}'.format(asset_curr['_id']))
 
-            asset_id = self.db.assets_prev.insert_one(asset_curr).inserted_id
+    def export_assets(self, new_assets, ordered=False):
+        '''
+        param: new_assets [list] - assets to export in one go
+        param: ordered [boolean] - stop at the first failed write
+        return: list of per-asset result dicts (see assets.rotate_assets)
+        '''
+        print('tba_utils - export {} assets'.format(len(new_assets)))
+        from tbautils import assets
 
-            print('tba_utils - Moving {} asset_curr to asset_prev'.format(new_asset['name']))
-            print('tba_utils - asset_curr id {}'.format(asset_curr_id))
+        results = assets.rotate_assets(self.db, new_assets, ordered=ordered)
+
+        for result in results:
+            if result['error']:
+                print('tba_utils - Failed to export {}: {}'.format(result['name'], result['error']))
 
-            # update asset_curr
-            self.db.assets_curr.update({ '_id': asset_curr_id }, new_asset)
-        else:
-            asset_id = self.db.assets_curr.insert_one(new_asset).inserted_id
+        return results
 
-# create class instance
+# create class instance (connects on first query)
 db = db()
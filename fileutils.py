@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import uuid
+import errno
+import shutil
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+
+class _DirEntry(object):
+    # minimal stand-in for os.DirEntry when scandir isn't available
+
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def scan_dir(folder):
+    '''
+    return: list of DirEntry-like objects for folder
+    '''
+    if scandir is not None:
+        return list(scandir(folder))
+
+    return [_DirEntry(folder, name) for name in os.listdir(folder)]
+
+
+def replace_file(src, dst):
+    '''
+    Rename src over dst in one step, replacing dst if it exists.
+    '''
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif sys.platform == 'win32':
+        import ctypes
+        MOVEFILE_REPLACE_EXISTING = 0x1
+        MOVEFILE_WRITE_THROUGH = 0x8
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(src), unicode(dst), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+            raise ctypes.WinError()
+    else:
+        os.rename(src, dst)
+
+
+def fsync_file(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _file_mode(path, default=0o644):
+    # permissions of the file being replaced, mkstemp creates temp files as 0600
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return default
+
+
+def atomic_write(path, data):
+    '''
+    Write data to a temp file next to path, flush it to disk and rename it
+    into place so readers never see a partial file. The new file keeps the
+    permissions of the one it replaces, or gets 0644.
+    '''
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.chmod(tmp_path, _file_mode(path))
+        replace_file(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def staged_file(path, copy_existing=False, mode=None):
+    '''
+    Stage a replacement for path in a temp file next to it. The temp file is
+    flushed to disk and renamed over path once the block succeeds, and removed
+    if it fails, so readers only ever see the old or the complete new file.
+
+    with staged_file(path, copy_existing=True, mode=0o444) as tmp_path:
+        ...write tmp_path...
+
+    param: copy_existing [boolean] - start from a copy of path if it exists
+    param: mode [int] - permissions to give the file before it is renamed into place,
+        defaults to those of path or 0644
+    '''
+    folder = os.path.dirname(path) or '.'
+    name, ext = os.path.splitext(os.path.basename(path))
+
+    # keep the extension, some writers care about it
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp' + ext, dir=folder)
+    os.close(fd)
+
+    try:
+        if copy_existing and os.path.exists(path):
+            shutil.copyfile(path, tmp_path)
+
+        yield tmp_path
+
+        fsync_file(tmp_path)
+        os.chmod(tmp_path, _file_mode(path) if mode is None else mode)
+
+        # a read-only target can't be replaced on windows
+        if sys.platform == 'win32' and os.path.exists(path):
+            os.chmod(path, 0o700)
+
+        replace_file(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.chmod(tmp_path, 0o700)
+            os.remove(tmp_path)
+        raise
+
+
+class FileLock(object):
+    '''
+    Advisory lock based on exclusively creating a lock file, which also works
+    on network shares. A lock is considered stale and broken if its file is
+    older than stale_after seconds, or if it was taken by a process on this
+    machine that no longer exists.
+
+    The lock file holds a token unique to this acquisition. While the lock is
+    held a heartbeat thread refreshes the file's mtime, so a long publish isn't
+    mistaken for a stale lock, and release() only removes the file if it still
+    holds our token. Stale locks are broken by renaming them to a unique name
+    first, so of two processes breaking the same lock only one removes it and
+    the other can't remove the lock taken in the meantime.
+
+    with FileLock(path + '.lock'):
+        ...
+    '''
+
+    def __init__(self, path, timeout=60.0, stale_after=300.0, poll=0.05, heartbeat=None):
+        '''
+        param: heartbeat [float] - seconds between mtime refreshes while held,
+            defaults to a fifth of stale_after
+        '''
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.poll = poll
+        self.heartbeat = heartbeat or stale_after / 5.0
+        self.wait_time = 0.0
+        self._fd = None
+        self._token = None
+        self._stop = None
+        self._thread = None
+
+    def _new_token(self):
+        return '{} {} {}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+
+    def _read_token(self, path=None):
+        # return: contents of the lock file, None if it is gone
+        try:
+            with open(path or self.path) as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def _stale_token(self):
+        '''
+        return: the token of the current lock file if it is stale, otherwise None
+        '''
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+
+            with open(self.path) as f:
+                token = f.read()
+
+            host, pid = token.split()[:2]
+        except (IOError, OSError, ValueError):
+            # gone or still being written, try again
+            return None
+
+        if age > self.stale_after:
+            return token
+
+        if host == socket.gethostname() and sys.platform != 'win32':
+            try:
+                os.kill(int(pid), 0)
+            except OSError as e:
+                if e.errno == errno.ESRCH:
+                    return token
+
+        return None
+
+    def _break(self, token):
+        # move the lock out of the way under a name nobody else uses, then make
+        # sure it is the one we found stale before removing it
+        broken = '{}.{}.stale'.format(self.path, uuid.uuid4().hex)
+
+        try:
+            os.rename(self.path, broken)
+        except OSError:
+            # already broken or released by someone else
+            return
+
+        if self._read_token(broken) == token:
+            print('tba_utils - Broke stale lock {}'.format(self.path))
+        elif hasattr(os, 'link'):
+            # a new lock was taken after we read the stale one, put it back
+            # unless yet another lock has been taken since
+            try:
+                os.link(broken, self.path)
+            except OSError:
+                pass
+
+        try:
+            os.remove(broken)
+        except OSError:
+            pass
+
+    def _beat(self, token, stop):
+        while not stop.wait(self.heartbeat):
+            if self._read_token() != token:
+                print('tba_utils - Lost lock {}'.format(self.path))
+                return
+
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                pass
+
+    def acquire(self):
+        start = time.time()
+
+        while True:
+            token = self._new_token()
+
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self._fd, token.encode('ascii'))
+                os.fsync(self._fd)
+                break
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            stale = self._stale_token()
+
+            if stale is not None:
+                self._break(stale)
+                continue
+
+            if self.timeout is not None and time.time() - start > self.timeout:
+                raise RuntimeError('Timed out waiting for lock {}'.format(self.path))
+
+            time.sleep(self.poll)
+
+        self.wait_time = time.time() - start
+        self._token = token
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, args=(token, self._stop))
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+
+        os.close(self._fd)
+        self._fd = None
+
+        # only remove the file if it is still our lock
+        if self._read_token() == self._token:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        else:
+            print('tba_utils - Lock {} was taken over before it was released'.format(self.path))
+
+        self._token = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
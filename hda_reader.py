@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import mmap
+
+from hda_version import split_type_name
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Reads the list of definitions in an HDA/OTL library without Houdini, so
+# libraries can be inspected from plain Python.
+#
+# Libraries come in two forms:
+#
+# * Binary libraries are a container that starts with the magic b'INDX'. The
+#   library's INDEX_SECTION is stored uncompressed and holds one text record
+#   per definition ('Operator:', 'Label:', 'Table:', ... lines, records
+#   separated by a blank line). The file is memory mapped and only these
+#   records are read, never the definitions' payloads. The layout of the binary
+#   table of contents isn't documented, so section sizes aren't reported for
+#   binary libraries.
+#
+# * Expanded libraries (hotl -t) are a folder holding the same INDEX_SECTION as
+#   a file plus a Sections.list mapping file names to section names, and one
+#   folder per definition with its own Sections.list. Section sizes are read
+#   from the files.
+#
+# Anything that doesn't match these assumptions raises ValueError, callers
+# should fall back to hou.hda.definitionsInFile when they get one.
+#
+MAGIC = b'INDX'
+SECTIONS_LIST = 'Sections.list'
+INDEX_SECTION = 'INDEX_SECTION'
+
+# the INDEX_SECTION record of a definition, up to the blank line ending it
+_RECORD_RE = re.compile(br'Operator:[ \t]+\S+[^\n]*\n(?:[A-Za-z]+:[^\n]*\n)*')
+_BLANK_LINES_RE = re.compile(br'[\r\n]*')
+_FIELD_RE = re.compile(r'^([A-Za-z]+):[ \t]*(.*?)[ \t\r]*$')
+
+# fields we keep from each record
+_FIELDS = {
+    'Operator': 'name',
+    'Label': 'label',
+    'Table': 'category',
+    'Path': 'path',
+    'Modified': 'modified'
+}
+
+
+def _parse_records(text):
+    '''
+    param: text [string] - INDEX_SECTION contents
+    return: list of definition dicts with name, label, category, path, modified, base_name, version
+    '''
+    definitions = []
+    current = None
+
+    for line in text.splitlines():
+        match = _FIELD_RE.match(line)
+
+        if not match:
+            current = None
+            continue
+
+        key, value = match.groups()
+
+        if key == 'Operator':
+            current = dict((v, None) for v in _FIELDS.values())
+            definitions.append(current)
+
+        if current is not None and key in _FIELDS:
+            current[_FIELDS[key]] = value
+
+    for definition in definitions:
+        base, version = split_type_name(definition['name'])
+        definition.update(base_name=base, version=version, sections=None)
+
+    return definitions
+
+
+def _index_records(data, start):
+    '''
+    The INDEX_SECTION records follow each other with only blank lines between
+    them. Reading stops at the first gap, the rest of the file belongs to other
+    sections, e.g. help text that mentions 'Operator:'.
+    return: list of the record texts after start
+    '''
+    records = []
+    match = _RECORD_RE.search(data, start)
+
+    while match:
+        records.append(match.group(0).decode('utf-8', 'replace'))
+        match = _RECORD_RE.match(data, _BLANK_LINES_RE.match(data, match.end()).end())
+
+    return records
+
+
+def _read_binary(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            raise ValueError('Not an HDA library: {}'.format(path))
+
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError('Not an HDA library, missing INDX header: {}'.format(path))
+
+            start = data.find(INDEX_SECTION.encode('ascii'))
+
+            if start < 0:
+                raise ValueError('No INDEX_SECTION in {}'.format(path))
+
+            records = _index_records(data, start)
+        finally:
+            data.close()
+
+    definitions = _parse_records('\n'.join(records))
+
+    if not definitions:
+        raise ValueError('Could not find any definitions in {}'.format(path))
+
+    return definitions
+
+
+def _read_sections_list(folder):
+    '''
+    return: list of (file name, section name) from folder's Sections.list
+    '''
+    sections = []
+
+    with open(os.path.join(folder, SECTIONS_LIST)) as f:
+        for line in f:
+            parts = line.split()
+
+            # the first line is an empty quoted string
+            if not parts or parts[0] == '""':
+                continue
+
+            sections.append((parts[0], parts[-1]))
+
+    return sections
+
+
+def _read_expanded(path):
+    try:
+        sections = _read_sections_list(path)
+    except (IOError, OSError):
+        raise ValueError('Not an expanded HDA library, no {}: {}'.format(SECTIONS_LIST, path))
+
+    files = dict((name, filename) for filename, name in sections)
+
+    if INDEX_SECTION not in files:
+        raise ValueError('No INDEX_SECTION in {}'.format(path))
+
+    with open(os.path.join(path, files[INDEX_SECTION])) as f:
+        definitions = _parse_records(f.read())
+
+    for definition in definitions:
+        # definition sections are named <category>/<node type name>
+        folder = files.get('{}/{}'.format(definition['category'], definition['name']))
+
+        if folder is None or not os.path.isdir(os.path.join(path, folder)):
+            continue
+
+        folder = os.path.join(path, folder)
+
+        try:
+            definition['sections'] = [
+                {'name': name, 'size': os.path.getsize(os.path.join(folder, filename))}
+                for filename, name in sorted(_read_sections_list(folder), key=lambda x: x[1])
+            ]
+        except (IOError, OSError):
+            definition['sections'] = None
+
+    return definitions
+
+
+def read_definitions(path):
+    '''
+    List the definitions in an HDA library without Houdini.
+
+    param: path [string] - .hda/.otl file, or the folder of an expanded library
+    return: list of dicts with name, base_name, version (HdaVersion or None),
+        label, category, path, modified and sections ([{name, size}] for expanded
+        libraries, None for binary ones)
+    '''
+    if os.path.isdir(path):
+        return _read_expanded(path)
+
+    return _read_binary(path)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='List the definitions in HDA libraries')
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    failed = 0
+
+    for path in args.paths:
+        try:
+            definitions = read_definitions(path)
+        except (IOError, OSError, ValueError) as e:
+            print('{}: {}'.format(path, e))
+            failed += 1
+            continue
+
+        for definition in definitions:
+            size = ''
+
+            if definition['sections'] is not None:
+                size = ' {} bytes in {} sections'.format(
+                    sum(s['size'] for s in definition['sections']), len(definition['sections']))
+
+            print('{}: {}/{}{}'.format(path, definition['category'], definition['name'], size))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
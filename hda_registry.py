@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+
+import hou
+
+from hda_version import split_type_name
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Session registry of installed HDA libraries. hou.hda.installFile and
+# hou.hda.definitionsInFile both rescan the library and refresh node types, so
+# we remember each library's (mtime, size) when it was installed or read and
+# only go back to Houdini once the file has changed on disk.
+#
+_lock = threading.Lock()
+_installed = {}     # library key -> (mtime, size) at install
+_definitions = {}   # library key -> ((mtime, size), [hou.HDADefinition])
+_indexes = {}       # library key -> ((mtime, size), LibraryIndex)
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime, st.st_size
+
+
+def install(path, force=False):
+    '''
+    Install an HDA library unless this version of it is already installed.
+
+    param: path [string] - library file
+    param: force [boolean] - install even if the file hasn't changed
+    return: True if the library was (re)installed, False if it was already up to date
+    '''
+    key = _key(path)
+    stamp = _stamp(path)
+
+    with _lock:
+        if not force and _installed.get(key) == stamp:
+            return False
+
+    hou.hda.installFile(path)
+
+    with _lock:
+        _installed[key] = stamp
+
+    return True
+
+
+def uninstall(path):
+    hou.hda.uninstallFile(path)
+    forget(path)
+
+
+def forget(path):
+    '''
+    Drop everything remembered about a library, e.g. after it was changed outside of the registry.
+    '''
+    key = _key(path)
+
+    with _lock:
+        _installed.pop(key, None)
+        _definitions.pop(key, None)
+        _indexes.pop(key, None)
+
+
+def is_installed(path):
+    key = _key(path)
+
+    with _lock:
+        stamp = _installed.get(key)
+
+    return stamp is not None and os.path.exists(path) and stamp == _stamp(path)
+
+
+def definitions(path):
+    '''
+    return: list of hou.HDADefinition in the library, read again only if the file changed
+    '''
+    key = _key(path)
+    stamp = _stamp(path)
+
+    with _lock:
+        cached = _definitions.get(key)
+
+    if cached is not None and cached[0] == stamp:
+        return list(cached[1])
+
+    defs = list(hou.hda.definitionsInFile(path))
+
+    with _lock:
+        _definitions[key] = (stamp, defs)
+
+    return list(defs)
+
+
+class LibraryIndex(object):
+    '''
+    Definitions of one library by node type name, plus the latest version of
+    each base name.
+    '''
+
+    def __init__(self, defs):
+        self.by_name = {}
+        self.latest = {}    # base name -> (HdaVersion, hou.HDADefinition)
+
+        for definition in defs:
+            name = definition.nodeTypeName()
+            self.by_name[name] = definition
+
+            base, version = split_type_name(name)
+
+            if version is None:
+                continue
+
+            current = self.latest.get(base)
+
+            if current is None or version > current[0]:
+                self.latest[base] = (version, definition)
+
+
+def index(path):
+    '''
+    return: LibraryIndex of the library, rebuilt only if the file changed
+    '''
+    key = _key(path)
+    stamp = _stamp(path)
+
+    with _lock:
+        cached = _indexes.get(key)
+
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    library_index = LibraryIndex(definitions(path))
+
+    with _lock:
+        _indexes[key] = (stamp, library_index)
+
+    return library_index
+
+
+def latest(path, base_name):
+    '''
+    param: path [string] - library file
+    param: base_name [string] - node type name without its version, e.g. 'tba::chair'
+    return: (HdaVersion, hou.HDADefinition) of the highest version in the library, or (None, None)
+    '''
+    return index(path).latest.get(base_name, (None, None))
+
+
+def definition(path, name):
+    '''
+    return: the hou.HDADefinition for node type name in the library, or None
+    '''
+    return index(path).by_name.get(name)
@@ -0,0 +1,101 @@
+import re
+import sys
+from functools import total_ordering
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Version of an HDA as found at the end of its node type name, e.g. the 1.2 in
+# tba::chair::1.2. Versions compare as (major, minor) integers rather than
+# floats, so 1.10 sorts after 1.9 and there are no rounding surprises.
+#
+# Asset documents store the version as written in the node type name, e.g.
+# '0.10', next to a version_key that sorts the same way in Mongo, where text
+# compares character by character.
+#
+VERSION_RE = re.compile(r'^(\d+)(?:\.(\d+))?$')
+
+KEY_FORMAT = '{:06d}.{:06d}'
+
+
+@total_ordering
+class HdaVersion(object):
+
+    __slots__ = ('major', 'minor')
+
+    def __init__(self, major=0, minor=0):
+        self.major = int(major)
+        self.minor = int(minor)
+
+    @classmethod
+    def parse(cls, text):
+        '''
+        param: text [string] - version string such as '1', '1.0' or '1.12'
+        return: HdaVersion, raises ValueError if text isn't a version
+        '''
+        match = VERSION_RE.match(str(text).strip())
+
+        if not match:
+            raise ValueError('Not an HDA version: {!r}'.format(text))
+
+        return cls(match.group(1), match.group(2) or 0)
+
+    def key(self):
+        '''
+        return: zero-padded text that sorts like the version, e.g. '000000.000010' for 0.10
+        '''
+        return KEY_FORMAT.format(self.major, self.minor)
+
+    def next_major(self):
+        return HdaVersion(self.major + 1, 0)
+
+    def next_minor(self):
+        return HdaVersion(self.major, self.minor + 1)
+
+    def _tuple(self):
+        return self.major, self.minor
+
+    def __eq__(self, other):
+        return isinstance(other, HdaVersion) and self._tuple() == other._tuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self._tuple() < other._tuple()
+
+    def __hash__(self):
+        return hash(self._tuple())
+
+    def __str__(self):
+        return '{}.{}'.format(self.major, self.minor)
+
+    def __repr__(self):
+        return 'HdaVersion({}, {})'.format(self.major, self.minor)
+
+
+def split_type_name(name):
+    '''
+    param: name [string] - node type name such as 'tba::chair::1.2'
+    return: (base name, HdaVersion or None if the name has no version)
+    '''
+    if '::' in name:
+        base, _, version = name.rpartition('::')
+
+        try:
+            return base, HdaVersion.parse(version)
+        except ValueError:
+            pass
+
+    return name, None
+
+
+def version_key(version):
+    '''
+    param: version - version as stored on an asset document, e.g. '0.10' or 1
+    return: HdaVersion.key() of it, None if version is None
+    '''
+    if version is None:
+        return None
+
+    return HdaVersion.parse(version).key()
@@ -2,10 +2,17 @@ import sys
 import os
 import re
 import hou
+import time
 import bson
 import datetime
 import xml.etree.ElementTree as ET
 import common
+import assets
+import cache
+import abc_cache
+import metadata
+import hda_version
+import hda_registry
 from stat import S_IREAD, S_IRGRP, S_IROTH
 
 
@@ -57,7 +64,7 @@ def checkout_hda():
     definition.copyToHDAFile(newHdaPath)
 
     # install
-    hou.hda.installFile(newHdaPath)
+    hda_registry.install(newHdaPath)
 
     # open asset for editing
     node.allowEditingOfContents()
@@ -156,8 +163,8 @@ def publish_hda(majorUpdate=True, location='job', filepath=None):
 
     # install new hda to houdini session
     try:
-        hou.hda.installFile(newHdaPath)
-    except hou.OperationFailed:
+        hda_registry.install(newHdaPath)
+    except (hou.OperationFailed, OSError):
         print "Could not install HDA. Is it already in the scene?"
 
     # change selection to use new hda
@@ -298,7 +305,7 @@ def create_lookdev_hda(sel):
 
     # If we find a matching asset, grab its version
     if query:
-        version = query['version'] + 1
+        version = hda_version.HdaVersion.parse(query['version']).major + 1
 
     create_hda(
         'tba::{}_model_lookdev::{}'.format(f_parms['parent_asset_name'], version),
@@ -332,7 +339,7 @@ def publish_lookdev_hda(sel):
     db = common.getDB()
 
     # Get parent_asset
-    parent_asset = db.assets_curr.find_one({ "_id": bson.ObjectId(sel.parm('parent_asset_id').eval()) })
+    parent_asset = cache.find_one(db, 'assets_curr', { "_id": bson.ObjectId(sel.parm('parent_asset_id').eval()) })
 
     # Search for existing shaders attached to parent
     search = {
@@ -348,7 +355,7 @@ def publish_lookdev_hda(sel):
     local_version = int(sel.type().nameComponents()[-1])
     latest_version = 0
     if existing:
-        latest_version = existing['version']
+        latest_version = hda_version.HdaVersion.parse(existing['version']).major
 
     print "Latest version: {}".format(latest_version)
         
@@ -363,7 +370,7 @@ def publish_lookdev_hda(sel):
         latest_file_name = '{}/{}.0.hda'.format(latest_file_dir, latest_name.replace('::', '_'))
         print "Writing to: {}".format(latest_file_name)
         sel.type().definition().copyToHDAFile(latest_file_name, new_name=latest_name)
-        hou.hda.installFile(latest_file_name)
+        hda_registry.install(latest_file_name)
         print "Installed {}".format(latest_file_name)
         sel = sel.changeNodeType(latest_name)
         print "Switched {} to {}".format(sel.name(), latest_name)
@@ -392,35 +399,35 @@ def publish_lookdev_hda(sel):
 
     #
     # Move current existing shader entry to assets_prev then update in place
-    # the assets_curr
+    # the assets_curr. New assets borrow from the parent_asset entry.
     #
-    if existing:
-        id = existing['_id']
-        del existing['_id']
-        db.assets_prev.insert(existing)
-        db.assets_curr.update_one(
-            { '_id': bson.ObjectId(id) },
-            { '$set': {
-                'version': latest_version,
-                'dateCreated': datetime.datetime.utcnow(),
-                'filepath': r_filepath,
-                'author': os.environ['USERNAME']
-            }}
-        )
+    new_asset = dict(parent_asset)
+    del new_asset['_id']
+    new_asset['type'] = 'shader'
+    new_asset['version'] = str(latest_version)      # This should be 1 if our logic is sound.
+    new_asset['version_key'] = hda_version.version_key(latest_version)
+    new_asset['author'] = os.environ['USERNAME']
+    new_asset['filepath'] = r_filepath
+    new_asset['dateCreated'] = datetime.datetime.utcnow()
+
+    # file size, hash and definitions, stored so the browser doesn't have to open the library
+    hda_metadata = metadata.safe_metadata(metadata.hda_metadata, r_filepath, node_type_name=sel.type().name())
+    new_asset.update(hda_metadata)
+
+    update = {
+        'version': str(latest_version),
+        'version_key': hda_version.version_key(latest_version),
+        'dateCreated': datetime.datetime.utcnow(),
+        'filepath': r_filepath,
+        'author': os.environ['USERNAME']
+    }
+    update.update(hda_metadata)
+
+    previous = assets.rotate_asset(db, search, { '$set': update }, insert=new_asset)
 
+    if previous:
         hou.ui.displayMessage("Updated asset to version {}".format(latest_version))
     else:
-        #
-        # New asset, borrow from parent_asset entry
-        #
-        new_asset = parent_asset
-        del new_asset['_id']
-        new_asset['type'] = 'shader'
-        new_asset['version'] = latest_version       # This should be 1 if our logic is sound.
-        new_asset['author'] = os.environ['USERNAME']
-        new_asset['filepath'] = r_filepath,
-        new_asset['dateCreated'] = datetime.datetime.utcnow()
-        db.assets_curr.insert(new_asset)
         hou.ui.displayMessage("Installed new asset into database!".format(latest_version))
 
     print "DONE!"
@@ -429,86 +436,151 @@ def publish_lookdev_hda(sel):
 
 # Import Houdini Asset into the scene. Requires a pymongo database
 # object and a unique object id (of the asset entry)
-def importHoudiniAsset(db, obj_id):
-    import hou
-    import _alembic_hom_extensions as abc
+def importHoudiniAsset(db, obj_id, resolved=None):
+    # Fetch our obj_id and all its dependencies up front, searching assets_curr, then assets_prev
+    if resolved is None:
+        resolved = assets.resolve_closure(db, [obj_id])
+
+    assets_root = _get_assets_root()
+    existing = dict((x.name(), x) for x in assets_root.children())
+
+    return _build_asset(assets_root, existing, resolved, obj_id)
+
+
+# Import many assets at once. Everything is built inside a single undo group
+# with cooking suppressed and laid out once at the end.
+def importHoudiniAssets(db, obj_ids):
+    '''
+    param: db - pymongo database
+    param: obj_ids [list] - ids of the asset entries to import
+    return: (list of containers in obj_ids order, dict of seconds spent per phase)
+    '''
+    timings = {}
+    start = time.time()
+
+    resolved = assets.resolve_closure(db, obj_ids)
+    timings['resolve'] = time.time() - start
+
+    containers = []
+
+    with hou.undos.group('Import {} assets'.format(len(obj_ids))):
+        update_mode = hou.updateModeSetting()
+        hou.setUpdateMode(hou.updateMode.Manual)
+
+        try:
+            phase = time.time()
+            assets_root = _get_assets_root()
+            existing = dict((x.name(), x) for x in assets_root.children())
+            layout_nodes = []
 
-    # Search assets_curr, then assets_prev for our obj_id
-    asset = db.assets_curr.find_one({"_id": obj_id})
+            for obj_id in obj_ids:
+                containers.append(_build_asset(assets_root, existing, resolved, obj_id, layout_nodes))
+
+            timings['build'] = time.time() - phase
+
+            phase = time.time()
+
+            if layout_nodes:
+                assets_root.layoutChildren(layout_nodes)
+
+            timings['layout'] = time.time() - phase
+        finally:
+            hou.setUpdateMode(update_mode)
+
+    timings['total'] = time.time() - start
+
+    print 'tba_utils - Imported {} assets in {:.2f}s (resolve {:.2f}s, build {:.2f}s, layout {:.2f}s)'.format(
+        len(obj_ids), timings['total'], timings['resolve'], timings['build'], timings['layout'])
+
+    return containers, timings
+
+
+def _get_assets_root():
+    assets_root = hou.node('/obj/ASSETS')
+
+    if assets_root is None:
+        assets_root = hou.node('/obj').createNode('subnet', 'ASSETS')
+
+    return assets_root
+
+
+# Build the nodes for a single resolved asset under assets_root. existing maps
+# the names of nodes already in assets_root to the nodes and is kept up to date,
+# so we don't look up every node by path. Nodes that need laying out are added
+# to layout_nodes, or laid out straight away if it isn't given.
+def _build_asset(assets_root, existing, resolved, obj_id, layout_nodes=None):
+    asset = resolved.get(obj_id)
 
     if not asset:
-        asset = db.assets_prev.find_one({"_id": obj_id})
-
-    if asset:
-
-        asset_name = '{}_{}'.format(asset['name'], asset['type'])
-        assets_root = hou.node('/obj/ASSETS')
-
-        if assets_root is None:
-            assets_root = hou.node('/obj').createNode('subnet', 'ASSETS')
-
-        asset_container = hou.node('/obj/ASSETS/{}'.format(asset_name))
-
-        if asset_container is None:
-
-            # Special case for layout
-            if asset['type'] == 'layout':
-                asset_node = assets_root.createNode('alembicxform', asset_name)
-                asset_node.parm('fileName').set(asset['filepath'])
-                obj_paths = [
-                    x for i,x in enumerate(abc.alembicGetObjectPathListForMenu(str(asset['filepath'])))
-                    if i % 2
-                    and x is not  '/'
-                ]
-                asset_node.parm('objectPath').set(obj_paths[0])
-                asset_connection = hou.node('/obj/ASSETS/{}_model'.format(asset['name']))
-
-                # If model counterpart is not in scene, bring in model attached to layout
-                if asset_connection is None:
-                    asset_connection = importHoudiniAsset(db, asset['dep_model_id'])
-
-                asset_connection.setInput(0, asset_node)
-                assets_root.layoutChildren([asset_node, asset_connection])
-
-            # Special case for shader
-            elif asset['type'] == 'shader':
-                hou.hda.installFile(asset['filepath'])
-                defs = hou.hda.definitionsInFile(asset['filepath'])
-                p_def = [x for x in defs if int(x.nodeType().nameComponents()[-1]) == asset['version']][0]
-                hou.node('/out').createNode(p_def.nodeTypeName(), '{}_lookdev'.format(asset_name))
-                print "Installed HDA {}".format(p_def.nodeTypeName())
-            else:
-                asset_container = assets_root.createNode('geo', asset_name)
-
-                # Attach parent asset properties to asset node
-                parent_properties = {
-                    '_id':      'id',
-                    'name':     'name',
-                    'stage':    'stage',
-                    'entity':   'entity',
-                    'type':     'type',
-                    'version':  'version',
-                    'filepath': 'filepath',
-                    'job_id':   'job_id'
-                }
-
-                pg = asset_container.parmTemplateGroup()
-                fldr = hou.FolderParmTemplate(name='fldr_parent', label='Parent Asset', folder_type=hou.folderType.Tabs)
-
-                for k,v in parent_properties.iteritems():
-                    prm = hou.StringParmTemplate('parent_asset_{}'.format(v), v, 1)
-                    prm.setDefaultValue([str(asset[k])])
-                    prm.setDisableWhen("{{ parent_asset_{} != ''}}".format(k))
-                    fldr.addParmTemplate(prm)
-
-                pg.append(fldr)
-                asset_container.setParmTemplateGroup(pg)
-                asset_node = hou.node('/obj/ASSETS/{}/{}'.format(asset_name, asset_name))
-
-                if asset_node is not None:
-                    asset_node.destroy()
-
-                asset_node = asset_container.createNode('alembic', asset_name)
-                asset_node.parm('fileName').set(asset['filepath'])
-
-        return asset_container
\ No newline at end of file
+        return None
+
+    asset_name = '{}_{}'.format(asset['name'], asset['type'])
+    asset_container = existing.get(asset_name)
+
+    if asset_container is not None:
+        return asset_container
+
+    # Special case for layout
+    if asset['type'] == 'layout':
+        asset_node = assets_root.createNode('alembicxform', asset_name)
+        asset_node.parm('fileName').set(asset['filepath'])
+        existing[asset_name] = asset_node
+        obj_paths = abc_cache.get_hierarchy(asset['filepath'])['paths']
+        asset_node.parm('objectPath').set(obj_paths[0])
+        asset_connection = existing.get('{}_model'.format(asset['name']))
+
+        # If model counterpart is not in scene, bring in model attached to layout
+        if asset_connection is None:
+            asset_connection = _build_asset(assets_root, existing, resolved, asset['dep_model_id'], layout_nodes)
+
+        asset_connection.setInput(0, asset_node)
+
+        if layout_nodes is None:
+            assets_root.layoutChildren([asset_node, asset_connection])
+        else:
+            layout_nodes.extend([asset_node, asset_connection])
+
+    # Special case for shader
+    elif asset['type'] == 'shader':
+        hda_registry.install(asset['filepath'])
+        defs = hda_registry.definitions(asset['filepath'])
+        version = hda_version.HdaVersion.parse(asset['version'])
+        p_def = [x for x in defs if hda_version.split_type_name(x.nodeTypeName())[1] == version][0]
+        hou.node('/out').createNode(p_def.nodeTypeName(), '{}_lookdev'.format(asset_name))
+        print "Installed HDA {}".format(p_def.nodeTypeName())
+    else:
+        asset_container = assets_root.createNode('geo', asset_name)
+        existing[asset_name] = asset_container
+
+        # Attach parent asset properties to asset node
+        parent_properties = {
+            '_id':      'id',
+            'name':     'name',
+            'stage':    'stage',
+            'entity':   'entity',
+            'type':     'type',
+            'version':  'version',
+            'filepath': 'filepath',
+            'job_id':   'job_id'
+        }
+
+        pg = asset_container.parmTemplateGroup()
+        fldr = hou.FolderParmTemplate(name='fldr_parent', label='Parent Asset', folder_type=hou.folderType.Tabs)
+
+        for k,v in parent_properties.iteritems():
+            prm = hou.StringParmTemplate('parent_asset_{}'.format(v), v, 1)
+            prm.setDefaultValue([str(asset[k])])
+            prm.setDisableWhen("{{ parent_asset_{} != ''}}".format(k))
+            fldr.addParmTemplate(prm)
+
+        pg.append(fldr)
+        asset_container.setParmTemplateGroup(pg)
+        asset_node = asset_container.node(asset_name)
+
+        if asset_node is not None:
+            asset_node.destroy()
+
+        asset_node = asset_container.createNode('alembic', asset_name)
+        asset_node.parm('fileName').set(asset['filepath'])
+
+    return asset_container
@@ -0,0 +1,161 @@
+import sys
+
+import bson
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+import assets
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+ASSET_KEY = [(k, ASCENDING) for k in assets.ASSET_KEY]
+
+# Old HDA publishes were stored without a name or type and can't be told apart,
+# so only named assets have to be unique
+NAMED_ASSETS = {'name': {'$gt': ''}}
+
+# collection -> list of (index name, keys, options)
+INDEXES = {
+    'assets_curr': [
+        ('asset_key', ASSET_KEY, {'unique': True, 'partialFilterExpression': NAMED_ASSETS}),
+        ('job_id', [('job_id', ASCENDING)], {}),
+        ('content_hash', [('content_hash', ASCENDING)], {}),
+        ('job_type_objects', [('job_id', ASCENDING), ('type', ASCENDING), ('object_count', ASCENDING)], {}),
+        ('definitions_name', [('definitions.name', ASCENDING)], {}),
+        ('publish_id', [('publish_id', ASCENDING)], {'sparse': True})
+    ],
+    'assets_prev': [
+        ('asset_key', ASSET_KEY, {}),
+        ('publish_id', [('publish_id', ASCENDING)], {'sparse': True})
+    ],
+    'jobs': [
+        ('name', [('name', ASCENDING)], {'unique': True})
+    ]
+}
+
+# Every filter shape the tools query by, with placeholder values. Keep this in
+# sync with houdini.py, tba_hda.py, db.py and AssetBrowser.
+QUERY_SHAPES = [
+    ('assets_curr', {'name': 'x', 'stage': '', 'entity': '', 'type': ''}),   # named, see NAMED_ASSETS
+    ('assets_curr', {'_id': bson.ObjectId()}),
+    ('assets_curr', {'job_id': bson.ObjectId()}),
+    ('assets_curr', {'content_hash': ''}),
+    ('assets_curr', {'job_id': bson.ObjectId(), 'type': '', 'object_count': {'$gte': 0}}),
+    ('assets_curr', {'definitions.name': ''}),
+    ('assets_curr', {'publish_id': {'$in': [bson.ObjectId()]}}),
+    ('assets_prev', {'_id': bson.ObjectId()}),
+    ('assets_prev', {'name': '', 'stage': '', 'entity': '', 'type': ''}),
+    ('assets_prev', {'publish_id': {'$in': [bson.ObjectId()]}}),
+    ('jobs', {'name': ''}),
+    ('jobs', {'_id': bson.ObjectId()})
+]
+
+
+def ensure_indexes(db):
+    '''
+    Create any missing indexes. Safe to run repeatedly.
+
+    param: db - pymongo database
+    return: list of (collection, index name, error) for indexes that could not be built
+    '''
+    failed = []
+
+    for collection, indexes in INDEXES.items():
+        for name, keys, options in indexes:
+            try:
+                db[collection].create_index(keys, name=name, **options)
+            except OperationFailure as e:
+                # most likely existing duplicates blocking a unique index
+                print('tba_utils - Could not create index {}.{}: {}'.format(collection, name, e))
+                failed.append((collection, name, str(e)))
+
+    return failed
+
+
+def duplicate_assets(db, limit=50):
+    '''
+    Find named assets that have more than one row in assets_curr. These block
+    the unique asset_key index.
+
+    return: list of (asset key dict, [_id, ...]) for at most limit assets
+    '''
+    pipeline = [
+        {'$match': NAMED_ASSETS},
+        {'$group': {'_id': dict((k, '$' + k) for k in assets.ASSET_KEY),
+                    'ids': {'$push': '$_id'},
+                    'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': limit}
+    ]
+
+    return [(group['_id'], group['ids']) for group in db.assets_curr.aggregate(pipeline)]
+
+
+def _plan_stages(plan):
+    # flatten the stage names of an explain() winning plan
+    stages = [plan.get('stage')]
+
+    if 'inputStage' in plan:
+        stages += _plan_stages(plan['inputStage'])
+
+    for stage in plan.get('inputStages', []):
+        stages += _plan_stages(stage)
+
+    return stages
+
+
+def check_query_plans(db):
+    '''
+    Run explain() on every query shape.
+
+    param: db - pymongo database
+    return: list of (collection, filter keys, plan stages) for every shape
+    '''
+    plans = []
+
+    for collection, query in QUERY_SHAPES:
+        explain = db[collection].find(query).limit(1).explain()
+        stages = _plan_stages(explain['queryPlanner']['winningPlan'])
+        plans.append((collection, sorted(query.keys()), stages))
+
+    return plans
+
+
+def verify_query_plans(db):
+    '''
+    Raise a RuntimeError if any known query shape falls back to a collection scan.
+    '''
+    scans = [(c, k) for c, k, stages in check_query_plans(db) if 'COLLSCAN' in stages]
+
+    if scans:
+        raise RuntimeError('Collection scans for: {}'.format(
+            ', '.join('{} {}'.format(c, k) for c, k in scans)))
+
+
+if __name__ == '__main__':
+    import connection
+
+    db = connection.get_db('tag_model')
+    failed = ensure_indexes(db)
+
+    if ('assets_curr', 'asset_key') in [(c, n) for c, n, e in failed]:
+        print('')
+        print('ERROR: assets_curr has no unique asset_key index. Concurrent publishes of the')
+        print('same asset can create duplicate rows until these duplicates are removed:')
+
+        for key, ids in duplicate_assets(db):
+            print('  {} -> {}'.format(', '.join('{}={}'.format(k, key.get(k)) for k in assets.ASSET_KEY),
+                                      ', '.join(str(i) for i in ids)))
+        print('')
+
+    if failed:
+        sys.exit(1)
+
+    for collection, keys, stages in check_query_plans(db):
+        print('{} {}: {}'.format(collection, keys, ' <- '.join(stages)))
+
+    try:
+        verify_query_plans(db)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,350 @@
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import bson
+from bson import json_util
+from pymongo.errors import ConnectionFailure
+
+import assets
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Write-behind journal for publish records. Publishing appends a record to a
+# local SQLite spool and returns straight away; a background thread replays the
+# records against assets_curr / assets_prev in order, backing off while the
+# database is unreachable. Records survive a crash or a closed session and are
+# flushed the next time a journal is started on the same file.
+#
+# Replaying a record is safe after a failure at any point: every record has a
+# publish_id that its write to assets_curr is stamped with, so it is only
+# applied once, and the version it replaced is kept with the record until it
+# has been written to assets_prev.
+#
+# Several sessions can drain the same file. Each one claims a batch of records
+# before replaying it; a claim left behind by a session that died expires
+# after claim_timeout seconds.
+#
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.tbautils', 'publish_journal.sqlite')
+
+KINDS = ('rotate', 'hda', 'insert')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    owner TEXT,
+    claimed_at REAL
+)
+'''
+
+# added after the first release, journals created before lack them
+_CLAIM_COLUMNS = ('owner TEXT', 'claimed_at REAL')
+
+
+class PublishJournal(object):
+
+    def __init__(self, path=DEFAULT_PATH, get_db=None, batch_size=50, max_backoff=300.0, claim_timeout=300.0):
+        '''
+        param: path [string] - SQLite file to spool records to
+        param: get_db [function] - returns the pymongo database to flush to, defaults to common.getDB
+        param: batch_size [int] - max records applied per pass
+        param: max_backoff [float] - max seconds to wait between retries
+        param: claim_timeout [float] - seconds after which another session's claim on records is ignored
+        '''
+        if get_db is None:
+            import common
+            get_db = common.getDB
+
+        self.path = path
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.claim_timeout = claim_timeout
+        self.owner = uuid.uuid4().hex
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._idle_lock = threading.Lock()
+        self._thread = None
+
+        folder = os.path.dirname(path)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(journal)')]
+
+            for column in _CLAIM_COLUMNS:
+                if column.split()[0] in columns:
+                    continue
+
+                try:
+                    conn.execute('ALTER TABLE journal ADD COLUMN ' + column)
+                except sqlite3.OperationalError as e:
+                    # another session added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+
+    @contextmanager
+    def _connect(self):
+        # sqlite connections can't be shared between threads, so open one per use
+        conn = sqlite3.connect(self.path, timeout=30)
+
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def append(self, kind, **payload):
+        '''
+        Queue a publish record.
+
+        param: kind [string] - 'rotate' (see assets.rotate_asset), 'hda' (see
+            assets.hda_rotation) or 'insert'
+        param: payload - keyword arguments for that operation
+        return: id of the journal record
+        '''
+        if kind not in KINDS:
+            raise ValueError('Unknown journal record kind: {}'.format(kind))
+
+        payload['publish_id'] = bson.ObjectId()
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO journal (kind, payload, created) VALUES (?, ?, ?)',
+                (kind, json_util.dumps(payload), time.time()))
+            record_id = cursor.lastrowid
+
+        with self._idle_lock:
+            self._idle.clear()
+            self._wake.set()
+
+        return record_id
+
+    def pending(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM journal WHERE status = 'pending'").fetchone()[0]
+
+    def failed(self):
+        '''
+        return: list of (id, kind, payload, error) for records that were rejected by the database
+        '''
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, kind, payload, error FROM journal WHERE status = 'failed'").fetchall()
+
+        return [(i, k, json_util.loads(p), e) for i, k, p, e in rows]
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='tbautils-publish-journal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout=None):
+        '''
+        Block until every pending record has been written or timeout seconds pass.
+        return: True if the journal is empty
+        '''
+        self.start()
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._flush_batch()
+
+            if delay is None:
+                # don't report idle if a record was appended since we looked
+                with self._idle_lock:
+                    if not self._wake.is_set():
+                        self._idle.set()
+                delay = 5.0
+
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _claim(self):
+        '''
+        Claim the oldest pending records for this journal. Selecting and
+        claiming happen in one write transaction, so no two sessions get the
+        same record.
+
+        return: (rows, delay) - the claimed (id, kind, payload, attempts,
+            next_attempt) rows, or no rows and the seconds to wait before
+            trying again (None if nothing is pending)
+        '''
+        now = time.time()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                "SELECT id, kind, payload, attempts, next_attempt, owner, claimed_at FROM journal "
+                "WHERE status = 'pending' ORDER BY id LIMIT ?", (self.batch_size,)).fetchall()
+
+            if not rows:
+                return [], None
+
+            claimed = []
+
+            # records are replayed in order, stop at the first one another session holds
+            for row in rows:
+                owner, claimed_at = row[5:]
+
+                if owner not in (None, self.owner) and claimed_at > now - self.claim_timeout:
+                    break
+
+                claimed.append(row[:5])
+
+            if not claimed:
+                return [], 1.0
+
+            # wait for the oldest one
+            if claimed[0][4] > now:
+                return [], claimed[0][4] - now
+
+            conn.executemany('UPDATE journal SET owner = ?, claimed_at = ? WHERE id = ?',
+                             [(self.owner, now, row[0]) for row in claimed])
+            conn.execute('COMMIT')
+        finally:
+            # rolls back unless committed
+            conn.close()
+
+        return claimed, None
+
+    def _flush_batch(self):
+        # return: seconds until the next batch is due, or None if nothing is pending
+        rows, delay = self._claim()
+
+        if not rows:
+            return delay
+
+        try:
+            db = self.get_db()
+        except ConnectionFailure as e:
+            self._release()
+            return self._backoff(rows[0], e)
+
+        done = []
+
+        try:
+            for row in rows:
+                record_id, kind, payload, attempts, next_attempt = row
+
+                try:
+                    self._apply(db, record_id, kind, json_util.loads(payload))
+                except ConnectionFailure as e:
+                    return self._backoff(row, e)
+                except Exception as e:
+                    # the database rejected the record, keep it aside for inspection
+                    print('tba_utils - Publish record {} failed: {}'.format(record_id, e))
+                    with self._connect() as conn:
+                        conn.execute(
+                            "UPDATE journal SET status = 'failed', attempts = ?, error = ? WHERE id = ?",
+                            (attempts + 1, str(e), record_id))
+                    continue
+
+                done.append(record_id)
+        finally:
+            with self._connect() as conn:
+                conn.executemany('DELETE FROM journal WHERE id = ?', [(i,) for i in done])
+
+            self._release()
+
+        return 0
+
+    def _release(self):
+        # hand back the records this journal claimed but didn't finish
+        with self._connect() as conn:
+            conn.execute('UPDATE journal SET owner = NULL, claimed_at = NULL WHERE owner = ?', (self.owner,))
+
+    def _backoff(self, row, error):
+        record_id, kind, payload, attempts, next_attempt = row
+        delay = min(self.max_backoff, 2.0 ** attempts)
+
+        print('tba_utils - Database unavailable ({}), retrying in {:.0f}s'.format(error, delay))
+
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE journal SET attempts = ?, next_attempt = ?, error = ? WHERE id = ?',
+                (attempts + 1, time.time() + delay, str(error), record_id))
+
+        return delay
+
+    def _save_payload(self, record_id, payload):
+        with self._connect() as conn:
+            conn.execute('UPDATE journal SET payload = ? WHERE id = ?', (json_util.dumps(payload), record_id))
+
+    def _apply(self, db, record_id, kind, payload):
+        if 'publish_id' not in payload:
+            # queued before records had one, it has to stay the same across retries
+            payload['publish_id'] = bson.ObjectId()
+            self._save_payload(record_id, payload)
+
+        publish_id = payload['publish_id']
+
+        if kind == 'insert':
+            document = dict(payload['document'], publish_id=publish_id)
+            db.assets_curr.replace_one({'publish_id': publish_id}, document, upsert=True)
+            return
+
+        if 'previous' not in payload:
+            if kind == 'hda':
+                query, update, insert = assets.hda_rotation(db, payload['publish'])
+            else:
+                query, update, insert = payload['query'], payload['update'], payload.get('insert')
+
+            previous = assets.swap_current(db, query, update, insert=insert, publish_id=publish_id)
+
+            # keep the replaced version until it is in assets_prev, a retry
+            # from here on must not swap again and can't read it back
+            payload['previous'] = previous
+            self._save_payload(record_id, payload)
+
+        if payload['previous'] is not None:
+            assets.save_history(db, payload['previous'])
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    '''
+    return: the shared PublishJournal for this session, started on first use
+    '''
+    global _journal
+
+    with _journal_lock:
+        if _journal is None:
+            _journal = PublishJournal()
+            _journal.start()
+
+    return _journal
@@ -1,29 +1,106 @@
+from __future__ import absolute_import
+
 import os
+import sys
+import shutil
 import getpass
 import datetime
+import tempfile
+from collections import namedtuple
 
 import maya.cmds as mc
+import maya.mel as mel
+
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
 
 from tbautils import common
+from tbautils import versions
+from tbautils import maya_batch
+from tbautils import metadata
+from tbautils import abc_cache
+from tbautils import fileutils
 
 sys.dont_write_bytecode = True  # Avoid writing .pyc files
 
 ## ASSETS ##
-def get_tba_assets():
-    tba_sets = mc.ls('tba_asset*', type='objectSet')
+TBA_ASSET_ATTRS = ['name', 'type', 'stage', 'entity', 'author', 'dateCreated', 'dateUpdated', 'version', 'tags']
 
-    tba_assets = []
+# Compact, read-only record for scenes with a lot of assets
+TbaAsset = namedtuple('TbaAsset', TBA_ASSET_ATTRS)
+
+def get_tba_assets(compact=False):
+    '''
+    param: compact [boolean] - return TbaAsset tuples instead of dicts
+    return: list of assets read from the tba_asset* sets
+    '''
+    if om is not None:
+        rows = _read_tba_sets_api()
+    else:
+        rows = _read_tba_sets_cmds()
 
-    for tba_set in tba_sets:
-        asset = {}
+    if compact:
+        return [TbaAsset._make(row) for row in rows]
 
-        # populate string attributes
-        for attr in ['name', 'type', 'stage', 'entity', 'author', 'dateCreated', 'dateUpdated', 'version', 'tags']:
-            asset[attr] = mc.getAttr(tba_set + '.' + attr)
+    return [dict(zip(TBA_ASSET_ATTRS, row)) for row in rows]
 
-        tba_assets.append(asset)
+def _read_tba_sets_cmds():
+    # one getAttr per attribute, only used when OpenMaya 2 isn't available
+    rows = []
 
-    return tba_assets
+    for tba_set in mc.ls('tba_asset*', type='objectSet'):
+        rows.append(tuple(mc.getAttr(tba_set + '.' + attr) for attr in TBA_ASSET_ATTRS))
+
+    return rows
+
+def _read_tba_sets_api():
+    # read every set's plugs in a single pass through the API instead of
+    # going through the command engine for each attribute
+    sel = om.MSelectionList()
+
+    try:
+        sel.add('tba_asset*')
+    except RuntimeError:
+        # nothing matches the pattern
+        return []
+
+    rows = []
+
+    for i in range(sel.length()):
+        obj = sel.getDependNode(i)
+
+        if not obj.hasFn(om.MFn.kSet):
+            continue
+
+        fn = om.MFnDependencyNode(obj)
+        rows.append(tuple(_read_plug(fn, attr) for attr in TBA_ASSET_ATTRS))
+
+    return rows
+
+def _read_plug(fn, attr):
+    try:
+        plug = fn.findPlug(attr, False)
+    except RuntimeError:
+        return None
+
+    if attr == 'version':
+        return plug.asInt()
+
+    if attr == 'tags':
+        try:
+            data = plug.asMObject()
+        except RuntimeError:
+            # array was never set
+            return []
+
+        if data.isNull():
+            return []
+
+        return list(om.MFnStringArrayData(data).array())
+
+    return plug.asString()
 
 def create_tba_assets():
     # get maya selection
@@ -138,59 +215,212 @@ def get_scene_path():
 
 
 ## ABC ##
-def export_abc(asset):
+def _task_path(asset, data):
+    # folder holding the asset's vNNN folders
+    publish_path = os.path.join(data['job_path'], 'vfx', data['stage'], '_published3d')
+    return os.path.join(publish_path, asset['name'], asset['type'])
+
+def _prepare_abc_export(asset):
     '''
+    Build the AbcExport job for an asset's set.
     param: asset [asset] - asset to be exported
-    return: success - filepath
+    return: (AbcExport job arguments without -file, number of objects the job
+        writes), or (None, 0) if the set is empty
     '''
-
-    tba_set = 'tba_asset_' + asset['name']
-
     rootObjs = get_set_contents(asset['name'])
 
     if not rootObjs:
         print('TBA set does not contain any valid objects')
-        return
+        return None, 0
 
-    data = tba_utils.parse_job_path(get_scene_path())
-    publish_path = os.path.join(data['job_path'], 'vfx', data['stage'], '_published3d')
-    task_path = os.path.join(publish_path, asset['name'], asset['type'])
+    root = ''
 
-    if not os.path.exists(task_path):
-        os.makedirs(task_path)
-        latest_version = 0
-    else:
-        # find latest version on disk and version up
-        versions = os.listdir(task_path)
+    for obj in rootObjs:
+        root += ' -root ' + obj
 
-        if len(versions) == 0:
-            latest_version = 0
-        else:
-            versionStr = sorted(versions)[-1]
-            latest_version = int(versionStr[1:])
+    # every dag node under the roots becomes an Alembic object
+    object_count = len(mc.ls(rootObjs, dag=True, noIntermediate=True) or [])
 
-    asset['version'] = latest_version + 1
-    version = 'v' + str(latest_version + 1).zfill(3)
+    return '-uvWrite -worldSpace{0}'.format(root), object_count
 
-    export_path = os.path.join(task_path, version)
+def _current_asset(asset):
+    # assets_curr entry of an asset, None if there isn't one or the database can't be reached.
+    # Not read through tbautils.cache: a version someone else published within
+    # its TTL must not make this export look unchanged.
+    # tbautils.db goes first, it puts pymongo on the path
+    from tbautils.db import db as tba_db
+    from tbautils.assets import asset_key
+    from pymongo.errors import PyMongoError
 
-    if not os.path.exists(export_path):
-        os.makedirs(export_path)
+    try:
+        return tba_db.db.assets_curr.find_one(asset_key(asset))
+    except PyMongoError as e:
+        print('Could not look up the current version of {}: {}'.format(asset['name'], e))
+        return None
 
-    asset['filepath'] = os.path.join(export_path, asset['name'] + '.abc' )
+def _finish_export(asset, data, local_path, frame_range=None, object_count=None):
+    '''
+    Publish an export written to local scratch. It is hashed there first: if
+    the content is identical to the asset's current version nothing is copied
+    and the asset keeps pointing at the current one. Otherwise the next version
+    is allocated and the file is copied into its folder under a temp name and
+    renamed, so a failed or killed export leaves nothing on the share.
+    param: asset [asset] - version/filepath/dateUpdated are set on it
+    param: data [dict] - parsed job path of the scene
+    param: local_path [string] - exported .abc in local scratch
+    param: frame_range [tuple] - (start, end) frames the export wrote
+    param: object_count [int] - number of objects the export wrote
+    return: 'exported' or 'unchanged'
+    '''
+    try:
+        content_hash = metadata.abc_content_hash(local_path)
+    except (IOError, OSError) as e:
+        print('Could not hash {}: {}'.format(local_path, e))
+        content_hash = None
+
+    current = _current_asset(asset) if content_hash else None
+
+    if current and current.get('content_hash') == content_hash:
+        asset.update(version=current['version'], filepath=current['filepath'], content_hash=content_hash)
+        print('{} is unchanged since version {}, nothing to publish'.format(asset['name'], current['version']))
+        return 'unchanged'
+
+    index = versions.VersionIndex(_task_path(asset, data))
+    number, export_path = index.allocate()
+    filepath = os.path.join(export_path, asset['name'] + '.abc')
+
+    try:
+        with fileutils.staged_file(filepath) as tmp_path:
+            shutil.copyfile(local_path, tmp_path)
+    except:
+        index.release(number)
+        raise
+
+    asset['version'] = number
+    asset['filepath'] = filepath
     asset['dateUpdated'] = datetime.datetime.utcnow()
 
-    root = ''
+    _record_export(asset, frame_range, content_hash, object_count)
+    return 'exported'
 
-    for obj in rootObjs:
-        root += ' -root ' + obj
+def _record_export(asset, frame_range=None, content_hash=None, object_count=None):
+    # update maya set and version index once the file has been written
+    update_tba_asset(asset)
 
-    command = '-uvWrite -worldSpace{0} -file {1}'.format(root, asset['filepath'])
+    task_path = os.path.dirname(os.path.dirname(asset['filepath']))
+    versions.VersionIndex(task_path).record(asset['version'], asset['filepath'])
 
-    mc.AbcExport ( jobArg = command )
+    # size, hash, frame range and object count for the asset document, taken
+    # from the export so the archive doesn't have to be traversed here
+    asset.update(metadata.safe_metadata(metadata.abc_metadata, asset['filepath'], frame_range=frame_range,
+                                        fps=mel.eval('currentTimeUnitToFPS()'), content_hash=content_hash,
+                                        object_count=object_count))
 
-    # update maya set
+    # read the hierarchy in the background so importing the cache later doesn't have to
+    abc_cache.warm([asset['filepath']])
 
-    update_tba_asset(asset)
+def export_abc(asset, chunks=None, frame_range=None):
+    '''
+    param: asset [asset] - asset to be exported
+    param: chunks [int] - split the frame range across this many mayapy processes.
+        Only worth it for long caches, the scene must be saved first.
+    param: frame_range [tuple] - (start, end) for chunked exports, defaults to the playback range
+    return: success - filepath
+    '''
+    if chunks and chunks > 1:
+        return _export_abc_chunked(asset, chunks, frame_range)
+
+    result = export_abcs([asset])[0]
+
+    if result['status'] not in ('exported', 'unchanged'):
+        return
+
+    return result['asset']
+
+def export_abcs(assets):
+    '''
+    Export several assets with a single AbcExport call so the scene is only
+    evaluated once for all of them.
+    param: assets [list] - assets to be exported
+    return: list of {'asset', 'status', 'error'} dicts in the same order, where
+        status is 'exported', 'unchanged' (same content as the current version,
+        nothing published), 'skipped' (empty set) or 'error'
+    '''
+    data = common.parse_job_path(get_scene_path())
+
+    results = []
+    jobs = []
+
+    # AbcExport writes to local scratch, _finish_export copies each file to the share
+    scratch = tempfile.mkdtemp(prefix='tba_abc_')
+
+    try:
+        for asset in assets:
+            result = {'asset': asset, 'status': 'skipped', 'error': None}
+            results.append(result)
+
+            args, object_count = _prepare_abc_export(asset)
+
+            if args:
+                local_path = os.path.join(scratch, asset['name'] + '.abc')
+                jobs.append((result, local_path, object_count, '{0} -file {1}'.format(args, local_path)))
+
+        if not jobs:
+            return results
+
+        # without -frameRange AbcExport writes the current frame
+        frame = mc.currentTime(q=1)
+
+        try:
+            mc.AbcExport ( jobArg = [job[-1] for job in jobs] )
+        except RuntimeError as e:
+            for result, local_path, object_count, command in jobs:
+                result['status'] = 'error'
+                result['error'] = str(e)
+            return results
+
+        for result, local_path, object_count, command in jobs:
+            try:
+                result['status'] = _finish_export(result['asset'], data, local_path, (frame, frame), object_count)
+            except (IOError, OSError) as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return results
+
+def _export_abc_chunked(asset, chunks, frame_range=None):
+    if mc.file(q=1, modified=1):
+        print('Save the scene before exporting in chunks')
+        return
+
+    scene = get_scene_path()
+    args, object_count = _prepare_abc_export(asset)
+
+    if not args:
+        return
+
+    if frame_range is None:
+        frame_range = (mc.playbackOptions(q=1, min=1), mc.playbackOptions(q=1, max=1))
+
+    scratch = tempfile.mkdtemp(prefix='tba_abc_')
+
+    try:
+        local_path = os.path.join(scratch, asset['name'] + '.abc')
+        report = maya_batch.export_abc_chunks(scene, args, local_path, frame_range, chunks, scratch_dir=scratch)
+
+        for chunk in report['chunks']:
+            print('Chunk {0[0]}-{0[1]}: {1} in {2:.1f}s'.format(chunk['range'], chunk['status'], chunk['seconds'] or 0))
+
+        if report['status'] != 'ok':
+            print('Chunked export failed: {}'.format(report['error']))
+            return
+
+        print('Merged in {:.1f}s'.format(report['merge_seconds']))
+
+        _finish_export(asset, common.parse_job_path(scene), local_path, frame_range, object_count)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
 
     return asset
@@ -0,0 +1,346 @@
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Headless batch publishing. A pool of mayapy processes each opens a scene,
+# reads its tba_asset sets and exports them with maya.export_abcs. Each worker
+# prints a single result line which the driver parses and streams back as soon
+# as the scene finishes.
+#
+#   python -m tbautils.maya_batch --workers 4 scene_a.ma scene_b.ma
+#
+RESULT_MARKER = 'TBA_BATCH_RESULT '
+
+MAYAPY = os.environ.get('TBA_MAYAPY', 'mayapy')
+
+# Alembic's AbcStitcher joins caches that cover consecutive frame ranges
+ABCSTITCHER = os.environ.get('TBA_ABCSTITCHER', 'abcstitcher')
+
+
+def _package_env():
+    # make sure the worker can import tbautils the same way we did
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    return env
+
+
+def _run_process(command, timeout, env):
+    '''
+    return: (return code or None on timeout, output)
+    '''
+    timed_out = False
+
+    # write output to a file rather than a pipe so a chatty scene can't block the worker
+    with tempfile.TemporaryFile() as out:
+        proc = subprocess.Popen(command, stdout=out, stderr=subprocess.STDOUT, env=env)
+        deadline = time.time() + timeout if timeout else None
+
+        while proc.poll() is None:
+            if deadline is not None and time.time() > deadline:
+                proc.kill()
+                proc.wait()
+                timed_out = True
+                break
+            time.sleep(0.2)
+
+        out.seek(0)
+        output = out.read().decode('utf-8', 'replace')
+
+    return (None if timed_out else proc.returncode), output
+
+
+def _parse_result(output):
+    for line in reversed(output.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return None
+
+
+def run_scene(scene, mayapy=MAYAPY, timeout=1800, retries=1):
+    '''
+    Publish a single scene in its own mayapy process.
+
+    param: scene [string] - scene to open
+    param: mayapy [string] - mayapy executable
+    param: timeout [float] - seconds before the process is killed, None for no limit
+    param: retries [int] - extra attempts after a failure or timeout. Assets an
+        earlier attempt published are skipped, so they don't get a second version.
+    return: dict with scene, status ('ok', 'error' or 'timeout'), attempts, seconds, assets and error
+    '''
+    env = _package_env()
+
+    result = None
+    done = []
+
+    for attempt in range(1, retries + 2):
+        command = [mayapy, '-m', 'tbautils.maya_batch', '--worker', scene]
+
+        for asset in done:
+            command += ['--skip', asset['name']]
+
+        start = time.time()
+        returncode, output = _run_process(command, timeout, env)
+        seconds = time.time() - start
+
+        result = _parse_result(output) or {'assets': [], 'error': None}
+        result.update(scene=scene, attempts=attempt, seconds=seconds, assets=done + result['assets'])
+        done = [a for a in result['assets'] if a['status'] != 'error']
+
+        if returncode is None:
+            result['status'] = 'timeout'
+            result['error'] = 'Timed out after {}s'.format(timeout)
+        elif returncode != 0 or result.get('error'):
+            result['status'] = 'error'
+            result['error'] = result.get('error') or output[-2000:]
+        else:
+            result['status'] = 'ok'
+            break
+
+    return result
+
+
+def run_batch(scenes, mayapy=MAYAPY, workers=4, timeout=1800, retries=1):
+    '''
+    Publish many scenes in parallel.
+
+    param: scenes [list] - scenes to open
+    param: workers [int] - number of mayapy processes to run at once
+    return: generator of run_scene results in completion order
+    '''
+    todo = Queue()
+    done = Queue()
+
+    for scene in scenes:
+        todo.put(scene)
+
+    def work():
+        while True:
+            scene = todo.get()
+
+            if scene is None:
+                return
+
+            try:
+                done.put(run_scene(scene, mayapy=mayapy, timeout=timeout, retries=retries))
+            except Exception as e:
+                done.put({'scene': scene, 'status': 'error', 'error': str(e), 'assets': []})
+
+    threads = []
+
+    for i in range(max(1, min(workers, len(scenes)))):
+        todo.put(None)
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for i in range(len(scenes)):
+        yield done.get()
+
+    for thread in threads:
+        thread.join()
+
+
+def split_frame_range(start, end, chunks):
+    '''
+    return: list of consecutive (start, end) frame ranges covering start to end
+    '''
+    start, end = int(start), int(end)
+    chunks = max(1, min(chunks, end - start + 1))
+    size, extra = divmod(end - start + 1, chunks)
+
+    ranges = []
+
+    for i in range(chunks):
+        length = size + (1 if i < extra else 0)
+        ranges.append((start, start + length - 1))
+        start += length
+
+    return ranges
+
+
+def export_abc_chunks(scene, job_args, filepath, frame_range, chunks=4, mayapy=MAYAPY,
+                      abcstitcher=ABCSTITCHER, timeout=3600, scratch_dir=None):
+    '''
+    Export one Alembic cache by splitting its frame range across several mayapy
+    processes. Each chunk is written to local scratch, then the chunks are
+    stitched and the result copied into place.
+
+    param: scene [string] - saved scene to export from
+    param: job_args [string] - AbcExport job arguments without -frameRange or -file
+    param: filepath [string] - final .abc path
+    param: frame_range [tuple] - (start, end) frames
+    param: chunks [int] - number of processes to split the range across
+    return: dict with status, error, filepath, merge_seconds and a chunks list of
+        {range, status, seconds, error}
+    '''
+    scratch = tempfile.mkdtemp(prefix='tba_abc_', dir=scratch_dir)
+    env = _package_env()
+    report = {'status': 'ok', 'error': None, 'filepath': filepath, 'chunks': [], 'merge_seconds': None}
+
+    try:
+        for i, (start, end) in enumerate(split_frame_range(frame_range[0], frame_range[1], chunks)):
+            report['chunks'].append({
+                'range': (start, end),
+                'file': os.path.join(scratch, 'chunk_{:03d}.abc'.format(i)),
+                'status': None,
+                'seconds': None,
+                'error': None
+            })
+
+        def work(chunk):
+            job = '-frameRange {} {} {} -file {}'.format(chunk['range'][0], chunk['range'][1], job_args, chunk['file'])
+            command = [mayapy, '-m', 'tbautils.maya_batch', '--worker', scene, '--abc-job', job]
+
+            start = time.time()
+            returncode, output = _run_process(command, timeout, env)
+            chunk['seconds'] = time.time() - start
+
+            if returncode is None:
+                chunk['status'] = 'timeout'
+                chunk['error'] = 'Timed out after {}s'.format(timeout)
+            elif returncode != 0 or not os.path.exists(chunk['file']):
+                chunk['status'] = 'error'
+                chunk['error'] = output[-2000:]
+            else:
+                chunk['status'] = 'ok'
+
+        threads = [threading.Thread(target=work, args=(chunk,)) for chunk in report['chunks']]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = [c for c in report['chunks'] if c['status'] != 'ok']
+
+        if failed:
+            report['status'] = 'error'
+            report['error'] = 'Chunk {} failed: {}'.format(failed[0]['range'], failed[0]['error'])
+            return report
+
+        # stitch locally, then copy to the share and rename into place
+        start = time.time()
+        merged = os.path.join(scratch, 'merged.abc')
+
+        if len(report['chunks']) == 1:
+            merged = report['chunks'][0]['file']
+        else:
+            command = [abcstitcher, merged] + [c['file'] for c in report['chunks']]
+            returncode, output = _run_process(command, timeout, env)
+
+            if returncode != 0 or not os.path.exists(merged):
+                report['status'] = 'error'
+                report['error'] = 'Merging chunks failed: {}'.format(output[-2000:])
+                return report
+
+        from tbautils import fileutils
+
+        tmp_path = filepath + '.tmp'
+        shutil.copyfile(merged, tmp_path)
+        fileutils.fsync_file(tmp_path)
+        fileutils.replace_file(tmp_path, filepath)
+
+        report['merge_seconds'] = time.time() - start
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+        for chunk in report['chunks']:
+            del chunk['file']
+
+    return report
+
+
+def _worker(scene, abc_job=None, skip=()):
+    # runs inside mayapy, skip names assets published by an earlier attempt
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+
+    result = {'assets': [], 'error': None}
+
+    try:
+        import maya.cmds as mc
+        from tbautils import maya as tba_maya
+
+        mc.file(scene, open=True, force=True)
+
+        if abc_job:
+            # export a single prepared job, used for frame range chunks
+            mc.AbcExport(jobArg=abc_job)
+        else:
+            assets = [a for a in tba_maya.get_tba_assets() if a['name'] not in skip]
+
+            for export in tba_maya.export_abcs(assets):
+                asset = export['asset']
+                result['assets'].append({
+                    'name': asset['name'],
+                    'type': asset['type'],
+                    'version': asset.get('version'),
+                    'filepath': asset.get('filepath'),
+                    'status': export['status'],
+                    'error': export['error']
+                })
+
+            failed = [a for a in result['assets'] if a['status'] == 'error']
+
+            # the scene counts as failed so run_scene retries it
+            if failed:
+                result['error'] = '{} of {} assets failed, {}: {}'.format(
+                    len(failed), len(result['assets']), failed[0]['name'], failed[0]['error'])
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    sys.stdout.write('\n' + RESULT_MARKER + json.dumps(result, default=str) + '\n')
+    sys.stdout.flush()
+
+    return 1 if result['error'] else 0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export Alembic caches from many Maya scenes')
+    parser.add_argument('scenes', nargs='*')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=1800)
+    parser.add_argument('--retries', type=int, default=1)
+    parser.add_argument('--mayapy', default=MAYAPY)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--abc-job', help=argparse.SUPPRESS)
+    parser.add_argument('--skip', action='append', default=[], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return _worker(args.worker, args.abc_job, args.skip)
+
+    failed = 0
+
+    for result in run_batch(args.scenes, mayapy=args.mayapy, workers=args.workers,
+                            timeout=args.timeout, retries=args.retries):
+        print(json.dumps(result, default=str))
+        sys.stdout.flush()
+
+        if result['status'] != 'ok':
+            failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import gzip
+import mmap
+import hashlib
+from io import BytesIO
+
+import abc_cache
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Metadata extracted once at publish time and stored on the asset document, so
+# browsing and filtering never has to open the published files. Extraction
+# never fails a publish: anything that can't be read is left as None.
+#
+CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(path):
+    '''
+    return: sha1 hex digest of the file, read in chunks
+    '''
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+# Alembic archives record when they were written, which would make every
+# export of the same content hash differently
+_ABC_DATE_RE = re.compile(br'_ai_DateWritten=[^;\x00]*')
+
+
+def abc_content_hash(path):
+    '''
+    return: sha1 hex digest of an Alembic file with its write date left out,
+        so re-exporting unchanged content gives the same hash
+    '''
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            pos = 0
+
+            for match in _ABC_DATE_RE.finditer(data):
+                for offset in range(pos, match.start(), CHUNK_SIZE):
+                    digest.update(data[offset:min(offset + CHUNK_SIZE, match.start())])
+                pos = match.end()
+
+            for offset in range(pos, len(data), CHUNK_SIZE):
+                digest.update(data[offset:offset + CHUNK_SIZE])
+        finally:
+            data.close()
+
+    return digest.hexdigest()
+
+
+# An HDA's Contents section is an odc cpio archive. Every entry's header holds
+# the device, inode and mtime of the file it was made from, which change each
+# time the definition is saved.
+_CPIO_MAGIC = b'070707'
+_CPIO_HEADER_SIZE = 76
+_CPIO_TRAILER = b'TRAILER!!!'
+
+
+def _cpio_entries(data):
+    '''
+    return: list of (name, mode, data) for the entries of an odc cpio archive,
+        or None if data isn't a complete archive
+    '''
+    entries = []
+    pos = 0
+
+    while True:
+        header = data[pos:pos + _CPIO_HEADER_SIZE]
+
+        if len(header) < _CPIO_HEADER_SIZE or not header.startswith(_CPIO_MAGIC):
+            return None
+
+        try:
+            name_size = int(header[59:65], 8)
+            file_size = int(header[65:76], 8)
+        except ValueError:
+            return None
+
+        start = pos + _CPIO_HEADER_SIZE + name_size
+        name = data[pos + _CPIO_HEADER_SIZE:start].rstrip(b'\x00')
+        body = data[start:start + file_size]
+
+        if len(body) < file_size:
+            return None
+
+        if name == _CPIO_TRAILER:
+            return entries
+
+        entries.append((name, header[18:24], body))
+        pos = start + file_size
+
+
+def hda_definition_hash(definition):
+    '''
+    Hash the sections of an HDA definition with its node type name removed, so
+    the same asset published under another version hashes the same. Save
+    times in gzip and cpio headers are left out.
+
+    param: definition [hou.HDADefinition]
+    return: sha1 hex digest
+    '''
+    name = definition.nodeTypeName().encode('utf-8')
+    digest = hashlib.sha1()
+
+    for section_name, section in sorted(definition.sections().items()):
+        contents = section.contents()
+
+        if not isinstance(contents, bytes):
+            contents = contents.encode('utf-8')
+
+        # gzip headers hold a timestamp, hash what's inside instead
+        if section_name.endswith('.gz'):
+            try:
+                contents = gzip.GzipFile(fileobj=BytesIO(contents)).read()
+            except (IOError, OSError, EOFError):
+                pass
+
+        entries = _cpio_entries(contents) if contents.startswith(_CPIO_MAGIC) else None
+
+        # only the names, modes and contents of the archive's entries
+        if entries is not None:
+            contents = b''.join(b'\x00'.join(entry) + b'\x00' for entry in entries)
+
+        digest.update(section_name.encode('utf-8') + b'\x00')
+        digest.update(contents.replace(name, b'') + b'\x00')
+
+    return digest.hexdigest()
+
+
+def file_metadata(path):
+    '''
+    return: dict with file_size and content_hash
+    '''
+    return {
+        'file_size': os.path.getsize(path),
+        'content_hash': content_hash(path)
+    }
+
+
+def abc_metadata(path, frame_range=None, fps=None, content_hash=None, object_count=None):
+    '''
+    The archive's hierarchy is only read when the export didn't say what it
+    wrote, since that traverses the whole file.
+
+    param: path [string] - published Alembic file
+    param: frame_range [tuple] - (start, end) frames if known from the export
+    param: fps [float] - frames per second, used to derive the frame range from the archive's time range
+    param: content_hash [string] - abc_content_hash of the file if it was already computed
+    param: object_count [int] - number of objects written, if known from the export
+    return: dict with file_size, content_hash (see abc_content_hash), frame_range and object_count
+    '''
+    metadata = {
+        'file_size': os.path.getsize(path),
+        'content_hash': content_hash or abc_content_hash(path),
+        'frame_range': list(frame_range) if frame_range else None,
+        'object_count': object_count
+    }
+
+    if metadata['frame_range'] is not None and object_count is not None:
+        return metadata
+
+    try:
+        hierarchy = abc_cache.get_hierarchy(path)
+    except Exception as e:
+        print('tba_utils - Could not read Alembic hierarchy of {}: {}'.format(path, e))
+        return metadata
+
+    if metadata['object_count'] is None:
+        metadata['object_count'] = hierarchy['object_count']
+
+    if metadata['frame_range'] is None and hierarchy['time_range'] and fps:
+        metadata['frame_range'] = [int(round(t * fps)) for t in hierarchy['time_range']]
+
+    return metadata
+
+
+def hda_metadata(path, node_type_name=None):
+    '''
+    param: path [string] - published HDA library
+    param: node_type_name [string] - the definition that was published. Its
+        hda_definition_hash is used as content_hash rather than the hash of the
+        whole library, which changes with every version added to it.
+    return: dict with file_size, content_hash and definitions, a list of
+        {name, category, version, sections: [{name, size in bytes}]}. Sections
+        are a list since their names contain dots, which can't be used as keys.
+    '''
+    metadata = file_metadata(path)
+    metadata.update(hda_definitions_metadata(path, node_type_name))
+    return metadata
+
+
+def hda_definitions_metadata(path, node_type_name=None):
+    '''
+    The part of hda_metadata that reads the definitions. In Houdini this uses
+    hou, so it has to run on the main thread.
+
+    return: dict with definitions, and content_hash if node_type_name was found
+    '''
+    metadata = {'definitions': []}
+
+    try:
+        import hda_registry
+    except ImportError:
+        # outside of Houdini, read the library directly
+        import hda_reader
+
+        for definition in hda_reader.read_definitions(path):
+            metadata['definitions'].append({
+                'name': definition['name'],
+                'category': definition['category'],
+                'version': str(definition['version']) if definition['version'] else '',
+                'sections': definition['sections']
+            })
+
+        return metadata
+
+    for definition in hda_registry.definitions(path):
+        if definition.nodeTypeName() == node_type_name:
+            metadata['content_hash'] = hda_definition_hash(definition)
+
+        metadata['definitions'].append({
+            'name': definition.nodeTypeName(),
+            'category': definition.nodeTypeCategory().name(),
+            'version': definition.version(),
+            'sections': [{'name': name, 'size': section.size()}
+                         for name, section in sorted(definition.sections().items())]
+        })
+
+    return metadata
+
+
+def safe_metadata(extract, path, **kwargs):
+    '''
+    Run one of the extractors above, printing and returning {} on failure so a
+    publish never fails because of its metadata.
+    '''
+    try:
+        return extract(path, **kwargs)
+    except Exception as e:
+        print('tba_utils - Could not extract metadata from {}: {}'.format(path, e))
+        return {}
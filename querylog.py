@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import math
+import time
+import threading
+
+from pymongo import monitoring
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Timing for every command sent through connection.get_client. Each command is
+# recorded with its operation, collection, filter shape, latency and number of
+# documents. Commands slower than SLOW_QUERY_MS are appended to a JSONL log and
+# everything goes into in-process latency histograms that can be dumped at any time.
+#
+SLOW_QUERY_MS = 100.0
+LOG_PATH = os.path.join(os.path.expanduser('~'), '.tbautils', 'slow_queries.jsonl')
+
+# histogram bucket upper bounds in ms, the last bucket catches everything above
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+_lock = threading.Lock()
+_histograms = {}
+
+# commands that are connection housekeeping rather than queries
+_IGNORED = set(['ismaster', 'isMaster', 'hello', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'buildInfo', 'getnonce'])
+
+
+def _shape(value):
+    # replace values with their type name so queries group by structure, not content
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(value[0])] if value else []
+    return type(value).__name__
+
+
+def _filter(command_name, command):
+    if command_name in ('find', 'count', 'distinct'):
+        return command.get('filter', command.get('query'))
+    if command_name == 'findAndModify':
+        return command.get('query')
+    if command_name == 'update' and command.get('updates'):
+        return command['updates'][0].get('q')
+    if command_name == 'delete' and command.get('deletes'):
+        return command['deletes'][0].get('q')
+    if command_name == 'aggregate':
+        for stage in command.get('pipeline', []):
+            if '$match' in stage:
+                return stage['$match']
+    return None
+
+
+def _document_count(command_name, reply):
+    if 'cursor' in reply:
+        cursor = reply['cursor']
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    if command_name == 'findAndModify':
+        return 1 if reply.get('value') is not None else 0
+    return reply.get('n')
+
+
+def _record(entry):
+    key = (entry['op'], entry['collection'])
+    ms = entry['ms']
+
+    with _lock:
+        hist = _histograms.get(key)
+
+        if hist is None:
+            hist = _histograms[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * len(BUCKETS)}
+
+        hist['count'] += 1
+        hist['total_ms'] += ms
+        hist['max_ms'] = max(hist['max_ms'], ms)
+
+        for i, bound in enumerate(BUCKETS):
+            if ms <= bound:
+                hist['buckets'][i] += 1
+                break
+
+    if ms >= SLOW_QUERY_MS and LOG_PATH:
+        _write_slow(entry)
+
+
+def _write_slow(entry):
+    try:
+        folder = os.path.dirname(LOG_PATH)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with _lock:
+            with open(LOG_PATH, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+    except (IOError, OSError) as e:
+        # never let logging break a query
+        print('tba_utils - Could not write slow query log: {}'.format(e))
+
+
+class QueryTimer(monitoring.CommandListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name in _IGNORED:
+            return
+
+        command = event.command
+        query = _filter(event.command_name, command)
+
+        if event.command_name == 'getMore':
+            collection = command.get('collection')
+        else:
+            collection = command.get(event.command_name)
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                str(collection),
+                json.dumps(_shape(query), sort_keys=True) if query is not None else None
+            )
+
+    def _finish(self, event, reply, error=None):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+
+        if pending is None:
+            return
+
+        collection, shape = pending
+
+        entry = {
+            'time': time.time(),
+            'op': event.command_name,
+            'database': event.database_name,
+            'collection': collection,
+            'filter': shape,
+            'ms': event.duration_micros / 1000.0,
+            'docs': _document_count(event.command_name, reply) if reply else None
+        }
+
+        if error:
+            entry['error'] = error
+
+        _record(entry)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None, str(event.failure))
+
+
+def configure(threshold_ms=None, log_path=None):
+    '''
+    param: threshold_ms [float] - commands at least this slow go to the slow query log
+    param: log_path [string] - JSONL file for slow queries, '' disables the log
+    '''
+    global SLOW_QUERY_MS, LOG_PATH
+
+    if threshold_ms is not None:
+        SLOW_QUERY_MS = threshold_ms
+
+    if log_path is not None:
+        LOG_PATH = log_path
+
+
+# shared listener attached to every client built by connection.get_client
+listener = QueryTimer()
+
+
+def histograms():
+    '''
+    return: dict keyed by "op collection" with count, total_ms, avg_ms, max_ms and bucket counts
+    '''
+    with _lock:
+        items = [(k, dict(v, buckets=list(v['buckets']))) for k, v in _histograms.items()]
+
+    result = {}
+
+    for (op, collection), hist in items:
+        hist['avg_ms'] = hist['total_ms'] / hist['count']
+        hist['buckets'] = dict(('<={}ms'.format(b) if not math.isinf(b) else '>{}ms'.format(BUCKETS[-2]), n)
+                               for b, n in zip(BUCKETS, hist['buckets']) if n)
+        result['{} {}'.format(op, collection)] = hist
+
+    return result
+
+
+def dump(path=None):
+    '''
+    Print the histograms sorted by total time, or write them as JSON to path.
+    '''
+    result = histograms()
+
+    if path:
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=4, sort_keys=True)
+        return
+
+    for key, hist in sorted(result.items(), key=lambda x: -x[1]['total_ms']):
+        print('{:40} {:6d} calls {:10.1f}ms total {:8.2f}ms avg {:8.1f}ms max'.format(
+            key, hist['count'], hist['total_ms'], hist['avg_ms'], hist['max_ms']))
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
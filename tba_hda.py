@@ -1,43 +1,66 @@
 import sys
 import os
-import math
 import hou
+import shutil
+import tempfile
+import threading
+import traceback
 import bson
 import datetime
 import xml.etree.ElementTree as ET
+from pymongo.errors import PyMongoError
 import tbautils.common
+import tbautils.cache
+import tbautils.journal
+import tbautils.metadata
+import tbautils.hda_registry
+import tbautils.hda_version
+import tbautils.fileutils
 
 sys.dont_write_bytecode = True  # Avoid writing .pyc files
 
+# publish and checkout can run on a worker thread, see _on_main
+_MAIN_THREAD = threading.current_thread()
+
 def local_update(majorUpdate=True):
     pass
 
 def get_hda_version(hdaName):
+    '''
+    param: hdaName [string] - node type name, e.g. tba::chair::1.2
+    return: (base name, HdaVersion)
+    '''
     # try and extract version
-    splits = hdaName.split('::')
-
-    if '::' in hdaName:
-        hdaVersion = float(splits[-1])
-        hdaBaseName = '::'.join(splits[:-1])
+    hdaBaseName, hdaVersion = tbautils.hda_version.split_type_name(hdaName)
 
+    if hdaVersion is not None:
         return hdaBaseName, hdaVersion
 
     print('Could not extract version number from HDA. Initialising it as version 0.1')
-    hdaVersion = 0.1
-    hdaBaseName = '::'.join(splits[:-1])
 
-    return hdaBaseName, hdaVersion
+    return hdaBaseName, tbautils.hda_version.HdaVersion(0, 1)
 
-def checkout_hda(ui, majorUpdate=True):
-    # copy hda to local directory
-    # install hda (this will set it as the active hda in houdini)
-    # set allow editing of contents
+def _on_main(fn, *args, **kwargs):
+    # hou calls have to run on Houdini's main thread, hand them over if we're on a worker
+    if threading.current_thread() is _MAIN_THREAD:
+        return fn(*args, **kwargs)
 
+    import hdefereval
+    return hdefereval.executeInMainThreadWithResult(fn, *args, **kwargs)
+
+def _no_progress(percent, message):
+    pass
+
+def _not_cancelled():
+    return False
+
+def _selected_hda():
+    # return: (node, definition) of the selected HDA or (None, None)
     node = hou.selectedNodes()
 
     if not node:
         print('First select an HDA you want to publish')
-        return
+        return None, None
 
     node = node[0]
 
@@ -46,6 +69,29 @@ def checkout_hda(ui, majorUpdate=True):
 
     if not definition:
         print('Selected node is not an HDA')
+        return None, None
+
+    return node, definition
+
+def checkout_hda(ui, majorUpdate=True):
+    job = prepare_checkout(majorUpdate)
+
+    if job is None:
+        return
+
+    run_checkout(job)
+
+    # close ui
+    ui.close()
+
+def prepare_checkout(majorUpdate=True):
+    '''
+    Gather what checking out the selected HDA needs. Runs on the main thread.
+    return: checkout job dict for run_checkout, or None
+    '''
+    node, definition = _selected_hda()
+
+    if node is None:
         return
 
     # get filepath to hda file
@@ -66,8 +112,64 @@ def checkout_hda(ui, majorUpdate=True):
     # try and extract version
     hdaBaseName, hdaVersion = get_hda_version(hdaName)
 
+    return {
+        'node': node,
+        'definition': definition,
+        'majorUpdate': majorUpdate,
+        'hdaPath': hdaPath,
+        'hdaName': hdaName,
+        'hdaBaseName': hdaBaseName,
+        'hdaVersion': hdaVersion,
+        'newHdaPath': newHdaPath
+    }
+
+def _latest_local_version(newHdaPath, hdaBaseName, definition, node):
+    # highest local version of this asset
+    localVersion, local_definition = tbautils.hda_registry.latest(newHdaPath, hdaBaseName)
+
+    if local_definition is not None:
+        print('Local version: {}'.format(local_definition.nodeTypeName()))
+
+    # save current node
+    definition.updateFromNode(node)
+
+    return localVersion
+
+def _checkout_to(node, definition, newHdaPath, newHdaName):
+    # copy the file to the users local directory
+    definition.copyToHDAFile(newHdaPath, newHdaName)
+    definition = tbautils.hda_registry.definition(newHdaPath, newHdaName)
+
+    # save new definition
+    definition.updateFromNode(node)
+
+    # install new hda to houdini session
+    tbautils.hda_registry.install(newHdaPath)
+
+    # change selection to use new hda
+    node = node.changeNodeType(newHdaName, keep_network_contents=False)
+
+    # open asset for editing
+    node.allowEditingOfContents()
+
+    return node
+
+def run_checkout(job, progress=_no_progress, cancelled=_not_cancelled):
+    '''
+    Check out a job from prepare_checkout into the user's otls directory.
+    hou calls are handed to the main thread, so this can run on a worker thread.
+
+    param: progress [function] - called with (percent, message)
+    param: cancelled [function] - returns True to stop, checked before anything is written
+    return: (status, message) where status is 'checked_out' or 'cancelled'
+    '''
+    hdaVersion = job['hdaVersion']
+    newHdaPath = job['newHdaPath']
+
+    progress(10, 'Opening {}'.format(job['hdaPath']))
+
     # open file permissions
-    os.chmod(hdaPath, 0o700)
+    os.chmod(job['hdaPath'], 0o700)
 
     # if newHdaPath exists
     # get latest version of local definition and version up
@@ -75,57 +177,39 @@ def checkout_hda(ui, majorUpdate=True):
     if os.path.exists(newHdaPath):
         print('Found existing hda here: {}'.format(newHdaPath))
         print('Finding local definition version and versioning up based on that')
+        progress(30, 'Reading local versions')
 
-        # last one should be latest version (otherwise we could loop through and get their versions)
-        local_definition = hou.hda.definitionsInFile(newHdaPath)[-1]
-
-        print('Local definitions')
-        print(local_definition)
-        print('Local version: {}'.format(local_definition.nodeTypeName()))
+        localVersion = _on_main(_latest_local_version, newHdaPath, job['hdaBaseName'], job['definition'], job['node'])
 
-        # try and extract version
-        hdaBaseName, localVersion = get_hda_version(hdaName)
-        hdaVersion = max(hdaVersion, localVersion)
+        if localVersion is not None:
+            hdaVersion = max(hdaVersion, localVersion)
 
-        # save current node
-        definition.updateFromNode(node)
-
-    if majorUpdate:
-        newVersion = str(math.ceil(hdaVersion+0.01))
+    if job['majorUpdate']:
+        newVersion = hdaVersion.next_major()
     else:
-        newVersion = str(hdaVersion + 0.1)
+        newVersion = hdaVersion.next_minor()
 
-    newHdaName = '{0}::{1}'.format(hdaBaseName, newVersion)
+    newHdaName = '{0}::{1}'.format(job['hdaBaseName'], newVersion)
 
-    print('oldHdaPath: {}'.format(hdaPath))
-    print('oldHdaName: {}'.format(hdaName))
-    print('oldVersion: {}'.format(hdaVersion))
+    print('oldHdaPath: {}'.format(job['hdaPath']))
+    print('oldHdaName: {}'.format(job['hdaName']))
+    print('oldVersion: {}'.format(job['hdaVersion']))
 
     print('newHdaPath: {}'.format(newHdaPath))
     print('newHdaName: {}'.format(newHdaName))
     print('newVersion: {}'.format(newVersion))
 
-    # copy the file to the users local directory
-    definition.copyToHDAFile(newHdaPath, newHdaName)
-    definition = hou.hda.definitionsInFile(newHdaPath)[-1]
-
-    # save new definition
-    definition.updateFromNode(node)
+    if cancelled():
+        return 'cancelled', 'Checkout cancelled'
 
-    # install new hda to houdini session
-    hou.hda.installFile(newHdaPath)
-
-    # change selection to use new hda
-    node = node.changeNodeType(newHdaName, keep_network_contents=False)
-
-    # open asset for editing
-    node.allowEditingOfContents()
+    progress(60, 'Checking out {}'.format(newHdaName))
+    job['node'] = _on_main(_checkout_to, job['node'], job['definition'], newHdaPath, newHdaName)
 
     # set permission to writeable by you
     os.chmod(newHdaPath, 0o700)
 
-    # close ui
-    ui.close()
+    progress(100, 'Checked out {}'.format(newHdaName))
+    return 'checked_out', 'Checked out {}'.format(newHdaName)
 
 
 def publish_hda(ui, location='job', majorUpdate=True):
@@ -134,19 +218,29 @@ def publish_hda(ui, location='job', majorUpdate=True):
     param: location [string] - Where to publish the hda to ('shot', 'job', 'site')
     return: filepath to hda or false if unsuccessful
     '''
-    node = hou.selectedNodes()
+    job = prepare_publish(location)
 
-    if not node:
-        print('First select an HDA you want to publish')
+    if job is None:
         return
 
-    node = node[0]
+    status, message = run_publish(job)
+    hou.ui.displayMessage(message)
 
-    # get definition
-    definition = node.type().definition()
+    # close ui
+    ui.close()
 
-    if not definition:
-        print('Selected node is not an HDA')
+    if status == 'published':
+        return job['newHdaPath']
+
+def prepare_publish(location='job'):
+    '''
+    Gather what publishing the selected HDA needs. Runs on the main thread.
+    param: location [string] - Where to publish the hda to ('shot', 'job', 'site')
+    return: publish job dict for run_publish, or None if it can't be published
+    '''
+    node, definition = _selected_hda()
+
+    if node is None:
         return
 
     # asset name
@@ -157,9 +251,6 @@ def publish_hda(ui, location='job', majorUpdate=True):
     # try and extract version
     hdaBaseName, hdaVersion = get_hda_version(hdaName)
 
-    # open file permissions
-    os.chmod(hdaPath, 0o700)
-
     # get major, minor and build numbers from houdini version
     major, minor, build = hou.applicationVersionString().split('.')
 
@@ -207,86 +298,175 @@ def publish_hda(ui, location='job', majorUpdate=True):
         hou.ui.displayMessage('HDA is already published. Checkout first if you want to make changes')
         return
 
-    # resolve conflicts and get highest version
-    if os.path.exists(newHdaPath):
-        print('Conflicting hda: {}'.format(newHdaPath))
-        print('Finding conflicting definition version and versioning up based on that')
+    return {
+        'node': node,
+        'definition': definition,
+        'hdaName': hdaName,
+        'hdaPath': hdaPath,
+        'hdaBaseName': hdaBaseName,
+        'hdaVersion': hdaVersion,
+        'newHdaPath': newHdaPath,
+        'asset': get_asset_info(node)
+    }
+
+def _latest_published_version(newHdaPath, hdaBaseName):
+    # highest published version of this asset, from the library index
+    conflicting_version, conflicting_definition = tbautils.hda_registry.latest(newHdaPath, hdaBaseName)
+
+    if conflicting_definition is not None:
+        print('Conflicting hdaName: {}'.format(conflicting_definition.nodeTypeName()))
+        print('Conflicting version: {}'.format(conflicting_version))
 
-        # last one should be latest version (otherwise we could loop through and get their versions)
-        #conflicting_definition = hou.hda.definitionsInFile(newHdaPath)[-1]
+    return conflicting_version
 
-        conflicting_definition = sorted(hou.hda.definitionsInFile(newHdaPath), key=lambda x: float(x.nodeTypeName().split('::')[-1]))[-1]
-        #conflicting_definition = sorted(hou.hda.definitionsInFile(newHdaPath), key=lambda x: x.nodeTypeName())[-1]
-        #print "sorted defs: {}".format(flt_defs[-1])
+def _save_definition(node, definition):
+    # save current node, return: hash of the definition to compare with the published one
+    definition.updateFromNode(node)
+    return tbautils.metadata.hda_definition_hash(definition)
 
-        conflicting_hdaName = conflicting_definition.nodeTypeName()
+def _switch_to_published(node, filepath, hdaBaseName):
+    # point node back at the published version of its asset
+    published_version, published_definition = tbautils.hda_registry.latest(filepath, hdaBaseName)
 
-        print('Conflicting hdaName: {}'.format(conflicting_hdaName))
+    if published_definition is None:
+        return node
 
+    tbautils.hda_registry.install(filepath)
+    return node.changeNodeType(published_definition.nodeTypeName(), keep_network_contents=False)
 
-        # try and extract version
-        hdaBaseName, conflicting_version = get_hda_version(conflicting_hdaName)
-        print('Conflicting version: {}'.format(conflicting_version))
-        print "hdaVersion".format(hdaVersion)
-        hdaVersion = max(hdaVersion, conflicting_version + 1)
+def _install_published(node, newHdaPath, newName):
+    # install new hda to houdini session
+    tbautils.hda_registry.install(newHdaPath)
+    # change selection to use new hda
+    node = node.changeNodeType(newName, keep_network_contents=False)
 
-    # save current node
-    definition.updateFromNode(node)
+    # match current definition to lock asset
+    #node.matchCurrentDefinition()
 
-    """
-    if majorUpdate:
-        newVersion = str(math.ceil(hdaVersion+0.01))
-    else:
-        newVersion = str(hdaVersion + 0.1)
-    """
+    return node, get_asset_info(node)
 
-    #newName = hdaName
+def run_publish(job, progress=_no_progress, cancelled=_not_cancelled):
+    '''
+    Publish a job from prepare_publish. File and database work happens on the
+    calling thread and hou calls are handed to the main thread, so this can run
+    on a worker thread while Houdini stays responsive.
+
+    Publishing is a transaction: the library's lock is held while picking the
+    version and writing, and the new library is built in a local temp folder
+    and then copied next to the published one and renamed over it, so
+    concurrent publishers can't race and readers never load a half-written file.
+
+    param: progress [function] - called with (percent, message)
+    param: cancelled [function] - returns True to stop. Checked between stages
+        until the published library is replaced.
+    return: (status, message) where status is 'published', 'unchanged' or 'cancelled'
+    '''
+    node = job['node']
+    definition = job['definition']
+    hdaBaseName = job['hdaBaseName']
+    hdaVersion = job['hdaVersion']
+    newHdaPath = job['newHdaPath']
 
-    newName = '{}::{}'.format(hdaBaseName, hdaVersion)
+    # open file permissions
+    os.chmod(job['hdaPath'], 0o700)
 
-    print ""
-    print('oldHdaPath: {}'.format(hdaPath))
-    print('oldName: {}'.format(hdaName))
+    progress(5, 'Waiting for {}'.format(newHdaPath))
 
-    print('newHdaPath: {}'.format(newHdaPath))
-    print('newName: {}'.format(newName))
+    with tbautils.fileutils.FileLock(newHdaPath + '.lock') as lock:
+        if lock.wait_time > 1.0:
+            print('Waited {:.1f}s for {} to be released'.format(lock.wait_time, newHdaPath))
 
-    # copy the file to the published directory
-    os.chmod(hdaPath, 0o700)
-    definition.copyToHDAFile(str(newHdaPath), str(newName))
+        if cancelled():
+            return 'cancelled', 'Publish cancelled'
 
-    # install new hda to houdini session
-    hou.hda.installFile(newHdaPath)
-    # change selection to use new hda
-    node = node.changeNodeType(newName, keep_network_contents=False)
+        # resolve conflicts and get highest version
+        if os.path.exists(newHdaPath):
+            print('Conflicting hda: {}'.format(newHdaPath))
+            print('Finding conflicting definition version and versioning up based on that')
+            progress(15, 'Reading published versions')
 
-    # match current definition to lock asset
-    #node.matchCurrentDefinition()
+            conflicting_version = _on_main(_latest_published_version, newHdaPath, hdaBaseName)
 
-    # check if filepath clash
+            if conflicting_version is not None:
+                hdaVersion = max(hdaVersion, conflicting_version.next_major())
 
-    # set file to read only
-    os.chmod(newHdaPath, 0o444)
+        progress(25, 'Saving definition')
+        content_hash = _on_main(_save_definition, node, definition)
 
-    # Add asset to database
-    db_update_asset(node)
+        # skip the publish if nothing changed since the current version
+        current_asset = find_current_asset(job['asset'])
 
-    # close ui
-    ui.close()
+        if current_asset and current_asset.get('content_hash') == content_hash:
+            job['node'] = _on_main(_switch_to_published, node, current_asset['filepath'], hdaBaseName)
 
+            message = 'No changes since version {}, nothing to publish'.format(current_asset['version'])
+            print(message)
+            return 'unchanged', message
 
-def db_update_asset(node):
-    """ Add the HDA definition attached to 'node' to the database.
-    """
+        newName = '{}::{}'.format(hdaBaseName, hdaVersion)
+
+        print ""
+        print('oldHdaPath: {}'.format(job['hdaPath']))
+        print('oldName: {}'.format(job['hdaName']))
+
+        print('newHdaPath: {}'.format(newHdaPath))
+        print('newName: {}'.format(newName))
 
-    db = tbautils.common.getDB()
+        # build the new library locally so Houdini only writes to local disk
+        scratch = tempfile.mkdtemp(prefix='tba_hda_')
+        localHdaPath = os.path.join(scratch, os.path.basename(newHdaPath)).replace('\\','/')
 
-    # Initialize variables
-    asset_type = None
-    parent_id = None
-    parent_asset = None
-    existing = None
+        try:
+            if os.path.exists(newHdaPath):
+                progress(35, 'Copying published library')
+                shutil.copyfile(newHdaPath, localHdaPath)
 
+            if cancelled():
+                return 'cancelled', 'Publish cancelled'
+
+            progress(50, 'Writing {}'.format(newName))
+            _on_main(definition.copyToHDAFile, str(localHdaPath), str(newName))
+
+            if cancelled():
+                return 'cancelled', 'Publish cancelled'
+
+            # copy next to the published library, then swap it in read only
+            progress(65, 'Copying to {}'.format(newHdaPath))
+
+            with tbautils.fileutils.staged_file(newHdaPath, mode=0o444) as tmpHdaPath:
+                shutil.copyfile(localHdaPath, tmpHdaPath)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    progress(80, 'Installing {}'.format(newName))
+    node, asset = _on_main(_install_published, node, newHdaPath, newName)
+    job['node'] = node
+
+    # Add asset to database
+    progress(90, 'Updating database')
+    hda_metadata = tbautils.metadata.safe_metadata(_hda_metadata_on_main, newHdaPath, node_type_name=newName)
+
+    try:
+        message = queue_asset_update(asset, hda_metadata)
+    except Exception as e:
+        # the library is published and installed by now, don't report the publish as failed
+        traceback.print_exc()
+        message = 'Published {} but could not queue it for the database: {}'.format(newName, e)
+
+    progress(100, message)
+    return 'published', message
+
+def _hda_metadata_on_main(path, node_type_name=None):
+    # hash the library here, read its definitions on the main thread
+    metadata = tbautils.metadata.file_metadata(path)
+    metadata.update(_on_main(tbautils.metadata.hda_definitions_metadata, path, node_type_name))
+    return metadata
+
+
+def get_asset_info(node):
+    """ Read what the database needs to know about the HDA attached to
+    'node'. Uses hou, so it runs on the main thread.
+    """
     # Try to get attached asset type
     try:
         asset_type = node.parm('asset_type').evalAsString()
@@ -299,85 +479,107 @@ def db_update_asset(node):
     except:
         parent_id = None
 
-    if parent_id:
-        parent_asset = db.assets_curr.find_one({ "_id": bson.ObjectId(parent_id) })
+    return {
+        'asset_type': asset_type,
+        'parent_id': parent_id,
+        'lib_filepath': node.type().definition().libraryFilePath(),
+        'node_type_name': node.type().name(),
+        'hip_path': hou.hipFile.path()
+    }
+
+
+def find_current_asset(asset):
+    """ Find the assets_curr entry an HDA is published as, from the asset
+    type and parent asset attached to it (see get_asset_info). Returns None
+    if there isn't one or the database can't be reached.
+    The entry is read uncached, as it decides whether a publish is skipped:
+    a version someone else published within the cache's TTL must not make
+    this one look unchanged.
+    """
+    if not asset['parent_id']:
+        return None
+
+    try:
+        db = tbautils.common.getDB()
+        parent_asset = tbautils.cache.find_one(db, 'assets_curr', { "_id": bson.ObjectId(asset['parent_id']) })
+
+        if not parent_asset:
+            return None
 
-        # Search for existing assets of our type attached to parent
-        search = {
+        return db.assets_curr.find_one({
             'name': parent_asset['name'],
             'stage': parent_asset['stage'],
             'entity': parent_asset['entity'],
-            'type': asset_type
-        }
-
-        existing = db.assets_curr.find_one(search)
-
-
-    lib_filepath = node.type().definition().libraryFilePath()
-    latest_version = float(node.type().name().split('::')[-1])
-
-    if existing:
-        """ Move current existing asset entry to assets_prev if exisitng
-        asset is in assets_curr
-        """
-        print "CASE 1"
-        old_id = existing['_id']
-        del existing['_id']
-        db.assets_prev.insert(existing)
-        db.assets_curr.update_one(
-            { '_id': bson.ObjectId(old_id) },
-            { '$set': {
-                'version': latest_version,
-                'dateCreated': datetime.datetime.utcnow(),
-                'filepath': lib_filepath,
-                'author': os.environ['USERNAME']
-            }}
-        )
-        hou.ui.displayMessage("Updated asset to version {}".format(latest_version))
-
-    elif not existing and parent_asset:
-        """ If there is no previous version but parent_asset data is
-        attached, then insert new entry into assets_curr with data
-        derived from parent_asset.
-        """
-        print "CASE 2"
-        new_asset = parent_asset
-        del new_asset['_id']
-        new_asset['type'] = asset_type
-        new_asset['version'] = 1
-        new_asset['author'] = os.environ['USERNAME']
-        new_asset['filepath'] = lib_filepath,
-        new_asset['dateCreated'] = datetime.datetime.utcnow()
-        db.assets_curr.insert(new_asset)
-        hou.ui.displayMessage("Installed new asset into database!")
+            'type': asset['asset_type']
+        })
+    except PyMongoError as e:
+        print('Could not look up the current asset: {}'.format(e))
+        return None
 
-    else:
-        """ If no existing version or parent_asset data found, then 
-        create entirely new asset entry.
-        New need to get the following information:
-        * job_id
-        * entity
-        * type
-        * stage
-        * name
-        """
-        print "CASE 3"
-        path_data = tbautils.common.parse_job_path(hou.hipFile.path())
-        job = db.jobs.find_one({ "name": path_data['job'] })
-
-        new_asset = {
-            'name': '',
-            'version': 1,
-            'author': os.environ['USERNAME'],
-            'filepath': lib_filepath,
-            'dateCreated': datetime.datetime.utcnow(),
-            'job_id': bson.ObjectId(job['_id']),
-            'stage': path_data['stage'],
-            'entity': path_data['entity']
-        }
-
-        db.assets_curr.insert(new_asset)
-        hou.ui.displayMessage("Installed new asset into database!")
+
+def get_current_asset(node):
+    return find_current_asset(get_asset_info(node))
+
+
+def db_update_asset(node):
+    """ Add the HDA definition attached to 'node' to the database.
+    The write itself is queued on the publish journal and flushed to the
+    database in the background.
+    """
+    asset = get_asset_info(node)
+
+    # file size, hash and definitions, stored so the browser doesn't have to open the library
+    hda_metadata = tbautils.metadata.safe_metadata(tbautils.metadata.hda_metadata, asset['lib_filepath'],
+                                                   node_type_name=asset['node_type_name'])
+
+    hou.ui.displayMessage(queue_asset_update(asset, hda_metadata))
+
+
+def queue_asset_update(asset, hda_metadata):
+    """ Queue the database update for a published HDA on the publish
+    journal. Doesn't use hou or the database, so it can run on a worker
+    thread and works while the database is unreachable. The parent asset and
+    job are looked up when the journal writes the record, see
+    tbautils.assets.hda_rotation.
+    asset is the dict from get_asset_info.
+    Returns the message to show the user.
+    """
+    path_data = tbautils.common.parse_job_path(asset['hip_path'])
+    version = tbautils.hda_version.split_type_name(asset['node_type_name'])[1]
+
+    # stored as written in the type name, as a float 0.10 would read back as
+    # 0.1. hda_rotation adds the version_key it sorts by.
+    latest_version = asset['node_type_name'].rpartition('::')[2] if version else None
+
+    publish = {
+        'parent_id': asset['parent_id'] or None,
+        'asset_type': asset['asset_type'],
+        'name': hda_asset_name(asset['node_type_name']),
+        'job': path_data['job'],
+        'stage': path_data['stage'],
+        'entity': path_data['entity'],
+        'version': latest_version,
+        'filepath': asset['lib_filepath'],
+        'author': os.environ['USERNAME'],
+        'date': datetime.datetime.utcnow(),
+        'metadata': hda_metadata
+    }
+
+    tbautils.journal.get_journal().append('hda', publish=publish)
+
+    if publish['parent_id']:
+        return "Queued asset version {} for the database".format(latest_version)
+
+    return "Queued asset {} for the database".format(publish['name'])
+
+
+def hda_asset_name(node_type_name):
+    '''
+    param: node_type_name [string] - e.g. tba::chair::1.0
+    return: asset name for an HDA that isn't attached to a parent asset, e.g. chair
+    '''
+    base_name = tbautils.hda_version.split_type_name(node_type_name)[0]
+    return base_name.split('::')[-1]
 
 
 def create_hda(ui, name, min_inputs=1, max_inputs=1, major=0, minor=1):
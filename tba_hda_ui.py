@@ -1,4 +1,6 @@
 import sys
+import threading
+import traceback
 
 from PySide2 import QtCore, QtWidgets, QtGui
 
@@ -14,7 +16,123 @@ import re
 
 sys.dont_write_bytecode = True  # Avoid writing .pyc files
 
-class TBA_publish_hda_UI(QtWidgets.QDialog):
+class HdaWorker(QtCore.QThread):
+    '''
+    Runs tba_hda.run_publish or run_checkout off the main thread so the dialog
+    stays responsive. Those hand their hou calls back to the main thread with
+    hdefereval, so never wait() on a running worker from the main thread.
+    '''
+
+    progress = QtCore.Signal(int, str)
+    done = QtCore.Signal(str, str)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, run_fn, job, parent=None):
+        super(HdaWorker, self).__init__(parent)
+
+        self.run_fn = run_fn
+        self.job = job
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            status, message = self.run_fn(self.job, progress=self.progress.emit, cancelled=self.cancel_event.is_set)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+            return
+
+        self.done.emit(status, message)
+
+class HdaWorkerDialog(QtWidgets.QDialog):
+    '''
+    Progress bar, status line and cancel button shared by the publish and
+    checkout dialogs. Subclasses add create_worker_widgets() to their layout,
+    passing the button that starts the job, and call start_worker() with it.
+    '''
+
+    worker = None
+
+    def create_worker_widgets(self, layout, action_btn):
+        # disabled while the worker runs
+        self.action_btn = action_btn
+
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.status_label = QtWidgets.QLabel()
+        self.cancel_btn = QtWidgets.QPushButton('Cancel')
+
+        self.cancel_btn.clicked.connect(self.cancel_worker)
+
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.cancel_btn)
+
+        self.set_running(False)
+
+    def set_running(self, running):
+        self.progress_bar.setVisible(running)
+        self.cancel_btn.setVisible(running)
+        self.cancel_btn.setEnabled(running)
+        self.action_btn.setEnabled(not running)
+
+    def start_worker(self, run_fn, job):
+        self.progress_bar.setValue(0)
+        self.status_label.setText('')
+        self.set_running(True)
+
+        self.worker = HdaWorker(run_fn, job, self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.done.connect(self.on_done)
+        self.worker.failed.connect(self.on_failed)
+        self.worker.start()
+
+    def is_running(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def cancel_worker(self):
+        if not self.is_running():
+            return
+
+        self.worker.cancel()
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText('Cancelling...')
+
+    def on_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        self.status_label.setText(message)
+
+    def on_done(self, status, message):
+        self.worker = None
+        self.set_running(False)
+
+        if status == 'cancelled':
+            self.status_label.setText(message)
+            return
+
+        hou.ui.displayMessage(message)
+        self.status_label.setText('')
+        self.close()
+
+    def on_failed(self, message):
+        self.worker = None
+        self.set_running(False)
+        self.status_label.setText('Failed: {}'.format(message))
+        hou.ui.displayMessage('Failed: {}'.format(message), severity=hou.severityType.Error)
+
+    def closeEvent(self, event):
+        # keep the dialog (and its worker) alive until the worker finishes
+        if self.is_running():
+            self.cancel_worker()
+            event.ignore()
+            return
+
+        super(HdaWorkerDialog, self).closeEvent(event)
+
+class TBA_publish_hda_UI(HdaWorkerDialog):
 
     dlg_instance = None
 
@@ -77,14 +195,21 @@ class TBA_publish_hda_UI(QtWidgets.QDialog):
 
         main_layout.addWidget(self.publish_btn)
 
+        self.create_worker_widgets(main_layout, self.publish_btn)
+
     def create_connections(self):
         self.publish_btn.clicked.connect(self.publish_hda)
 
     def publish_hda(self):
-        # pass major or minor version and lcoation as arguments
-        tba_hda.publish_hda(self, location=self.radio_group_location.checkedButton().text().lower())
+        # pass location as argument, selection and paths are read here on the main thread
+        job = tba_hda.prepare_publish(location=self.radio_group_location.checkedButton().text().lower())
+
+        if job is None:
+            return
+
+        self.start_worker(tba_hda.run_publish, job)
 
-class TBA_checkout_hda_UI(QtWidgets.QDialog):
+class TBA_checkout_hda_UI(HdaWorkerDialog):
 
     dlg_instance = None
 
@@ -137,12 +262,19 @@ class TBA_checkout_hda_UI(QtWidgets.QDialog):
 
         main_layout.addWidget(self.checkout_btn)
 
+        self.create_worker_widgets(main_layout, self.checkout_btn)
+
     def create_connections(self):
         self.checkout_btn.clicked.connect(self.checkout_hda)
 
     def checkout_hda(self):
         # pass major or minor version
-        tba_hda.checkout_hda(self, self.radio_major.isChecked())
+        job = tba_hda.prepare_checkout(self.radio_major.isChecked())
+
+        if job is None:
+            return
+
+        self.start_worker(tba_hda.run_checkout, job)
 
 class TBA_create_hda_UI(QtWidgets.QDialog):
 
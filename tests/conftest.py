@@ -0,0 +1,104 @@
+import os
+import sys
+import types
+import importlib
+import threading
+
+import pytest
+
+import mayastub
+
+#
+# The modules import each other both as siblings (import cache) and through
+# the package (from tbautils import cache), so the repo folder and the folder
+# holding the tbautils package both go on the path.
+#
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (os.path.dirname(ROOT), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _locked(lock, method):
+    def locked(*args, **kwargs):
+        with lock:
+            return method(*args, **kwargs)
+    return locked
+
+
+@pytest.fixture
+def mongo_config(monkeypatch):
+    '''
+    Stand-in for the deployed config module, returns its mongo dict for the
+    test to fill in.
+    '''
+    config = types.ModuleType('config')
+    config.mongo = {'hostname': 'localhost', 'port': 27017}
+    monkeypatch.setitem(sys.modules, 'config', config)
+    return config.mongo
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    '''
+    A mongomock database, or a scratch database on a real server when
+    TBA_TEST_MONGO is set to its uri, e.g. mongodb://localhost:27017
+    '''
+    uri = os.environ.get('TBA_TEST_MONGO')
+
+    if not uri:
+        mongomock = pytest.importorskip('mongomock')
+
+        # the server applies each single document write atomically, mongomock
+        # runs find_one_and_update as a separate find and update
+        lock = threading.RLock()
+
+        for name in ('_insert', '_update', '_find_and_modify'):
+            method = getattr(mongomock.collection.Collection, name)
+            monkeypatch.setattr(mongomock.collection.Collection, name, _locked(lock, method))
+
+        yield mongomock.MongoClient().tag_model
+        return
+
+    from pymongo import MongoClient
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    name = 'tbautils_test_{}'.format(os.getpid())
+    client.drop_database(name)
+
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_document_cache():
+    # every mock database is tag_model on localhost:27017, which cache.find_one keys on
+    yield
+
+    for name in ('cache', 'tbautils.cache'):
+        module = sys.modules.get(name)
+
+        if module is not None:
+            module.invalidate()
+
+
+@pytest.fixture
+def fake_maya(monkeypatch):
+    '''
+    Install a FakeMaya as the maya modules and return it together with a freshly
+    imported tbautils.maya, as (fake, module).
+    '''
+    fake = mayastub.FakeMaya()
+
+    for name, module in fake.modules().items():
+        monkeypatch.setitem(sys.modules, name, module)
+
+    monkeypatch.delitem(sys.modules, 'tbautils.maya', raising=False)
+    module = importlib.import_module('tbautils.maya')
+    monkeypatch.delitem(sys.modules, 'tbautils.maya')
+
+    return fake, module
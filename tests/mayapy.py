@@ -0,0 +1,26 @@
+import os
+import sys
+import types
+import runpy
+
+#
+# Stand-in for mayapy used by test_maya_batch, run as: python mayapy.py -m <module> args...
+# The maya modules are replaced with mayastub and the database points at a
+# closed port, so lookups fail fast like an unreachable server. The repo folder
+# goes on the path as in conftest, maya_batch adds the one holding tbautils.
+#
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [TESTS, os.path.dirname(TESTS)]
+
+import mayastub
+
+sys.modules.update(mayastub.FakeMaya().modules())
+
+config = types.ModuleType('config')
+config.mongo = {'hostname': 'localhost', 'port': 1, 'connect_timeout_ms': 100, 'server_selection_timeout_ms': 100}
+sys.modules['config'] = config
+
+if __name__ == '__main__':
+    module = sys.argv[2]
+    sys.argv = [module] + sys.argv[3:]
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
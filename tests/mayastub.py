@@ -0,0 +1,216 @@
+import io
+import os
+import json
+import time
+import types
+import fnmatch
+
+#
+# Just enough of maya.cmds, maya.mel, maya.standalone and maya.api.OpenMaya to
+# run tbautils.maya outside of Maya. Used by the fake_maya fixture and, through
+# mayapy.py, as the interpreter of maya_batch workers.
+#
+# A scene file opened with cmds.file(open=True) is a json dict with the sets
+# and optional behaviour:
+#   {"sets": {name: attrs}, "export_error": msg, "export_sleep": seconds,
+#    "export_missing_once": asset name}
+# export_missing_once leaves that asset's file unwritten the first time the
+# scene is exported, a <scene>.missing file remembers it across processes.
+#
+
+
+class FakeMaya(object):
+    '''
+    sets maps set names to their attribute values, every cmds call is counted in calls.
+    '''
+
+    def __init__(self):
+        self.sets = {}
+        self.calls = 0
+        self.scene = ''
+        self.exports = []
+        self.export_error = None
+        self.export_sleep = None
+        self.export_missing_once = None
+
+        self.cmds = types.ModuleType('maya.cmds')
+        self.mel = types.ModuleType('maya.mel')
+        self.standalone = types.ModuleType('maya.standalone')
+        self.om = types.ModuleType('maya.api.OpenMaya')
+
+        for name in ('ls', 'getAttr', 'setAttr', 'sets', 'file', 'AbcExport', 'playbackOptions', 'currentTime'):
+            setattr(self.cmds, name, self._counted(getattr(self, '_' + name)))
+
+        self.mel.eval = lambda command: 24.0
+        self.standalone.initialize = lambda name=None: None
+        self._build_api()
+
+    def modules(self):
+        '''
+        return: dict of module name -> module to put in sys.modules
+        '''
+        package = types.ModuleType('maya')
+        api = types.ModuleType('maya.api')
+        package.cmds, package.mel, package.standalone, package.api = self.cmds, self.mel, self.standalone, api
+        api.OpenMaya = self.om
+
+        return {'maya': package, 'maya.cmds': self.cmds, 'maya.mel': self.mel,
+                'maya.standalone': self.standalone, 'maya.api': api, 'maya.api.OpenMaya': self.om}
+
+    def add_set(self, name, **attrs):
+        self.sets['tba_asset_' + name] = set_attrs(name, **attrs)
+
+    def _counted(self, method):
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def _ls(self, pattern=None, type=None, dag=False, **kwargs):
+        if dag:
+            # every root has a single shape below it
+            return [node for root in pattern for node in (root, root + '|' + root.split('|')[-1] + 'Shape')]
+
+        return sorted(name for name in self.sets if fnmatch.fnmatchcase(name, pattern))
+
+    def _getAttr(self, plug):
+        node, attr = plug.split('.', 1)
+        return self.sets[node][attr]
+
+    def _setAttr(self, plug, value, **kwargs):
+        node, attr = plug.split('.', 1)
+        self.sets[node][attr] = value
+
+    def _sets(self, name, q=False):
+        return list(self.sets[name if isinstance(name, str) else name[0]]['contents'])
+
+    def _file(self, scene=None, open=False, force=False, q=False, sn=False, modified=False):
+        if open:
+            with io.open(scene) as f:
+                data = json.load(f)
+
+            self.scene = scene
+            self.sets = data.get('sets', {})
+            self.export_error = data.get('export_error')
+            self.export_sleep = data.get('export_sleep')
+            self.export_missing_once = data.get('export_missing_once')
+            return scene
+
+        if modified:
+            return False
+
+        return self.scene
+
+    def _currentTime(self, q=True):
+        return 1.0
+
+    def _playbackOptions(self, q=True, min=False, max=False):
+        return 1.0 if min else 100.0
+
+    def _AbcExport(self, jobArg):
+        if self.export_error:
+            raise RuntimeError(self.export_error)
+
+        missing = None
+
+        if self.export_missing_once and not os.path.exists(self.scene + '.missing'):
+            missing = self.export_missing_once
+            open(self.scene + '.missing', 'w').close()
+
+        for job in jobArg:
+            args, path = job.split(' -file ')
+
+            if os.path.basename(path) == '{}.abc'.format(missing):
+                continue
+
+            with open(path, 'wb') as f:
+                f.write(b'Ogawa ' + args.encode('utf-8'))
+
+                if self.export_sleep:
+                    # killed half way through writing the cache
+                    f.flush()
+                    time.sleep(self.export_sleep)
+
+            self.exports.append(path)
+
+    def _build_api(self):
+        maya = self
+        om = self.om
+
+        class MFn(object):
+            kSet = 'kSet'
+
+        class MObject(object):
+            def __init__(self, name=None, values=None):
+                self.name = name
+                self.values = values
+
+            def hasFn(self, kind):
+                return kind == MFn.kSet
+
+            def isNull(self):
+                return not self.values
+
+        class MPlug(object):
+            def __init__(self, value):
+                self.value = value
+
+            def asInt(self):
+                return self.value
+
+            def asString(self):
+                return self.value
+
+            def asMObject(self):
+                return MObject(values=self.value)
+
+        class MFnDependencyNode(object):
+            def __init__(self, obj):
+                self.obj = obj
+
+            def findPlug(self, attr, wantNetworkedPlug):
+                values = maya.sets[self.obj.name]
+
+                if attr not in values:
+                    raise RuntimeError('no plug ' + attr)
+
+                return MPlug(values[attr])
+
+        class MFnStringArrayData(object):
+            def __init__(self, obj):
+                self.obj = obj
+
+            def array(self):
+                return list(self.obj.values)
+
+        class MSelectionList(object):
+            def __init__(self):
+                self.names = []
+
+            def add(self, pattern):
+                names = sorted(name for name in maya.sets if fnmatch.fnmatchcase(name, pattern))
+
+                if not names:
+                    raise RuntimeError('no objects match ' + pattern)
+
+                self.names.extend(names)
+
+            def length(self):
+                return len(self.names)
+
+            def getDependNode(self, i):
+                return MObject(self.names[i])
+
+        for cls in (MFn, MObject, MPlug, MFnDependencyNode, MFnStringArrayData, MSelectionList):
+            setattr(om, cls.__name__, cls)
+
+
+def set_attrs(name, **attrs):
+    '''
+    return: attribute values of a tba_asset set, as read by get_tba_assets
+    '''
+    values = {'name': name, 'type': 'model', 'stage': 'build', 'entity': 'props', 'author': 'artist',
+              'dateCreated': '2026-01-01', 'dateUpdated': '2026-01-01', 'version': 0, 'tags': [],
+              'contents': ['|' + name + '_grp']}
+    values.update(attrs)
+    return values
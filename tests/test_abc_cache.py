@@ -0,0 +1,45 @@
+import sys
+import types
+
+import pytest
+
+import abc_cache
+
+
+@pytest.fixture
+def alembic_hom(monkeypatch):
+    # Houdini's _alembic_hom_extensions, reading a chair with a single shape
+    module = types.ModuleType('_alembic_hom_extensions')
+    module.reads = []
+
+    def path_list(path):
+        module.reads.append(path)
+        return ('/', '/', '/chair', '/chair', '/chair/chairShape', '/chair/chairShape')
+
+    module.alembicGetObjectPathListForMenu = path_list
+    module.alembicTimeRange = lambda path: (0.0, 4.0)
+    monkeypatch.setitem(sys.modules, '_alembic_hom_extensions', module)
+    return module
+
+
+def test_read_hierarchy(alembic_hom):
+    assert abc_cache.read_hierarchy('/jobs/J123/chair.abc') == {
+        'paths': ['/chair', '/chair/chairShape'],
+        'object_count': 2,
+        'time_range': [0.0, 4.0]
+    }
+
+
+def test_cache_until_file_changes(alembic_hom, tmpdir):
+    path = tmpdir.join('chair.abc')
+    path.write('Ogawa')
+
+    hierarchies = abc_cache.HierarchyCache(str(tmpdir.join('cache.sqlite')))
+
+    assert hierarchies.get(str(path))['paths'] == ['/chair', '/chair/chairShape']
+    assert hierarchies.get(str(path))['paths'] == ['/chair', '/chair/chairShape']
+    assert len(alembic_hom.reads) == 1
+
+    path.write('Ogawa, re-exported')
+    hierarchies.get(str(path))
+    assert len(alembic_hom.reads) == 2
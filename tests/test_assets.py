@@ -0,0 +1,134 @@
+import threading
+
+import assets
+import indexes
+
+KEY = {'name': 'chair', 'stage': 'build', 'entity': 'props', 'type': 'model'}
+
+
+def _publish_concurrently(db, publishers, publish):
+    barrier = threading.Event()
+    errors = []
+
+    def work(n):
+        barrier.wait()
+        try:
+            publish(n)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(publishers)]
+
+    for thread in threads:
+        thread.start()
+
+    barrier.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+
+
+def _check_history(db, publishers):
+    # every version is either current or in history, exactly once
+    current = list(db.assets_curr.find(KEY))
+    history = [doc['version'] for doc in db.assets_prev.find(KEY)]
+
+    assert len(current) == 1
+    assert len(history) == publishers - 1
+    assert sorted(history + [current[0]['version']]) == list(range(publishers))
+
+
+def test_rotate_asset_concurrent_updates(mock_db):
+    indexes.ensure_indexes(mock_db)
+    publishers = 16
+
+    def publish(n):
+        document = dict(KEY, version=n)
+        assets.rotate_asset(mock_db, KEY, {'$set': {'version': n}}, insert=document)
+
+    _publish_concurrently(mock_db, publishers, publish)
+    _check_history(mock_db, publishers)
+
+
+def test_rotate_asset_concurrent_replacements(mock_db):
+    indexes.ensure_indexes(mock_db)
+    publishers = 16
+
+    def publish(n):
+        document = dict(KEY, version=n)
+        assets.rotate_asset(mock_db, KEY, document, insert=dict(document))
+
+    _publish_concurrently(mock_db, publishers, publish)
+    _check_history(mock_db, publishers)
+
+
+def test_rotate_asset_without_insert(mock_db):
+    assert assets.rotate_asset(mock_db, KEY, {'$set': {'version': 1}}) is None
+    assert mock_db.assets_curr.count_documents({}) == 0
+
+
+def _asset(name, version):
+    return {'name': name, 'stage': 'build', 'entity': 'props', 'type': 'model', 'version': version}
+
+
+def _versions(db, name):
+    query = dict(KEY, name=name)
+    current = [doc['version'] for doc in db.assets_curr.find(query)]
+    history = sorted(doc['version'] for doc in db.assets_prev.find(query))
+    return current, history
+
+
+def _publish_before_bulk_write(monkeypatch, publish):
+    # run publish (another artist) between rotate_assets' find and its bulk_write
+    bulk_write = assets._bulk_write
+
+    def racing_bulk_write(collection, ops, ordered):
+        if collection.name == 'assets_curr' and publish:
+            publish.pop()()
+        return bulk_write(collection, ops, ordered)
+
+    monkeypatch.setattr(assets, '_bulk_write', racing_bulk_write)
+
+
+def test_rotate_assets(mock_db):
+    indexes.ensure_indexes(mock_db)
+    mock_db.assets_curr.insert_one(_asset('chair', 1))
+
+    results = assets.rotate_assets(mock_db, [_asset('chair', 2), _asset('table', 1), _asset('chair', 3)])
+
+    assert [r['status'] for r in results] == ['updated', 'inserted', 'updated']
+    assert not any(r['error'] for r in results)
+    assert _versions(mock_db, 'chair') == ([3], [1, 2])
+    assert _versions(mock_db, 'table') == ([1], [])
+
+
+def test_rotate_assets_replace_race(mock_db, monkeypatch):
+    indexes.ensure_indexes(mock_db)
+    mock_db.assets_curr.insert_one(_asset('chair', 1))
+    mock_db.assets_curr.insert_one(_asset('table', 1))
+
+    other = _asset('chair', 2)
+    _publish_before_bulk_write(monkeypatch, [lambda: assets.rotate_asset(mock_db, assets.asset_key(other), other)])
+
+    results = assets.rotate_assets(mock_db, [_asset('chair', 3), _asset('table', 2)])
+
+    assert [r['status'] for r in results] == ['updated', 'updated']
+    assert not any(r['error'] for r in results)
+
+    # the other publisher's version 2 is in history and version 1 only once
+    assert _versions(mock_db, 'chair') == ([3], [1, 2])
+    assert _versions(mock_db, 'table') == ([2], [1])
+
+
+def test_rotate_assets_insert_race(mock_db, monkeypatch):
+    indexes.ensure_indexes(mock_db)
+
+    _publish_before_bulk_write(monkeypatch, [lambda: mock_db.assets_curr.insert_one(_asset('chair', 1))])
+
+    results = assets.rotate_assets(mock_db, [_asset('chair', 2)])
+
+    assert results[0]['status'] == 'updated'
+    assert not results[0]['error']
+    assert _versions(mock_db, 'chair') == ([2], [1])
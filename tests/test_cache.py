@@ -0,0 +1,34 @@
+import pytest
+
+import cache
+
+
+def test_find_one_keys_on_server(mongo_config):
+    mongomock = pytest.importorskip('mongomock')
+
+    # the same database name on two servers
+    test = mongomock.MongoClient('localhost', 27017).tag_model
+    production = mongomock.MongoClient('tbavm1', 27017).tag_model
+
+    test.jobs.insert_one({'name': 'J123', 'server': 'test'})
+    production.jobs.insert_one({'name': 'J123', 'server': 'production'})
+
+    assert cache.find_one(test, 'jobs', {'name': 'J123'})['server'] == 'test'
+    assert cache.find_one(production, 'jobs', {'name': 'J123'})['server'] == 'production'
+    assert cache.find_many(production, 'jobs', [production.jobs.find_one()['_id']]).popitem()[1]['server'] == 'production'
+    assert cache.stats()['jobs'] == {'hits': 0, 'misses': 3}
+
+    cache.invalidate('jobs')
+    assert cache.stats()['size'] == 0
+
+
+def test_address_does_not_connect():
+    pymongo = pytest.importorskip('pymongo')
+
+    client = pymongo.MongoClient('10.255.255.1', 27017, connect=False, serverSelectionTimeoutMS=100)
+
+    try:
+        # MongoClient.address would wait for the server and fail
+        assert cache._address(client.tag_model) == (('10.255.255.1', 27017),)
+    finally:
+        client.close()
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import catalog
+import versions
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/jobs/J123/vfx/build/props/model/chair.ma', ('scene', '.ma')),
+    ('/jobs/J123/vfx/build/props/model/notes.txt', (None, '.txt')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/v001/chair.abc', ('publish', '.abc')),
+    ('P:\\J123\\vfx\\build\\_published3d\\chair\\model\\v001\\chair.abc', ('publish', '.abc')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/.versions.json', (None, '.json')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/.versions.json.lock', (None, '.lock')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/.versions.json.x1y2.tmp', (None, '.tmp')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/v002/.chair.x1y2.tmp.abc', (None, '.abc')),
+    ('/jobs/J123/vfx/build/_published3d/chair/model/v002/chair.abc.tmp', (None, '.tmp')),
+    ('/jobs/J123/vfx/build/props/model/.chair.ma', (None, '.ma')),
+])
+def test_classify(path, expected):
+    assert catalog._classify(path) == expected
+
+
+def test_build(tmpdir):
+    job = tmpdir.join('J123')
+    job.ensure('vfx', 'build', 'props', 'model', 'chair.ma')
+
+    index = versions.VersionIndex(str(job.join('vfx', 'build', '_published3d', 'chair', 'model')))
+    number, path = index.allocate()
+    filepath = os.path.join(path, 'chair.abc')
+
+    with open(filepath, 'w') as f:
+        f.write('abc')
+
+    # leaves .versions.json next to the version folder
+    index.record(number, filepath)
+
+    index_path = str(tmpdir.join('index.sqlite'))
+    stats = catalog.Catalog(str(job), index_path).build(workers=2)
+
+    files = catalog.Catalog(str(job), index_path).files()
+
+    assert stats == {'scanned': 8, 'reused': 0, 'files': 2}
+    assert [(f['kind'], f['ext'], f['stage'], f['task']) for f in files] == \
+        [('publish', '.abc', 'build', 'model'), ('scene', '.ma', 'build', 'model')]
+
+    # nothing changed, every folder is reused
+    assert catalog.Catalog(str(job), index_path).build(workers=2) == {'scanned': 0, 'reused': 8, 'files': 2}
+
+    # a new scene only rescans its folder, set its mtime so the change shows on coarse clocks
+    folder = job.join('vfx', 'build', 'props', 'model')
+    folder.join('table.ma').write('')
+    os.utime(str(folder), (folder.mtime() + 10, folder.mtime() + 10))
+
+    assert catalog.Catalog(str(job), index_path).build(workers=2) == {'scanned': 1, 'reused': 7, 'files': 3}
+    assert [f['path'] for f in catalog.Catalog(str(job), index_path).files(kind='scene')] == \
+        [str(folder.join('chair.ma')), str(folder.join('table.ma'))]
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import common
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/jobs/J123/vfx/build/props/model/chair.ma', ('J123', 'build', 'props', 'model', '/jobs/J123')),
+    ('P:\\jobs\\J123\\vfx\\build\\props\\scenes\\chair.ma', ('J123', 'build', 'props', '', 'P:/jobs/J123')),
+    ('/jobs/J123/vfx/build', ('J123', 'build', '', 'vfx', '/jobs/J123')),
+    ('/home/artist/scenes/test.ma', ('', '', '', '', '')),
+    ('chair.ma', ('', '', '', '', '')),
+])
+def test_parse_job_path(path, expected):
+    context = common.parse_job_path(path)
+
+    # job_path is joined with the platform separator
+    assert context[:4] == expected[:4]
+    assert context.job_path.replace('\\', '/') == expected[4]
+    assert context['stage'] == expected[1]
+
+
+def test_context_keys():
+    context = common.parse_job_path('/jobs/J123/vfx/build/props/model/chair.ma')
+
+    # keys read from Houdini or Maya are unicode on Python 2
+    assert context[u'job'] == 'J123'
+    assert context.get(u'entity') == 'props'
+    assert context[-1].replace('\\', '/') == '/jobs/J123'
+
+
+def test_parse_many():
+    paths = ['/jobs/J123/vfx/build/props/model/chair.ma',
+             '/jobs/J123/vfx/build/props/model/table.ma',
+             '/jobs/J123/vfx/build',
+             '/jobs/J123/vfx/build/sets',
+             '/home/artist/scenes/test.ma',
+             'chair.ma']
+
+    assert common.parse_many(paths) == [common.parse_job_path(p) for p in paths]
+
+
+def _walk(folders, files):
+    # paths as a filesystem walk returns them, grouped by folder
+    paths = []
+
+    for i in range(folders):
+        folder = '/jobs/J{0:03d}/vfx/build/ent{1:04d}/_published3d/asset{1}/model/v{2:03d}'.format(i % 7, i, i % 40)
+        paths.extend('{}/file{:03d}.abc'.format(folder, j) for j in range(files))
+
+    return paths
+
+
+def _rate(count, seconds):
+    return count / max(seconds, 1e-6)
+
+
+def test_parse_benchmark():
+    paths = _walk(2000, 50)
+
+    start = time.time()
+    expected = [common._parse(p)[0] for p in paths]
+    uncached = time.time() - start
+
+    start = time.time()
+    assert common.parse_many(paths) == expected
+    batch = time.time() - start
+
+    # single calls, first through the LRU and then from it
+    sample = paths[:4096]
+    common._parsed.invalidate()
+
+    start = time.time()
+    for path in sample:
+        common.parse_job_path(path)
+    cold = time.time() - start
+
+    start = time.time()
+    for path in sample:
+        common.parse_job_path(path)
+    warm = time.time() - start
+
+    print('uncached {:.0f}/s, batch {:.0f}/s, single call {:.0f}/s, cached {:.0f}/s'.format(
+        _rate(len(paths), uncached), _rate(len(paths), batch), _rate(len(sample), cold), _rate(len(sample), warm)))
+
+    # 50 files per folder, the batch only parses one path per folder
+    assert batch * 2 < uncached
+    assert warm < cold
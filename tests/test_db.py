@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+
+def _import_time(tmpdir, host):
+    '''
+    Import tbautils.db in a fresh interpreter whose config.mongo points at host.
+    return: (seconds, pymongo imported, client built) after the import, and
+        whether the first use built a client for host
+    '''
+    tmpdir.join('config.py').write('mongo = {{"hostname": {!r}, "port": 27017}}\n'.format(host))
+
+    code = '\n'.join([
+        'import sys, time',
+        'start = time.time()',
+        'from tbautils.db import db',
+        'seconds = time.time() - start',
+        'imported = "pymongo" in sys.modules',
+        'built = "tbautils.connection" in sys.modules',
+        'db.client',
+        'from tbautils import connection',
+        'used = (db.host, db.port) == (None, None) and list(connection._clients) == [({!r}, 27017)]'.format(host),
+        'sys.stdout.write("{} {} {} {}".format(seconds, imported, built, used))',
+    ])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmpdir)] + [p for p in sys.path if p]))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env, cwd=ROOT)
+    seconds, imported, built, used = output.decode('ascii').split()
+    return float(seconds), imported == 'True', built == 'True', used == 'True'
+
+
+def test_import_does_not_connect(tmpdir):
+    # configured with an address that never answers, importing must not notice
+    seconds, imported, built, used = _import_time(tmpdir, '10.255.255.1')
+
+    assert not imported
+    assert not built
+    assert used
+    assert seconds < 0.5
+
+
+def test_import_time_benchmark(tmpdir):
+    # startup cost of tbautils.db, independent of the host it points at
+    times = {}
+
+    for host in ('localhost', '10.255.255.1'):
+        folder = tmpdir.mkdir(host)
+        times[host] = min(_import_time(folder, host)[0] for i in range(3))
+
+    print('tbautils.db import: ' + ', '.join('{} {:.2f}ms'.format(h, t * 1000) for h, t in sorted(times.items())))
+
+    assert max(times.values()) < 0.5
+
+
+def test_handle_uses_config(mongo_config):
+    from tbautils import connection
+    from tbautils.db import db
+
+    # tbautils.db.db is the shared instance, build fresh handles from its class
+    mongo_config.update(hostname='config-host', port=27999, connect_timeout_ms=1234,
+                        server_selection_timeout_ms=2345)
+
+    handle = type(db)()
+
+    try:
+        client = handle.client
+        assert 'config-host:27999' in repr(client)
+        assert 'connecttimeoutms=1234' in repr(client)
+        assert 'serverselectiontimeoutms=2345' in repr(client)
+
+        # explicit arguments win over config
+        handle = type(db)(host='other-host', port=27998, server_selection_timeout_ms=99)
+        assert 'serverselectiontimeoutms=99' in repr(handle.client)
+        assert 'connecttimeoutms=1234' in repr(handle.client)
+    finally:
+        connection.close_all()
+
+
+def test_handle_follows_fork_check(mongo_config, monkeypatch):
+    from tbautils import connection
+    from tbautils.db import db
+
+    handle = type(db)()
+
+    try:
+        first = handle.client
+        assert handle.client is first
+
+        # pretend we're in a forked child, the handle must not hand out the parent's client
+        monkeypatch.setattr(connection, '_pid', -1)
+        assert handle.client is not first
+    finally:
+        connection.close_all()
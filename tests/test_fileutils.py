@@ -0,0 +1,211 @@
+import os
+import stat
+import time
+import socket
+import threading
+import subprocess
+import sys
+
+import pytest
+
+import fileutils
+import versions
+
+posix_only = pytest.mark.skipif(sys.platform == 'win32', reason='posix permissions')
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(str(path)).st_mode)
+
+
+@posix_only
+def test_atomic_write_permissions(tmpdir):
+    path = str(tmpdir.join('data.json'))
+
+    fileutils.atomic_write(path, b'{}')
+    assert _mode(path) == 0o644
+
+    os.chmod(path, 0o664)
+    fileutils.atomic_write(path, b'{"a": 1}')
+    assert _mode(path) == 0o664
+
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"a": 1}'
+
+    assert tmpdir.listdir() == [tmpdir.join('data.json')]
+
+
+@posix_only
+def test_staged_file_permissions(tmpdir):
+    path = str(tmpdir.join('lib.hda'))
+
+    with fileutils.staged_file(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'one')
+
+    assert _mode(path) == 0o644
+
+    os.chmod(path, 0o640)
+
+    with fileutils.staged_file(path, copy_existing=True) as tmp_path:
+        with open(tmp_path, 'ab') as f:
+            f.write(b' two')
+
+    assert _mode(path) == 0o640
+
+    with fileutils.staged_file(path, mode=0o444) as tmp_path:
+        pass
+
+    assert _mode(path) == 0o444
+
+
+@posix_only
+def test_version_manifest_is_readable(tmpdir):
+    index = versions.VersionIndex(str(tmpdir.join('chair', 'model')))
+    number, path = index.allocate()
+
+    assert number == 1
+    assert _mode(index.manifest_path) == 0o644
+
+
+def _publisher(path, lock_path, waits, active, overlaps, count, hold):
+    # one artist publishing the same library count times
+    for i in range(count):
+        with fileutils.FileLock(lock_path, timeout=30, poll=0.001) as lock:
+            waits.append(lock.wait_time)
+            active.append(1)
+
+            if len(active) > 1:
+                overlaps.append(1)
+
+            with fileutils.staged_file(path) as tmp_path:
+                with open(tmp_path, 'wb') as f:
+                    f.write(b'x' * 65536)
+
+            time.sleep(hold)
+            active.pop()
+
+
+@pytest.mark.parametrize('publishers', [1, 4, 16])
+def test_lock_benchmark(tmpdir, publishers):
+    path = str(tmpdir.join('tba_chair.hda'))
+    waits = []
+    active = []
+    overlaps = []
+    count = 10
+
+    threads = [threading.Thread(target=_publisher, args=(path, path + '.lock', waits, active, overlaps, count, 0.001))
+               for i in range(publishers)]
+
+    start = time.time()
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    seconds = time.time() - start
+
+    print('{} publishers: {:.0f} publishes/s, lock wait mean {:.1f}ms, max {:.1f}ms'.format(
+        publishers, len(waits) / seconds, 1000 * sum(waits) / len(waits), 1000 * max(waits)))
+
+    assert len(waits) == publishers * count
+    assert overlaps == []
+    assert os.path.getsize(path) == 65536
+    assert sorted(os.listdir(str(tmpdir))) == ['tba_chair.hda']
+
+
+def test_lock_heartbeat(tmpdir):
+    path = str(tmpdir.join('lib.lock'))
+
+    with fileutils.FileLock(path, stale_after=0.3, heartbeat=0.05):
+        time.sleep(0.6)
+
+        # held longer than stale_after, but refreshed
+        with pytest.raises(RuntimeError):
+            fileutils.FileLock(path, timeout=0.5, stale_after=0.3).acquire()
+
+    assert not os.path.exists(path)
+
+
+def test_break_stale_lock(tmpdir):
+    path = str(tmpdir.join('lib.lock'))
+
+    with open(path, 'w') as f:
+        f.write('otherhost 1 abc')
+
+    old = time.time() - 600
+    os.utime(path, (old, old))
+
+    with fileutils.FileLock(path, timeout=1) as lock:
+        assert open(path).read() == lock._token
+
+    assert sorted(os.listdir(str(tmpdir))) == []
+
+
+@posix_only
+def test_break_dead_process_lock(tmpdir):
+    path = str(tmpdir.join('lib.lock'))
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+
+    with open(path, 'w') as f:
+        f.write('{} {} abc'.format(socket.gethostname(), proc.pid))
+
+    with fileutils.FileLock(path, timeout=1):
+        pass
+
+
+def test_release_keeps_other_lock(tmpdir):
+    path = str(tmpdir.join('lib.lock'))
+    lock = fileutils.FileLock(path).acquire()
+
+    # broken and taken by someone else while we held it
+    os.remove(path)
+    other = fileutils.FileLock(path, timeout=1).acquire()
+
+    lock.release()
+    assert open(path).read() == other._token
+
+    other.release()
+    assert not os.path.exists(path)
+
+
+def test_break_keeps_new_lock(tmpdir):
+    # two processes found the same lock stale, the first broke it and a new
+    # lock was taken before the second got to it
+    path = str(tmpdir.join('lib.lock'))
+    late = fileutils.FileLock(path)
+    holder = fileutils.FileLock(path, timeout=1).acquire()
+
+    late._break('otherhost 1 stale')
+
+    assert open(path).read() == holder._token
+    assert sorted(os.listdir(str(tmpdir))) == ['lib.lock']
+    holder.release()
+
+
+def test_stale_breakers_race(tmpdir):
+    path = str(tmpdir.join('tba_chair.hda'))
+    lock_path = path + '.lock'
+
+    with open(lock_path, 'w') as f:
+        f.write('otherhost 1 abc')
+
+    old = time.time() - 600
+    os.utime(lock_path, (old, old))
+
+    waits = []
+    active = []
+    overlaps = []
+    threads = [threading.Thread(target=_publisher, args=(path, lock_path, waits, active, overlaps, 5, 0.002))
+               for i in range(8)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(waits) == 40
+    assert overlaps == []
+    assert sorted(os.listdir(str(tmpdir))) == ['tba_chair.hda']
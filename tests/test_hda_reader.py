@@ -0,0 +1,112 @@
+import pytest
+
+import hda_reader
+from hda_version import HdaVersion
+
+# help text of a definition, which the index reader must not mistake for a record
+HELP = b'= Chair =\n\nOperator:     fake::thing::9.9\nLabel:        Fake\nTable:        Sop\n\nSee the wiki.\n'
+
+
+def _record(name, label):
+    return ('Operator:     {0}\n'
+            'Label:        {1}\n'
+            'Path:         oplib:/Sop/{0}?Sop/{0}\n'
+            'Icon:         SOP_subnet\n'
+            'Table:        Sop\n'
+            'License:      \n'
+            'Extra:        \n'
+            'User:         \n'
+            'Inputs:       0 to 1\n'
+            'Subnet:       true\n'
+            'Python:       false\n'
+            'Empty:        false\n'
+            'Modified:     Thu Jan 01 00:00:00 2026\n').format(name, label).encode('utf-8')
+
+
+INDEX = _record('tba::chair::1.0', 'Chair') + b'\n' + _record('tba::chair::1.10', 'Chair 1.10') + b'\n'
+
+
+def _binary_library(path):
+    # INDX container: table of contents, the index records, then the definitions' sections
+    path.write_binary(b'INDX\n\n\x00\x00\x01\x2cINDEX_SECTION\x00\x00\x00\x00\x00\x00\x02\x10'
+                      b'houdini.hdalibrary\x00Sop_1tba_1_1chair_1_11.0\x00\x00\x04\x00\n' +
+                      INDEX + b'\x00\x1f\x8b\x08\x00binary payload\x00\xff' + HELP + b'\x00more\x00')
+    return str(path)
+
+
+def _expanded_library(folder):
+    folder.join('Sections.list').write('""\nINDEX_SECTION\tINDEX_SECTION\n'
+                                       'houdini.hdalibrary\thoudini.hdalibrary\n'
+                                       'Sop_1tba_1_1chair_1_11.0\tSop/tba::chair::1.0\n')
+    folder.join('INDEX_SECTION').write_binary(INDEX)
+    folder.join('houdini.hdalibrary').write('')
+
+    definition = folder.mkdir('Sop_1tba_1_1chair_1_11.0')
+    definition.join('Sections.list').write('""\nDialogScript\tDialogScript\nHelp\tHelp\nContents.gz\tContents.gz\n')
+    definition.join('DialogScript').write('# Dialog script for tba::chair::1.0\n')
+    definition.join('Help').write_binary(HELP)
+    definition.join('Contents.gz').write_binary(b'\x1f\x8b' + b'\x00' * 98)
+    return str(folder)
+
+
+def test_binary_library(tmpdir):
+    definitions = hda_reader.read_definitions(_binary_library(tmpdir.join('tba_chair.hda')))
+
+    assert [(d['name'], d['base_name'], d['version'], d['label'], d['category']) for d in definitions] == [
+        ('tba::chair::1.0', 'tba::chair', HdaVersion(1, 0), 'Chair', 'Sop'),
+        ('tba::chair::1.10', 'tba::chair', HdaVersion(1, 10), 'Chair 1.10', 'Sop')]
+    assert definitions[0]['path'] == 'oplib:/Sop/tba::chair::1.0?Sop/tba::chair::1.0'
+    assert definitions[0]['modified'] == 'Thu Jan 01 00:00:00 2026'
+    assert definitions[0]['sections'] is None
+
+
+def test_binary_library_crlf(tmpdir):
+    path = _binary_library(tmpdir.join('tba_chair.hda'))
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    tmpdir.join('crlf.hda').write_binary(data.replace(INDEX, INDEX.replace(b'\n', b'\r\n')))
+    definitions = hda_reader.read_definitions(str(tmpdir.join('crlf.hda')))
+
+    assert [d['name'] for d in definitions] == ['tba::chair::1.0', 'tba::chair::1.10']
+    assert definitions[0]['label'] == 'Chair'
+
+
+def test_expanded_library(tmpdir):
+    definitions = hda_reader.read_definitions(_expanded_library(tmpdir.mkdir('tba_chair.hda')))
+
+    assert [d['name'] for d in definitions] == ['tba::chair::1.0', 'tba::chair::1.10']
+    assert definitions[0]['sections'] == [
+        {'name': 'Contents.gz', 'size': 100},
+        {'name': 'DialogScript', 'size': 36},
+        {'name': 'Help', 'size': len(HELP)}]
+
+    # no folder for the second definition
+    assert definitions[1]['sections'] is None
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'', 'Not an HDA library'),
+    (b'PK\x03\x04 a zip file', 'missing INDX header'),
+    (b'INDX\n\nhoudini.hdalibrary\x00', 'No INDEX_SECTION'),
+    (b'INDX\n\nINDEX_SECTION\x00\x00\x01' + b'\x00' * 20, 'Could not find any definitions'),
+])
+def test_not_a_library(tmpdir, data, message):
+    path = tmpdir.join('broken.hda')
+    path.write_binary(data)
+
+    with pytest.raises(ValueError) as error:
+        hda_reader.read_definitions(str(path))
+
+    assert message in str(error.value)
+
+
+def test_not_an_expanded_library(tmpdir):
+    with pytest.raises(ValueError):
+        hda_reader.read_definitions(str(tmpdir.mkdir('otls')))
+
+
+def test_main(tmpdir, capsys):
+    assert hda_reader.main([_expanded_library(tmpdir.mkdir('tba_chair.hda'))]) == 0
+    assert 'Sop/tba::chair::1.0 {} bytes in 3 sections'.format(136 + len(HELP)) in capsys.readouterr()[0]
@@ -0,0 +1,233 @@
+import sys
+import time
+import types
+import importlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pytest
+
+# houdini.py is Python 2 only, like the Houdini builds it runs in
+pytestmark = pytest.mark.skipif(sys.version_info[0] > 2, reason='houdini.py needs Python 2')
+
+ASSET_COUNT = 200
+
+
+class FakeNode(object):
+
+    def __init__(self, hou, parent, name, type_name):
+        self.hou = hou
+        self.parent = parent
+        self._name = name
+        self.type_name = type_name
+        self.children_ = OrderedDict()
+        self.parms = {}
+        self.inputs = {}
+        self.parm_group = FakeParmTemplateGroup()
+
+    def name(self):
+        return self._name
+
+    def path(self):
+        return (self.parent.path().rstrip('/') if self.parent else '') + '/' + self._name
+
+    def children(self):
+        return tuple(self.children_.values())
+
+    def node(self, name):
+        return self.children_.get(name)
+
+    def createNode(self, type_name, name):
+        self.hou.created.append(type_name)
+        node = FakeNode(self.hou, self, name, type_name)
+        self.children_[name] = node
+        return node
+
+    def destroy(self):
+        del self.parent.children_[self._name]
+
+    def parm(self, name):
+        node = self
+
+        class Parm(object):
+            def set(self, value):
+                node.parms[name] = value
+
+        return Parm()
+
+    def setInput(self, index, node):
+        self.inputs[index] = node
+
+    def layoutChildren(self, items=()):
+        self.hou.layouts.append(list(items))
+
+    def parmTemplateGroup(self):
+        return self.parm_group
+
+    def setParmTemplateGroup(self, group):
+        self.parm_group = group
+
+
+class FakeParmTemplateGroup(object):
+
+    def __init__(self):
+        self.templates = []
+
+    def append(self, template):
+        self.templates.append(template)
+
+
+class FakeParmTemplate(object):
+
+    def __init__(self, name, label, *args, **kwargs):
+        self.name = name
+        self.label = label
+        self.templates = []
+
+    def addParmTemplate(self, template):
+        self.templates.append(template)
+
+    def setDefaultValue(self, value):
+        self.default = value
+
+    def setDisableWhen(self, condition):
+        self.disable_when = condition
+
+
+def fake_hou():
+    '''
+    return: a module with the parts of hou that importing assets uses. Created
+        node types, layoutChildren calls and undo groups are recorded on it.
+    '''
+    hou = types.ModuleType('hou')
+    hou.created = []
+    hou.layouts = []
+    hou.undo_groups = []
+    hou.update_mode = 'auto'
+
+    root = FakeNode(hou, None, '', 'root')
+    root.createNode('obj', 'obj')
+    root.createNode('out', 'out')
+    del hou.created[:]
+
+    def node(path):
+        found = root
+
+        for name in path.strip('/').split('/'):
+            found = found.node(name) if found else None
+
+        return found
+
+    @contextmanager
+    def group(label):
+        hou.undo_groups.append(label)
+        yield
+
+    def setUpdateMode(mode):
+        hou.update_mode = mode
+
+    hou.node = node
+    hou.undos = _namespace(group=group)
+    hou.updateMode = _namespace(Manual='manual', AutoUpdate='auto')
+    hou.updateModeSetting = lambda: hou.update_mode
+    hou.setUpdateMode = setUpdateMode
+    hou.folderType = _namespace(Tabs='tabs')
+    hou.FolderParmTemplate = FakeParmTemplate
+    hou.StringParmTemplate = FakeParmTemplate
+    return hou
+
+
+def _namespace(**kwargs):
+    namespace = types.ModuleType('namespace')
+    namespace.__dict__.update(kwargs)
+    return namespace
+
+
+@pytest.fixture
+def houdini(monkeypatch):
+    hou = fake_hou()
+    monkeypatch.setitem(sys.modules, 'hou', hou)
+
+    for name in ('houdini', 'hda_registry'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    module = importlib.import_module('houdini')
+    monkeypatch.setattr(module.abc_cache, 'get_hierarchy', lambda path: {'paths': ['/' + path.split('/')[-2]]})
+
+    yield hou, module
+
+    sys.modules.pop('houdini', None)
+
+
+def _insert_assets(db):
+    # ASSET_COUNT models, plus layouts of the first two: one's model is
+    # imported with it, the other's only comes in through dep_model_id
+    models = [{'name': 'prop{:03d}'.format(i), 'type': 'model', 'stage': 'build', 'entity': 'props',
+               'version': 1, 'filepath': '/jobs/J123/prop{:03d}/model.abc'.format(i), 'job_id': None}
+              for i in range(ASSET_COUNT)]
+    model_ids = db.assets_curr.insert_many(models).inserted_ids
+
+    layouts = [dict(models[i], type='layout', filepath='/jobs/J123/prop{:03d}/layout.abc'.format(i),
+                    dep_model_id=model_ids[i]) for i in range(2)]
+
+    for layout in layouts:
+        layout.pop('_id', None)
+
+    layout_ids = db.assets_curr.insert_many(layouts).inserted_ids
+    return model_ids, layout_ids
+
+
+def test_import_assets(houdini, mock_db):
+    hou, module = houdini
+    model_ids, layout_ids = _insert_assets(mock_db)
+
+    start = time.time()
+    containers, timings = module.importHoudiniAssets(mock_db, [layout_ids[0]] + model_ids[2:] + [layout_ids[1]])
+    seconds = time.time() - start
+
+    print('Imported {} assets in {:.2f}s'.format(len(containers), seconds))
+
+    assets_root = hou.node('/obj/ASSETS')
+    names = [node.name() for node in assets_root.children()]
+
+    # layouts have no geo container of their own
+    assert len(containers) == ASSET_COUNT
+    assert [node.name() for node in containers[1:-1]] == ['prop{:03d}_model'.format(i) for i in range(2, ASSET_COUNT)]
+    assert sorted(names) == sorted(set(names))
+    assert len(names) == ASSET_COUNT + 2
+
+    # both layouts drive their model, the second one pulled it in
+    assert assets_root.node('prop000_model').inputs[0] is assets_root.node('prop000_layout')
+    assert assets_root.node('prop001_model').inputs[0] is assets_root.node('prop001_layout')
+    assert assets_root.node('prop001_layout').parms['objectPath'] == '/prop001'
+    assert assets_root.node('prop005_model').node('prop005_model').parms['fileName'] == '/jobs/J123/prop005/model.abc'
+
+    # a single undo group, layout and update mode change for the whole import
+    assert hou.undo_groups == ['Import {} assets'.format(ASSET_COUNT)]
+    assert len(hou.layouts) == 1
+    assert len(hou.layouts[0]) == 4
+    assert hou.update_mode == 'auto'
+    assert set(timings) == set(['resolve', 'build', 'layout', 'total'])
+    assert seconds < 5
+
+    # importing again reuses the existing containers
+    created = len(hou.created)
+    again, timings = module.importHoudiniAssets(mock_db, model_ids[:10])
+
+    assert [node.name() for node in again] == ['prop{:03d}_model'.format(i) for i in range(10)]
+    assert len(hou.created) == created
+
+
+def test_import_restores_update_mode(houdini, mock_db, monkeypatch):
+    hou, module = houdini
+    model_ids, layout_ids = _insert_assets(mock_db)
+
+    def broken(*args):
+        raise RuntimeError('cook failed')
+
+    monkeypatch.setattr(module, '_build_asset', broken)
+
+    with pytest.raises(RuntimeError):
+        module.importHoudiniAssets(mock_db, model_ids[:1])
+
+    assert hou.update_mode == 'auto'
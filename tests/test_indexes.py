@@ -0,0 +1,40 @@
+import indexes
+
+
+def _asset(name, **kwargs):
+    return dict({'name': name, 'stage': 'build', 'entity': 'props', 'type': 'model'}, **kwargs)
+
+
+def test_ensure_indexes(mock_db):
+    assert indexes.ensure_indexes(mock_db) == []
+
+    # safe to run again
+    assert indexes.ensure_indexes(mock_db) == []
+
+    names = set(mock_db.assets_curr.index_information())
+    assert set(name for name, keys, options in indexes.INDEXES['assets_curr']) <= names
+
+
+def test_duplicates_are_reported(mock_db):
+    first = mock_db.assets_curr.insert_one(_asset('chair')).inserted_id
+    second = mock_db.assets_curr.insert_one(_asset('chair')).inserted_id
+    mock_db.assets_curr.insert_one(_asset('table'))
+
+    failed = indexes.ensure_indexes(mock_db)
+
+    assert ('assets_curr', 'asset_key') in [(c, n) for c, n, e in failed]
+
+    duplicates = indexes.duplicate_assets(mock_db)
+
+    assert len(duplicates) == 1
+    key, ids = duplicates[0]
+    assert key['name'] == 'chair'
+    assert sorted(ids) == sorted([first, second])
+
+
+def test_unnamed_assets_are_not_duplicates(mock_db):
+    # rows from before HDAs published without a parent got a name
+    mock_db.assets_curr.insert_one(_asset(''))
+    mock_db.assets_curr.insert_one(_asset(''))
+
+    assert indexes.duplicate_assets(mock_db) == []
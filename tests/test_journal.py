@@ -0,0 +1,208 @@
+import time
+import datetime
+import threading
+
+import bson
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import AutoReconnect
+
+import assets
+import indexes
+import journal
+
+KEY = {'name': 'chair', 'stage': 'build', 'entity': 'props', 'type': 'model'}
+
+
+@pytest.fixture
+def database(mock_db):
+    # the database the journal flushes to, tests can swap it for an unreachable one
+    current = [mock_db]
+    indexes.ensure_indexes(mock_db)
+    return current
+
+
+@pytest.fixture
+def spool(tmpdir, database):
+    # not started, tests drive _flush_batch themselves
+    return journal.PublishJournal(str(tmpdir.join('journal.sqlite')), get_db=lambda: database[0], max_backoff=0)
+
+
+def _unreachable():
+    client = MongoClient('localhost', 1, connect=False, serverSelectionTimeoutMS=50)
+    return client.tag_model
+
+
+def _hda_publish(**kwargs):
+    publish = {
+        'parent_id': None,
+        'asset_type': '',
+        'name': 'chair',
+        'job': 'J123',
+        'stage': 'build',
+        'entity': 'props',
+        'version': 2.0,
+        'filepath': '/jobs/J123/config/houdini/otls/tba_chair.hda',
+        'author': 'artist',
+        'date': datetime.datetime(2026, 1, 1),
+        'metadata': {'content_hash': 'abc'}
+    }
+    publish.update(kwargs)
+    return publish
+
+
+def test_hda_record_waits_for_database(spool, database, mock_db):
+    parent_id = mock_db.assets_curr.insert_one(dict(KEY, version=1)).inserted_id
+    mock_db.jobs.insert_one({'name': 'J123'})
+
+    good = database[0]
+    database[0] = _unreachable()
+
+    spool.append('hda', publish=_hda_publish(parent_id=str(parent_id), asset_type='shader'))
+    spool.append('hda', publish=_hda_publish())
+
+    # the parent lookup can't reach the database, the record stays queued
+    spool._flush_batch()
+    assert spool.pending() == 2
+    assert spool.failed() == []
+
+    database[0] = good
+    spool._flush_batch()
+
+    assert spool.pending() == 0
+    assert spool.failed() == []
+
+    # queued as a float before versions were stored as text
+    shader = mock_db.assets_curr.find_one(dict(KEY, type='shader'))
+    assert (shader['version'], shader['version_key']) == ('2.0', '000002.000000')
+    assert shader['filepath'].endswith('tba_chair.hda')
+    assert shader['content_hash'] == 'abc'
+
+    hda = mock_db.assets_curr.find_one({'name': 'chair', 'type': assets.HDA_ASSET_TYPE})
+    assert hda['stage'] == 'build'
+    assert hda['job_id'] == mock_db.jobs.find_one()['_id']
+
+
+def test_hda_record_without_job_fails(spool):
+    spool.append('hda', publish=_hda_publish(job='missing'))
+    spool._flush_batch()
+
+    assert spool.pending() == 0
+    assert len(spool.failed()) == 1
+
+
+class _FailOnce(object):
+    # make one collection method raise AutoReconnect the first time it is
+    # called, before or after it has been applied
+    def __init__(self, monkeypatch, collection, method, after):
+        self.calls = 0
+        original = getattr(type(collection), method)
+
+        def failing(this, *args, **kwargs):
+            if this.name != collection.name:
+                return original(this, *args, **kwargs)
+
+            self.calls += 1
+
+            if self.calls == 1 and not after:
+                raise AutoReconnect('connection lost')
+
+            result = original(this, *args, **kwargs)
+
+            if self.calls == 1:
+                raise AutoReconnect('connection lost')
+
+            return result
+
+        monkeypatch.setattr(type(collection), method, failing)
+
+
+@pytest.mark.parametrize('collection, method, after', [
+    ('assets_curr', 'find_one_and_update', True),   # swapped, reply lost
+    ('assets_prev', 'replace_one', False),          # swapped, history not written
+    ('assets_prev', 'replace_one', True),           # history written, reply lost
+])
+def test_rotate_replay_is_idempotent(spool, mock_db, monkeypatch, collection, method, after):
+    mock_db.assets_curr.insert_one(dict(KEY, version=1, publish_id=bson.ObjectId()))
+
+    _FailOnce(monkeypatch, mock_db[collection], method, after)
+
+    spool.append('rotate', query=KEY, update={'$set': {'version': 2}}, insert=dict(KEY, version=2))
+
+    spool._flush_batch()
+    assert spool.pending() == 1
+
+    spool._flush_batch()
+    assert spool.pending() == 0
+    assert spool.failed() == []
+
+    assert [doc['version'] for doc in mock_db.assets_curr.find(KEY)] == [2]
+
+    if method == 'find_one_and_update':
+        # the reply with the replaced version never arrived, there is nothing to rotate
+        assert mock_db.assets_prev.count_documents(KEY) == 0
+    else:
+        assert [doc['version'] for doc in mock_db.assets_prev.find(KEY)] == [1]
+
+
+def test_save_history_is_idempotent(mock_db):
+    previous = mock_db.assets_curr.find_one(
+        {'_id': mock_db.assets_curr.insert_one(dict(KEY, version=1)).inserted_id})
+
+    assets.save_history(mock_db, previous)
+    assets.save_history(mock_db, previous)
+
+    history = list(mock_db.assets_prev.find(KEY))
+    assert len(history) == 1
+    assert history[0]['asset_id'] == previous['_id']
+
+
+def test_sessions_share_a_journal(spool, database, mock_db, monkeypatch):
+    # two sessions draining the same file replay every record exactly once
+    other = journal.PublishJournal(spool.path, get_db=lambda: database[0], max_backoff=0)
+    spool.batch_size = other.batch_size = 5
+
+    applied = []
+    apply = journal.PublishJournal._apply
+
+    def counted(self, db, record_id, kind, payload):
+        applied.append(record_id)
+        time.sleep(0.001)
+        return apply(self, db, record_id, kind, payload)
+
+    monkeypatch.setattr(journal.PublishJournal, '_apply', counted)
+
+    ids = [spool.append('insert', document=dict(KEY, name='chair{}'.format(i), version=1)) for i in range(40)]
+
+    def drain(session):
+        while session.pending():
+            session._flush_batch()
+
+    threads = [threading.Thread(target=drain, args=(session,)) for session in (spool, other)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(applied) == ids
+    assert spool.failed() == []
+    assert mock_db.assets_curr.count_documents({'type': 'model'}) == 40
+
+
+def test_claim_expires(spool, database, mock_db):
+    other = journal.PublishJournal(spool.path, get_db=lambda: database[0], max_backoff=0)
+    spool.append('insert', document=dict(KEY, version=1))
+
+    # the other session claimed the record and went away
+    rows, delay = other._claim()
+    assert len(rows) == 1
+
+    assert spool._flush_batch() == 1.0
+    assert spool.pending() == 1
+
+    spool.claim_timeout = 0
+    spool._flush_batch()
+
+    assert spool.pending() == 0
+    assert mock_db.assets_curr.count_documents(KEY) == 1
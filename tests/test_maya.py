@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import shutil
+import importlib
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+SIZES = (100, 200, 400)
+
+
+def _scene(fake, count):
+    fake.sets.clear()
+
+    for i in range(count):
+        fake.add_set('asset{:04d}'.format(i), version=i % 7, tags=['hero'] if i % 2 else [])
+
+
+def _read(maya, use_api):
+    api = maya.om
+
+    if not use_api:
+        maya.om = None
+
+    try:
+        return maya.get_tba_assets()
+    finally:
+        maya.om = api
+
+
+def test_readers_agree(fake_maya):
+    fake, maya = fake_maya
+    _scene(fake, 20)
+
+    assets = _read(maya, True)
+
+    assert assets == _read(maya, False)
+    assert assets[3] == {'name': 'asset0003', 'type': 'model', 'stage': 'build', 'entity': 'props',
+                         'author': 'artist', 'dateCreated': '2026-01-01', 'dateUpdated': '2026-01-01',
+                         'version': 3, 'tags': ['hero']}
+
+
+def test_missing_attributes(fake_maya):
+    fake, maya = fake_maya
+    _scene(fake, 2)
+    del fake.sets['tba_asset_asset0001']['tags']
+    del fake.sets['tba_asset_asset0001']['author']
+
+    asset = maya.get_tba_assets()[1]
+
+    assert asset['author'] is None
+    assert asset['tags'] is None
+    assert maya.get_tba_assets()[0]['tags'] == []
+
+
+def test_compact(fake_maya):
+    fake, maya = fake_maya
+    _scene(fake, 5)
+
+    compact = maya.get_tba_assets(compact=True)
+
+    assert [dict(a._asdict()) for a in compact] == maya.get_tba_assets()
+    assert compact[3].version == 3
+    assert compact[3].tags == ['hero']
+
+
+def test_no_sets(fake_maya):
+    fake, maya = fake_maya
+    assert maya.get_tba_assets() == []
+
+
+@pytest.mark.parametrize('use_api', [False, True], ids=['cmds', 'api'])
+def test_reader_benchmark(fake_maya, use_api):
+    # the cmds reader pays one command round trip per attribute, the API reader none.
+    # Both should stay linear in the number of sets
+    fake, maya = fake_maya
+    seconds = []
+
+    for count in SIZES:
+        _scene(fake, count)
+        fake.calls = 0
+
+        assert len(_read(maya, use_api)) == count
+        calls = fake.calls
+
+        best = None
+
+        for _ in range(5):
+            start = time.time()
+            _read(maya, use_api)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        seconds.append(best)
+        print('{} sets: {} cmds calls, {:.2f}ms'.format(count, calls, best * 1000))
+
+        if use_api:
+            assert calls == 0
+        else:
+            assert calls == 1 + count * len(maya.TBA_ASSET_ATTRS)
+
+    # four times the sets, allow twice that for timer noise on such short runs
+    assert seconds[-1] < max(seconds[0], 0.005) * 8
+
+
+def test_import_does_not_load_pymongo():
+    # tbautils.db sets up the path pymongo is found on, and connects lazily
+    code = '\n'.join([
+        'import sys',
+        'sys.path[:0] = [{!r}, {!r}]'.format(os.path.dirname(os.path.abspath(__file__)), ROOT),
+        'import mayastub',
+        'sys.modules.update(mayastub.FakeMaya().modules())',
+        'import tbautils.maya',
+        'sys.stdout.write(str(sorted(m for m in ("pymongo", "bson", "tbautils.db") if m in sys.modules)))',
+    ])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env, cwd=ROOT)
+
+    assert output.decode('ascii') == '[]'
+
+
+class _Handle(object):
+    # stands in for tbautils.db.db
+
+    def __init__(self, db):
+        self.db = db
+
+
+def test_current_asset_is_not_cached(fake_maya, mock_db, monkeypatch):
+    # whether an export is unchanged must be decided on the version that is current now
+    fake, maya = fake_maya
+    monkeypatch.setattr(importlib.import_module('tbautils.db'), 'db', _Handle(mock_db))
+    cache = importlib.import_module('tbautils.cache')
+
+    key = {'name': 'chair', 'type': 'model', 'stage': 'build', 'entity': 'props'}
+    mock_db.assets_curr.insert_one(dict(key, version=1, content_hash='first'))
+    assert cache.find_one(mock_db, 'assets_curr', key)['content_hash'] == 'first'
+
+    # someone else publishes within the cache's TTL
+    mock_db.assets_curr.update_one(key, {'$set': {'version': 2, 'content_hash': 'second'}})
+
+    current = maya._current_asset(dict(key, author='artist'))
+    assert (current['version'], current['content_hash']) == (2, 'second')
+
+
+@pytest.fixture
+def scene(fake_maya, tmpdir, monkeypatch):
+    fake, maya = fake_maya
+    fake.scene = str(tmpdir.join('J123', 'vfx', 'build', 'props', 'anim', 'props_anim.ma'))
+    fake.add_set('chair')
+    fake.add_set('table')
+
+    current = {}
+    monkeypatch.setattr(maya, '_current_asset', lambda asset: current.get(asset['name']))
+
+    # the hierarchy is only read in the background
+    fake.warmed = []
+    fake.read = []
+    monkeypatch.setattr(maya.abc_cache, 'warm', fake.warmed.extend)
+    monkeypatch.setattr(maya.abc_cache, 'get_hierarchy', fake.read.append)
+
+    return tmpdir.join('J123', 'vfx', 'build', '_published3d'), current
+
+
+def _published(folder, name):
+    # return: (entries of the task folder, latest version in its manifest)
+    task = folder.join(name, 'model')
+
+    if not task.check():
+        return [], 0
+
+    return sorted(p.basename for p in task.listdir()), json.loads(task.join('.versions.json').read())['latest']
+
+
+def _scratch_removed(fake):
+    return fake.exports and not any(os.path.exists(path) for path in fake.exports)
+
+
+def test_export(fake_maya, scene, monkeypatch):
+    fake, maya = fake_maya
+    published, current = scene
+
+    results = maya.export_abcs(maya.get_tba_assets())
+
+    assert [r['status'] for r in results] == ['exported', 'exported']
+    assert _published(published, 'chair') == (['.versions.json', 'v001'], 1)
+
+    chair = results[0]['asset']
+    assert chair['version'] == 1
+    assert chair['filepath'] == str(published.join('chair', 'model', 'v001', 'chair.abc'))
+
+    with open(chair['filepath'], 'rb') as f:
+        assert f.read() == b'Ogawa -uvWrite -worldSpace -root |chair_grp'
+
+    assert fake.sets['tba_asset_chair']['version'] == 1
+    assert _scratch_removed(fake)
+
+    # metadata comes from the export job
+    assert chair['frame_range'] == [1.0, 1.0]
+    assert chair['object_count'] == 2
+    assert chair['file_size'] == 43
+    assert fake.warmed == [chair['filepath'], results[1]['asset']['filepath']]
+    assert fake.read == []
+
+    # same content as the current version, only the table is copied to the share
+    current['chair'] = {'version': 1, 'filepath': chair['filepath'], 'content_hash': chair['content_hash']}
+    copy = shutil.copyfile
+    copied = []
+
+    def copyfile(src, dst):
+        copied.append(os.path.basename(src))
+        copy(src, dst)
+
+    monkeypatch.setattr(shutil, 'copyfile', copyfile)
+    results = maya.export_abcs(maya.get_tba_assets())
+
+    assert copied == ['table.abc']
+
+    assert [r['status'] for r in results] == ['unchanged', 'exported']
+    assert results[0]['asset']['version'] == 1
+    assert _published(published, 'chair') == (['.versions.json', 'v001'], 1)
+    assert _published(published, 'table') == (['.versions.json', 'v001', 'v002'], 2)
+
+
+def test_export_error_publishes_nothing(fake_maya, scene):
+    fake, maya = fake_maya
+    published, current = scene
+    fake.export_error = 'AbcExport failed'
+
+    results = maya.export_abcs(maya.get_tba_assets())
+
+    assert [r['status'] for r in results] == ['error', 'error']
+    assert _published(published, 'chair') == ([], 0)
+    assert _published(published, 'table') == ([], 0)
+
+
+def test_copy_error_releases_version(fake_maya, scene, monkeypatch):
+    fake, maya = fake_maya
+    published, current = scene
+
+    copy = shutil.copyfile
+
+    def copyfile(src, dst):
+        if 'table' in src:
+            raise IOError('share went away')
+        copy(src, dst)
+
+    monkeypatch.setattr(shutil, 'copyfile', copyfile)
+
+    results = maya.export_abcs(maya.get_tba_assets())
+
+    assert [r['status'] for r in results] == ['exported', 'error']
+    assert results[1]['error'] == 'share went away'
+    assert _published(published, 'chair') == (['.versions.json', 'v001'], 1)
+    assert _published(published, 'table') == (['.versions.json'], 0)
+    assert _scratch_removed(fake)
+
+
+def test_chunk_error_publishes_nothing(fake_maya, scene, monkeypatch):
+    fake, maya = fake_maya
+    published, current = scene
+
+    def failed_chunks(scene, job_args, filepath, frame_range, chunks, scratch_dir=None):
+        with open(filepath, 'wb') as f:
+            f.write(b'partial')
+        return {'status': 'error', 'error': 'Chunk (1, 50) failed', 'chunks': []}
+
+    monkeypatch.setattr(maya.maya_batch, 'export_abc_chunks', failed_chunks)
+
+    assert maya.export_abc(maya.get_tba_assets()[0], chunks=2) is None
+    assert _published(published, 'chair') == ([], 0)
+
+    def merged_chunks(scene, job_args, filepath, frame_range, chunks, scratch_dir=None):
+        with open(filepath, 'wb') as f:
+            f.write(b'merged')
+        return {'status': 'ok', 'error': None, 'chunks': [], 'merge_seconds': 0.0}
+
+    monkeypatch.setattr(maya.maya_batch, 'export_abc_chunks', merged_chunks)
+
+    chair = maya.export_abc(maya.get_tba_assets()[0], chunks=2)
+
+    assert chair['version'] == 1
+    assert chair['frame_range'] == [1.0, 100.0]
+    assert chair['object_count'] == 2
+    assert fake.warmed == [chair['filepath']]
+    assert _published(published, 'chair') == (['.versions.json', 'v001'], 1)
@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import stat
+
+import pytest
+
+import mayastub
+from tbautils import maya_batch
+
+MAYAPY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mayapy.py')
+
+
+@pytest.fixture
+def mayapy(tmpdir):
+    # executable that runs the worker against the maya stubs
+    if sys.platform == 'win32':
+        pytest.skip('needs a shell script as mayapy')
+
+    path = tmpdir.join('mayapy')
+    path.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, MAYAPY))
+    path.chmod(stat.S_IRWXU)
+    return str(path)
+
+
+def _scene(tmpdir, entity, names, **behaviour):
+    path = tmpdir.join('J123', 'vfx', 'build', entity, 'anim', entity + '_anim.ma')
+    path.ensure()
+
+    scene = dict(behaviour, sets=dict(('tba_asset_' + name, mayastub.set_attrs(name)) for name in names))
+    path.write(json.dumps(scene))
+    return str(path)
+
+
+def _published(tmpdir, name):
+    task = tmpdir.join('J123', 'vfx', 'build', '_published3d', name, 'model')
+    return sorted(p.basename for p in task.listdir()) if task.check() else []
+
+
+def test_run_batch(tmpdir, mayapy):
+    scenes = [
+        _scene(tmpdir, 'props', ['chair', 'table']),
+        _scene(tmpdir, 'sets', ['house'], export_error='AbcExport failed'),
+        _scene(tmpdir, 'chars', ['hero'], export_sleep=30)
+    ]
+
+    results = dict((r['scene'], r) for r in maya_batch.run_batch(scenes, mayapy=mayapy, workers=3,
+                                                                  timeout=3, retries=1))
+
+    props = results[scenes[0]]
+    assert props['status'] == 'ok'
+    assert props['attempts'] == 1
+    assert [(a['name'], a['status'], a['version']) for a in props['assets']] == \
+        [('chair', 'exported', 1), ('table', 'exported', 1)]
+    assert os.path.exists(props['assets'][0]['filepath'])
+    assert _published(tmpdir, 'chair') == ['.versions.json', 'v001']
+
+    failed = results[scenes[1]]
+    assert failed['status'] == 'error'
+    assert failed['attempts'] == 2
+    assert failed['error'] == '1 of 1 assets failed, house: AbcExport failed'
+    assert _published(tmpdir, 'house') == []
+
+    # the killed attempts were still writing to local scratch, nothing reached the share
+    timeout = results[scenes[2]]
+    assert timeout['status'] == 'timeout'
+    assert timeout['attempts'] == 2
+    assert _published(tmpdir, 'hero') == []
+
+
+def test_retry_skips_published_assets(tmpdir, mayapy):
+    # the first attempt only writes chair, the retry must not publish it again
+    scene = _scene(tmpdir, 'props', ['chair', 'table'], export_missing_once='table')
+
+    result = maya_batch.run_scene(scene, mayapy=mayapy, timeout=30, retries=1)
+
+    assert result['status'] == 'ok'
+    assert result['attempts'] == 2
+    assert [(a['name'], a['status'], a['version']) for a in result['assets']] == \
+        [('chair', 'exported', 1), ('table', 'exported', 1)]
+    assert _published(tmpdir, 'chair') == ['.versions.json', 'v001']
+    assert _published(tmpdir, 'table') == ['.versions.json', 'v001']
+
+
+def test_run_scene_missing_scene(tmpdir, mayapy):
+    result = maya_batch.run_scene(str(tmpdir.join('missing.ma')), mayapy=mayapy, timeout=30, retries=0)
+
+    assert result['status'] == 'error'
+    assert 'No such file' in result['error'] or 'IOError' in result['error']
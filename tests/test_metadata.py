@@ -0,0 +1,120 @@
+import os
+import gzip
+from io import BytesIO
+
+import hda_reader
+import metadata
+
+NAME = 'tba::chair::1.0'
+
+
+def _cpio(entries, mtime, inode):
+    # odc cpio archive, as Houdini writes the Contents section
+    data = b''
+
+    for i, (name, body) in enumerate(entries + [('TRAILER!!!', b'')]):
+        name = name.encode('ascii') + b'\x00'
+        header = '070707{:06o}{:06o}{:06o}{:06o}{:06o}{:06o}{:06o}{:011o}{:06o}{:011o}'.format(
+            0o1003, inode + i, 0o100666, 0, 0, 1, 0, mtime, len(name), len(body))
+        data += header.encode('ascii') + name + body
+
+    return data
+
+
+def _gzip(data, mtime):
+    buf = BytesIO()
+
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=mtime) as f:
+        f.write(data)
+
+    return buf.getvalue()
+
+
+def _save_library(folder, name=NAME, mtime=1700000000, inode=100, radius='1'):
+    '''
+    Write an expanded library holding one definition, the way hotl -t lays it
+    out. Saving again gives new mtimes and inodes in the gzip and cpio headers.
+    return: the definition's folder
+    '''
+    section = '{}_1{}'.format('Sop', name.replace(':', '_1'))
+    folder.join('Sections.list').write('""\nINDEX_SECTION\tINDEX_SECTION\n{}\tSop/{}\n'.format(section, name))
+    folder.join('INDEX_SECTION').write('Operator:     {0}\nLabel:        Chair\nTable:        Sop\n\n'.format(name))
+
+    definition = folder.join(section)
+    definition.ensure(dir=True)
+    definition.join('Sections.list').write('""\nDialogScript\tDialogScript\nContents.gz\tContents.gz\n')
+    definition.join('DialogScript').write('# Dialog script for {0} automatically generated\n{{ name "{0}" }}\n'.format(name))
+
+    contents = _cpio([
+        ('node.init', 'type = {}\nmatchesdef = 1\n'.format(name).encode('ascii')),
+        ('node.def', 'sopflags sopflags = \ncomment ""\n'.encode('ascii')),
+        ('sphere1.parm', 'rad [ 0 locks=0 ] ( {} )\n'.format(radius).encode('ascii'))
+    ], mtime, inode)
+    definition.join('Contents.gz').write_binary(_gzip(contents, mtime))
+
+    return definition
+
+
+class FakeSection(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def contents(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class FakeDefinition(object):
+    # hou.HDADefinition read from an expanded library
+
+    def __init__(self, library):
+        self.name = hda_reader.read_definitions(library)[0]['name']
+        self.library = library
+
+    def nodeTypeName(self):
+        return self.name
+
+    def sections(self):
+        files = dict((name, filename) for filename, name in hda_reader._read_sections_list(self.library))
+        folder = os.path.join(self.library, files['Sop/' + self.name])
+
+        return dict((name, FakeSection(os.path.join(folder, filename)))
+                    for filename, name in hda_reader._read_sections_list(folder))
+
+
+def _hash(folder, **kwargs):
+    _save_library(folder, **kwargs)
+    return metadata.hda_definition_hash(FakeDefinition(str(folder)))
+
+
+def test_cpio_entries():
+    data = _cpio([('node.init', b'abc'), ('node.def', b'')], 1700000000, 7)
+
+    assert metadata._cpio_entries(data) == [(b'node.init', b'100666', b'abc'), (b'node.def', b'100666', b'')]
+    assert metadata._cpio_entries(data[:-20]) is None
+    assert metadata._cpio_entries(b'070707 not an archive') is None
+
+
+def test_definition_hash_ignores_save_times(tmpdir):
+    first = _hash(tmpdir.mkdir('a'))
+
+    # saved again a day later
+    assert _hash(tmpdir.mkdir('b'), mtime=1700086400, inode=500) == first
+
+    # the same content published as the next version
+    assert _hash(tmpdir.mkdir('c'), name='tba::chair::2.0', mtime=1700090000) == first
+
+    # a parameter changed
+    assert _hash(tmpdir.mkdir('d'), radius='2') != first
+
+
+def test_definition_hash_other_contents(tmpdir):
+    definition = _save_library(tmpdir.mkdir('a'))
+
+    # not a cpio archive, hashed as it is
+    definition.join('Contents.gz').write_binary(_gzip(b'070707 truncated', 1700000000))
+    first = metadata.hda_definition_hash(FakeDefinition(str(tmpdir.join('a'))))
+
+    definition.join('Contents.gz').write_binary(_gzip(b'070707 truncated', 1700086400))
+    assert metadata.hda_definition_hash(FakeDefinition(str(tmpdir.join('a')))) == first
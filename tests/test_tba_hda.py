@@ -0,0 +1,111 @@
+import sys
+import types
+import datetime
+import importlib
+
+import pytest
+
+import assets
+
+# tba_hda.py is Python 2 only, like the Houdini builds it runs in
+pytestmark = pytest.mark.skipif(sys.version_info[0] > 2, reason='tba_hda.py needs Python 2')
+
+
+class FakeJournal(object):
+
+    def __init__(self):
+        self.records = []
+
+    def append(self, kind, **payload):
+        self.records.append((kind, payload))
+
+
+@pytest.fixture
+def tba_hda(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'hou', types.ModuleType('hou'))
+    monkeypatch.delitem(sys.modules, 'tba_hda', raising=False)
+    monkeypatch.setenv('USERNAME', 'artist')
+
+    module = importlib.import_module('tba_hda')
+    spool = FakeJournal()
+    monkeypatch.setattr(module.tbautils.journal, 'get_journal', lambda: spool)
+
+    yield module, spool
+
+    sys.modules.pop('tba_hda', None)
+
+
+def _asset(node_type_name, parent_id=None):
+    return {
+        'asset_type': 'shader',
+        'parent_id': parent_id,
+        'lib_filepath': '/jobs/J123/config/houdini/otls/tba_chair.hda',
+        'node_type_name': node_type_name,
+        'hip_path': '/jobs/J123/vfx/build/props/lookdev/chair.hip'
+    }
+
+
+def test_queue_asset_update_versions(tba_hda, mock_db):
+    module, spool = tba_hda
+    parent_id = mock_db.assets_curr.insert_one({'name': 'chair', 'type': 'model', 'stage': 'build',
+                                                'entity': 'props', 'version': 3}).inserted_id
+
+    for name in ('tba::chair::0.9', 'tba::chair::0.10'):
+        message = module.queue_asset_update(_asset(name, str(parent_id)), {'content_hash': name})
+        assert message == 'Queued asset version {} for the database'.format(name.split('::')[-1])
+
+    published = [payload['publish'] for kind, payload in spool.records]
+
+    assert [p['version'] for p in published] == ['0.9', '0.10']
+    assert published[0]['job'] == 'J123'
+    assert isinstance(published[0]['date'], datetime.datetime)
+
+    for publish in published:
+        query, update, insert = assets.hda_rotation(mock_db, publish)
+        assets.rotate_asset(mock_db, query, update, insert)
+
+    shader = mock_db.assets_curr.find_one({'name': 'chair', 'type': 'shader'})
+    history = mock_db.assets_prev.find_one({'name': 'chair', 'type': 'shader'})
+
+    assert (shader['version'], shader['version_key']) == ('0.10', '000000.000010')
+    assert shader['content_hash'] == 'tba::chair::0.10'
+    assert (history['version'], history['version_key']) == ('0.9', '000000.000009')
+    assert history['content_hash'] == 'tba::chair::0.9'
+
+    # the key sorts 0.10 after 0.9 where the text doesn't
+    both = [shader, history]
+    assert [doc['version'] for doc in sorted(both, key=lambda doc: doc['version_key'])] == ['0.9', '0.10']
+    assert [doc['version'] for doc in sorted(both, key=lambda doc: doc['version'])] == ['0.10', '0.9']
+
+
+def test_queue_asset_update_keeps_version_text(tba_hda):
+    module, spool = tba_hda
+
+    assert module.queue_asset_update(_asset('tba::chair::1'), {}) == 'Queued asset chair for the database'
+    assert spool.records[0][1]['publish']['version'] == '1'
+
+
+def test_queue_asset_update_unversioned(tba_hda):
+    module, spool = tba_hda
+
+    assert module.queue_asset_update(_asset('tba::chair'), {}) == 'Queued asset chair for the database'
+    assert spool.records[0][1]['publish']['version'] is None
+
+
+def test_find_current_asset_is_not_cached(tba_hda, mock_db, monkeypatch):
+    # whether a publish is unchanged must be decided on the version that is current now
+    module, spool = tba_hda
+    monkeypatch.setattr(module.tbautils.common, 'getDB', lambda: mock_db)
+
+    key = {'name': 'chair', 'stage': 'build', 'entity': 'props'}
+    parent_id = mock_db.assets_curr.insert_one(dict(key, type='model', version=3)).inserted_id
+    mock_db.assets_curr.insert_one(dict(key, type='shader', version='0.9', content_hash='first'))
+
+    asset = _asset('tba::chair::0.9', str(parent_id))
+    assert module.find_current_asset(asset)['content_hash'] == 'first'
+    assert module.tbautils.cache.find_one(mock_db, 'assets_curr', dict(key, type='shader'))['content_hash'] == 'first'
+
+    # someone else publishes within the cache's TTL
+    mock_db.assets_curr.update_one(dict(key, type='shader'), {'$set': {'version': '0.10', 'content_hash': 'second'}})
+
+    assert module.find_current_asset(asset)['content_hash'] == 'second'
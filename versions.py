@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import json
+import time
+import errno
+import shutil
+
+import fileutils
+
+sys.dont_write_bytecode = True  # Avoid writing .pyc files
+
+#
+# Per-task index of published vNNN folders, kept in a small manifest file next
+# to them so the next version can be allocated without listing the share.
+# The manifest is rebuilt from the folder contents if it is missing, unreadable
+# or out of date.
+#
+MANIFEST = '.versions.json'
+VERSION_RE = re.compile(r'^v(\d+)$')
+
+
+def version_name(number):
+    return 'v' + str(number).zfill(3)
+
+
+class VersionIndex(object):
+
+    def __init__(self, task_path):
+        '''
+        param: task_path [string] - folder holding the vNNN folders
+        '''
+        self.task_path = task_path
+        self.manifest_path = os.path.join(task_path, MANIFEST)
+
+    def _lock(self):
+        return fileutils.FileLock(self.manifest_path + '.lock')
+
+    def load(self):
+        '''
+        return: manifest dict {'latest': int, 'versions': {str(number): info}}
+        '''
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+
+            manifest['latest']
+            manifest['versions']
+            return manifest
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return self.rebuild()
+
+    def rebuild(self):
+        '''
+        Build the manifest by scanning task_path. Entries that aren't vNNN folders are ignored.
+        return: manifest dict
+        '''
+        manifest = {'latest': 0, 'versions': {}}
+
+        if not os.path.isdir(self.task_path):
+            return manifest
+
+        for entry in fileutils.scan_dir(self.task_path):
+            match = VERSION_RE.match(entry.name)
+
+            if not match or not entry.is_dir():
+                continue
+
+            number = int(match.group(1))
+            info = {'name': entry.name, 'filepath': None, 'size': None, 'timestamp': None}
+
+            # the published file is whatever file lives in the version folder
+            for child in fileutils.scan_dir(entry.path):
+                if child.is_file():
+                    st = child.stat()
+                    info.update(filepath=child.path, size=st.st_size, timestamp=st.st_mtime)
+                    break
+
+            manifest['versions'][str(number)] = info
+            manifest['latest'] = max(manifest['latest'], number)
+
+        return manifest
+
+    def _save(self, manifest):
+        fileutils.atomic_write(self.manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+
+    def latest(self):
+        return self.load()['latest']
+
+    def allocate(self):
+        '''
+        Reserve the next version and create its folder.
+        return: (version number, version folder path)
+        '''
+        if not os.path.exists(self.task_path):
+            os.makedirs(self.task_path)
+
+        with self._lock():
+            manifest = self.load()
+
+            while True:
+                number = manifest['latest'] + 1
+                path = os.path.join(self.task_path, version_name(number))
+
+                try:
+                    os.mkdir(path)
+                    break
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+                    # someone published without updating the manifest
+                    manifest = self.rebuild()
+                    manifest['latest'] = max(manifest['latest'], number)
+
+            manifest['latest'] = number
+            manifest['versions'][str(number)] = {
+                'name': version_name(number),
+                'filepath': None,
+                'size': None,
+                'timestamp': time.time()
+            }
+            self._save(manifest)
+
+        return number, path
+
+    def record(self, number, filepath):
+        '''
+        Store the published file for a version once it has been written.
+        '''
+        st = os.stat(filepath)
+
+        with self._lock():
+            manifest = self.load()
+            manifest['versions'][str(number)] = {
+                'name': version_name(number),
+                'filepath': filepath,
+                'size': st.st_size,
+                'timestamp': st.st_mtime
+            }
+            manifest['latest'] = max(manifest['latest'], number)
+            self._save(manifest)
+
+    def release(self, number):
+        '''
+        Give back a version reserved by allocate() that ended up not being
+        published, removing its folder.
+        '''
+        with self._lock():
+            manifest = self.load()
+            manifest['versions'].pop(str(number), None)
+
+            if manifest['latest'] == number:
+                manifest['latest'] = max([int(k) for k in manifest['versions']] or [0])
+
+            # remove the folder while locked so allocate() can't hand it out meanwhile
+            shutil.rmtree(os.path.join(self.task_path, version_name(number)), ignore_errors=True)
+            self._save(manifest)